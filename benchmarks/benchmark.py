@@ -0,0 +1,211 @@
+#!/usr/bin/python
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark the rds_cluster* modules at scale against the simulated RDS endpoint
+
+Starts an RDSSimulator in-process, seeds it with clusters and snapshots, and
+runs each module as Ansible would, one process per task with up to --forks
+at once. For each scenario it reports the wall time, the API calls received
+by the simulator (and how many were throttled), and the peak memory of the
+module processes.
+
+    python benchmarks/benchmark.py --clusters 500 --snapshots 5000 --create-delay 20 \\
+        --set metrics=yes --set rds_cluster_wait:wait_method=events --set rds_cluster_instance:concurrency=2
+
+Options given with --set are passed to the tasks of every module, or of one
+module when prefixed with its name, to compare polling and concurrency
+settings. Set RDS_CLUSTER_BROKER_SOCKET to a running broker to
+include it. Ansible and boto3 must be installed. Memory is reported from
+ru_maxrss, which is in kilobytes on Linux (but bytes on macOS).
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+
+from rds_simulator import RDSSimulator, backend_argument_parser, backend_from_args
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs a module from the library with the repo's module_utils, reading its arguments from a file
+BOOTSTRAP = '''
+import runpy, sys
+import ansible.module_utils
+ansible.module_utils.__path__.append(sys.argv.pop(1))
+sys.argv.pop(0)
+runpy.run_path(sys.argv[0], run_name='__main__')
+'''
+
+SCENARIOS = ['create_clusters', 'noop_clusters', 'instances', 'snapshot_facts']
+
+
+def run_task(module, args):
+    """Run a module in a new process, returning its result and peak memory in KB"""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+        json.dump(dict(ANSIBLE_MODULE_ARGS=args), f)
+    try:
+        with tempfile.TemporaryFile() as output:
+            command = [sys.executable, '-c', BOOTSTRAP, os.path.join(ROOT, 'module_utils'),
+                       os.path.join(ROOT, 'library', '%s.py' % module), f.name]
+            process = subprocess.Popen(command, stdout=output, stderr=subprocess.STDOUT)
+            # wait4 rather than wait, for the resource usage of this process alone
+            pid, status, usage = os.wait4(process.pid, 0)
+            process.returncode = status
+            output.seek(0)
+            text = output.read().decode('utf-8', 'replace')
+    finally:
+        os.unlink(f.name)
+
+    try:
+        result = json.loads(text.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        result = dict(failed=True, msg='Module output was not JSON', output=text)
+    return result, usage.ru_maxrss
+
+
+class Benchmark(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.backend = backend_from_args(args)
+        self.server = RDSSimulator(self.backend).start()
+        self.common_args = dict(
+            region='us-east-1',
+            ec2_url=self.server.url,
+            aws_access_key='benchmark',
+            aws_secret_key='benchmark',
+        )
+        self.module_args = dict()
+        for option in args.set:
+            name, value = option.split('=', 1)
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+            module, _, name = name.rpartition(':')
+            self.module_args.setdefault(module or None, dict())[name] = value
+        self.results = []
+
+    def seed(self):
+        now = time.time()
+        for n in range(self.args.clusters):
+            self.backend.seed_cluster('seeded-%04d' % n, instances=self.args.instances, tags=dict(env='benchmark'),
+                                      VpcSecurityGroupIds=['sg-00000000'], DBSubnetGroupName='benchmark')
+        for n in range(self.args.snapshots):
+            cluster_id = 'seeded-%04d' % (n % max(self.args.clusters, 1))
+            snapshot_type = 'automated' if n % 4 else 'manual'
+            prefix = 'rds:' if snapshot_type == 'automated' else ''
+            self.backend.seed_snapshot('%s%s-%06d' % (prefix, cluster_id, n), cluster_id, now - 86400 + n, snapshot_type)
+
+    def run(self, name, module, tasks):
+        """Run the tasks of a scenario, and record its measurements"""
+        before = self.backend.stats()
+        started = time.time()
+
+        module_args = dict(self.common_args)
+        module_args.update(self.module_args.get(None, {}))
+        module_args.update(self.module_args.get(module, {}))
+
+        pool = ThreadPool(self.args.forks)
+        try:
+            outcomes = pool.map(lambda args: run_task(module, dict(module_args, **args)), tasks)
+        finally:
+            pool.close()
+
+        elapsed = time.time() - started
+        after = self.backend.stats()
+        calls = sum(after['calls'].values()) - sum(before['calls'].values())
+        failed = [r for r, m in outcomes if r.get('failed')]
+
+        self.results.append(dict(
+            scenario=name,
+            tasks=len(tasks),
+            failed=len(failed),
+            wall_time=round(elapsed, 2),
+            api_calls=calls,
+            calls_per_task=round(float(calls) / max(len(tasks), 1), 2),
+            throttled=sum(after['throttled'].values()) - sum(before['throttled'].values()),
+            calls_by_action=dict((a, n - before['calls'].get(a, 0)) for a, n in after['calls'].items() if n != before['calls'].get(a, 0)),
+            peak_rss_mb=round(max([m for r, m in outcomes] or [0]) / 1024.0, 1),
+            first_failure=failed[0].get('msg') if failed else None,
+        ))
+        return [r for r, m in outcomes]
+
+    def create_clusters(self):
+        tasks = [dict(cluster_id='bench-%04d' % n, subnet_group='benchmark', master_username='admin',
+                      master_password='benchmark', vpc_security_group_ids=['sg-00000000'], tags=dict(env='benchmark'))
+                 for n in range(self.args.clusters)]
+        results = self.run('create_clusters', 'rds_cluster', tasks)
+        tokens = [r['wait_token'] for r in results if 'wait_token' in r]
+        self.run('wait_clusters', 'rds_cluster_wait', [dict(tokens=tokens)])
+
+    def noop_clusters(self):
+        tasks = [dict(cluster_id='seeded-%04d' % n, subnet_group='benchmark', vpc_security_group_ids=['sg-00000000'],
+                      tags=dict(env='benchmark'))
+                 for n in range(self.args.clusters)]
+        self.run('noop_clusters', 'rds_cluster', tasks)
+
+    def instances(self):
+        tasks = [dict(cluster_id='seeded-%04d' % n, instance_type='db.r4.large', tags=dict(env='benchmark'), wait=True,
+                      instances=[dict(instance_id='seeded-%04d-new-%03d' % (n, i + 1)) for i in range(self.args.instances)])
+                 for n in range(self.args.clusters)]
+        self.run('instances', 'rds_cluster_instance', tasks)
+
+    def snapshot_facts(self):
+        tasks = [dict(cluster_id='seeded-%04d' % n, sort='snapshot_create_time', sort_order='descending', sort_end=1)
+                 for n in range(self.args.clusters)]
+        self.run('snapshot_facts', 'rds_cluster_snapshot_facts', tasks)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the rds_cluster* modules against a simulated RDS endpoint')
+    parser.add_argument('--clusters', type=int, default=500, help='number of clusters per scenario')
+    parser.add_argument('--instances', type=int, default=2, help='number of instances per cluster')
+    parser.add_argument('--snapshots', type=int, default=5000, help='number of snapshots to seed')
+    parser.add_argument('--forks', type=int, default=5, help='number of module processes to run at once, as ansible --forks')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='scenario to run (default all, in order)')
+    parser.add_argument('--set', action='append', default=[], metavar='[MODULE:]OPTION=VALUE', help='module option to set for every task, or those of one module')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = backend_argument_parser(parser).parse_args()
+
+    benchmark = Benchmark(args)
+    benchmark.seed()
+    for scenario in args.scenario or SCENARIOS:
+        getattr(benchmark, scenario)()
+
+    simulator_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    if args.json:
+        print(json.dumps(dict(results=benchmark.results, simulator_peak_rss_mb=round(simulator_rss, 1)), indent=2, sort_keys=True))
+        return
+
+    columns = ['scenario', 'tasks', 'failed', 'wall_time', 'api_calls', 'calls_per_task', 'throttled', 'peak_rss_mb']
+    print('  '.join('%-16s' % c for c in columns))
+    for result in benchmark.results:
+        print('  '.join('%-16s' % result[c] for c in columns))
+        if result['first_failure']:
+            print('    first failure: %s' % result['first_failure'])
+    print('simulator peak RSS: %.1f MB' % simulator_rss)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,744 @@
+#!/usr/bin/python
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Simulated RDS endpoint for running the rds_cluster* modules offline
+
+Serves the RDS query API over HTTP on localhost, so the modules can be
+pointed at it with ec2_url. Requests are parsed and responses serialized
+using botocore's RDS service model, so the modules see the same shapes as
+from AWS.
+
+Clusters, instances and cluster snapshots are state machines, which move
+through their statuses (for example creating, backing-up, available) after
+configurable delays, and emit RDS events as they do. Statuses are worked out
+from the clock when described, so thousands of resources cost nothing while
+idle. Request latency, throttling and failures can be injected.
+
+Run it standalone with:
+
+    python benchmarks/rds_simulator.py [--port 8765] [--create-delay 60] ...
+
+and use `ec2_url: http://127.0.0.1:8765` in tasks, or start it in-process
+with RDSSimulator (as benchmarks/benchmark.py does).
+
+Modifications are applied straight away whatever ApplyImmediately is set to.
+"""
+
+import datetime
+import itertools
+import random
+import re
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ElementTree
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+
+import botocore.session
+import botocore.utils
+from dateutil.tz import tzutc
+
+REGION = 'us-east-1'
+ACCOUNT = '123456789012'
+XMLNS = 'http://rds.amazonaws.com/doc/2014-10-31/'
+
+# Delays in seconds between the statuses of each kind of resource
+DEFAULT_DELAYS = dict(
+    create=60,
+    backup=10,
+    modify=30,
+    delete=30,
+    snapshot=30,
+)
+
+MIN_RECORDS = 20
+MAX_RECORDS = 100
+
+
+class SimulatedError(Exception):
+    def __init__(self, code, message, status=400):
+        super(SimulatedError, self).__init__(message)
+        self.code = code
+        self.status = status
+
+
+class Resource(object):
+    """A simulated cluster, instance or cluster snapshot
+
+    `data` holds its description, and `schedule` the (time, status, message,
+    categories) of each status it has been or will be in, in order. The
+    current status is the last one whose time has passed.
+    """
+
+    def __init__(self, kind, data, schedule):
+        self.kind = kind
+        self.data = data
+        self.schedule = schedule
+
+    def status(self, now):
+        current = None
+        for at, status, message, categories in self.schedule:
+            if at > now:
+                break
+            current = status
+        return current
+
+    def progress(self, now):
+        """Return the fraction of the time between the current and the next status which has passed"""
+        previous = None
+        for at, status, message, categories in self.schedule:
+            if at > now:
+                if previous is None or at == previous:
+                    return 0.0
+                return (now - previous) / (at - previous)
+            previous = at
+        return 1.0
+
+    def schedule_from(self, now, steps):
+        """Replace the future of the schedule with steps of (delay, status, message, categories)"""
+        self.schedule = [s for s in self.schedule if s[0] <= now]
+        at = now
+        for delay, status, message, categories in steps:
+            at += delay
+            self.schedule.append((at, status, message, categories))
+
+    def gone(self, now):
+        return self.status(now) == 'deleted'
+
+
+class RDSBackend(object):
+    """In-memory RDS state, with one handler method per supported API action"""
+
+    SOURCE_TYPES = dict(cluster='db-cluster', instance='db-instance', snapshot='db-cluster-snapshot')
+
+    def __init__(self, delays=None, latency=0, throttle_rate=0, max_rps=0, failure_rate=0, fail_pattern=None, seed=None):
+        self.delays = dict(DEFAULT_DELAYS, **(delays or {}))
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.max_rps = max_rps
+        self.failure_rate = failure_rate
+        self.fail_pattern = re.compile(fail_pattern) if fail_pattern else None
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.resources = dict(cluster=dict(), instance=dict(), snapshot=dict())
+        self.calls = dict()
+        self.throttled = dict()
+        self.tokens = float(max_rps)
+        self.tokens_at = time.time()
+
+        self.model = botocore.session.get_session().get_service_model('rds')
+
+    # Request handling
+
+    def handle(self, params):
+        """Handle one request, returning (HTTP status, XML body)"""
+        action = params.pop('Action', None)
+        params.pop('Version', None)
+        request_id = str(uuid.uuid4())
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        try:
+            try:
+                operation = self.model.operation_model(action)
+            except Exception:
+                raise SimulatedError('InvalidAction', 'Unsupported action %s' % action)
+            handler = getattr(self, operation.name, None)
+            if handler is None:
+                raise SimulatedError('InvalidAction', 'Action %s is not simulated' % action)
+
+            with self.lock:
+                self.calls[action] = self.calls.get(action, 0) + 1
+                if self.throttle(action):
+                    raise SimulatedError('Throttling', 'Rate exceeded')
+                kwargs = parse_input(params, operation.input_shape, '') if operation.input_shape else {}
+                result = handler(time.time(), **(kwargs or {}))
+        except SimulatedError as e:
+            return e.status, error_response(e, request_id)
+        except Exception as e:
+            return 500, error_response(SimulatedError('InternalFailure', '%s: %s' % (type(e).__name__, e), 500), request_id)
+
+        return 200, success_response(operation, result, request_id)
+
+    def throttle(self, action):
+        if self.max_rps:
+            now = time.time()
+            self.tokens = min(self.max_rps, self.tokens + (now - self.tokens_at) * self.max_rps)
+            self.tokens_at = now
+            if self.tokens < 1:
+                self.throttled[action] = self.throttled.get(action, 0) + 1
+                return True
+            self.tokens -= 1
+        if self.throttle_rate and self.random.random() < self.throttle_rate:
+            self.throttled[action] = self.throttled.get(action, 0) + 1
+            return True
+        return False
+
+    def fails(self, resource_id):
+        if self.fail_pattern is not None and self.fail_pattern.search(resource_id):
+            return True
+        return self.failure_rate and self.random.random() < self.failure_rate
+
+    def stats(self):
+        with self.lock:
+            return dict(calls=dict(self.calls), throttled=dict(self.throttled))
+
+    # Resource bookkeeping
+
+    def arn(self, kind, resource_id):
+        arn_type = dict(cluster='cluster', instance='db', snapshot='cluster-snapshot')[kind]
+        return 'arn:aws:rds:%s:%s:%s:%s' % (REGION, ACCOUNT, arn_type, resource_id)
+
+    def get(self, kind, resource_id, now, error=None):
+        resource = self.resources[kind].get(resource_id)
+        if resource is None or resource.gone(now):
+            if error is not None:
+                raise SimulatedError(error, '%s %s not found.' % (kind.capitalize(), resource_id), 404)
+            return None
+        return resource
+
+    def live(self, kind, now):
+        return [r for i, r in sorted(self.resources[kind].items()) if not r.gone(now)]
+
+    def by_arn(self, arn, now):
+        for kind, resources in self.resources.items():
+            for resource in resources.values():
+                if resource.data.get(self.arn_key(kind)) == arn and not resource.gone(now):
+                    return resource
+        raise SimulatedError('DBClusterNotFoundFault', 'Resource %s not found.' % arn, 404)
+
+    def arn_key(self, kind):
+        return dict(cluster='DBClusterArn', instance='DBInstanceArn', snapshot='DBClusterSnapshotArn')[kind]
+
+    def create_steps(self, kind, resource_id, backup=True):
+        label = dict(cluster='DB cluster', instance='DB instance', snapshot='DB cluster snapshot')[kind]
+        steps = [(0, 'creating', '%s created' % label, ['creation'])]
+        if self.fails(resource_id):
+            steps.append((self.delays['create'], 'failed', '%s failed to be created' % label, ['failure']))
+            return steps
+        if backup:
+            steps.append((self.delays['create'], 'backing-up', 'Backing up %s' % label, ['backup']))
+            steps.append((self.delays['backup'], 'available', 'Finished %s backup' % label, ['backup']))
+        else:
+            steps.append((self.delays['create'], 'available', '%s is available' % label, ['availability']))
+        return steps
+
+    def add(self, kind, resource_id, data, now, steps):
+        resource = Resource(kind, data, [])
+        resource.schedule_from(now, steps)
+        self.resources[kind][resource_id] = resource
+        return resource
+
+    def members(self, now):
+        """Return the live instances of each cluster"""
+        members = dict()
+        for instance in self.live('instance', now):
+            members.setdefault(instance.data['DBClusterIdentifier'], []).append(instance)
+        return members
+
+    def describe(self, resource, now, members=None):
+        data = dict(resource.data)
+        if resource.kind == 'cluster':
+            if members is None:
+                members = self.members(now)
+            data['Status'] = resource.status(now)
+            data['DBClusterMembers'] = [
+                dict(DBInstanceIdentifier=i.data['DBInstanceIdentifier'], IsClusterWriter=n == 0,
+                     DBClusterParameterGroupStatus='in-sync', PromotionTier=i.data.get('PromotionTier', 1))
+                for n, i in enumerate(members.get(data['DBClusterIdentifier'], []))
+            ]
+        elif resource.kind == 'instance':
+            data['DBInstanceStatus'] = resource.status(now)
+        else:
+            data['Status'] = resource.status(now)
+            data['PercentProgress'] = 100 if data['Status'] == 'available' else int(100 * resource.progress(now))
+        return data
+
+    def seed_cluster(self, cluster_id, instances=0, tags=None, **overrides):
+        """Add an available cluster and its instances, as if created long ago"""
+        with self.lock:
+            past = time.time() - 86400
+            available = [(0, 'available', 'Seeded', ['creation'])]
+            self.CreateDBCluster(past, DBClusterIdentifier=cluster_id, Engine='aurora',
+                                 Tags=[dict(Key=k, Value=v) for k, v in (tags or {}).items()], **overrides)
+            self.resources['cluster'][cluster_id].schedule_from(past, available)
+            for n in range(instances):
+                instance_id = '%s-%03d' % (cluster_id, n + 1)
+                self.CreateDBInstance(past, DBInstanceIdentifier=instance_id, DBClusterIdentifier=cluster_id,
+                                      DBInstanceClass='db.r4.large', Engine='aurora')
+                self.resources['instance'][instance_id].schedule_from(past, available)
+
+    def seed_snapshot(self, snapshot_id, cluster_id, created, snapshot_type='manual'):
+        """Add an available snapshot of a cluster, created at the given time"""
+        with self.lock:
+            data = self.snapshot_data(snapshot_id, cluster_id, created, snapshot_type)
+            self.add('snapshot', snapshot_id, data, created, [(0, 'available', 'Snapshot created', ['creation'])])
+
+    def snapshot_data(self, snapshot_id, cluster_id, created, snapshot_type):
+        return dict(
+            DBClusterSnapshotIdentifier=snapshot_id,
+            DBClusterSnapshotArn=self.arn('snapshot', snapshot_id),
+            DBClusterIdentifier=cluster_id,
+            SnapshotCreateTime=timestamp(created),
+            ClusterCreateTime=timestamp(created - 86400),
+            AvailabilityZones=['us-east-1a', 'us-east-1b', 'us-east-1c'],
+            Engine='aurora',
+            EngineVersion='5.6.10a',
+            AllocatedStorage=1,
+            Port=3306,
+            VpcId='vpc-00000000',
+            MasterUsername='admin',
+            LicenseModel='aurora',
+            SnapshotType=snapshot_type,
+            StorageEncrypted=False,
+            IAMDatabaseAuthenticationEnabled=False,
+            TagList=[],
+        )
+
+    # Clusters
+
+    def CreateDBCluster(self, now, DBClusterIdentifier, Engine='aurora', Tags=None, VpcSecurityGroupIds=None, **kwargs):
+        if self.get('cluster', DBClusterIdentifier, now) is not None:
+            raise SimulatedError('DBClusterAlreadyExistsFault', 'DB Cluster already exists')
+        data = dict(
+            DBClusterIdentifier=DBClusterIdentifier,
+            DBClusterArn=self.arn('cluster', DBClusterIdentifier),
+            Engine=Engine,
+            EngineVersion=kwargs.get('EngineVersion', '5.6.10a'),
+            Port=kwargs.get('Port', 3306),
+            AvailabilityZones=kwargs.get('AvailabilityZones', ['us-east-1a', 'us-east-1b', 'us-east-1c']),
+            DBSubnetGroup=kwargs.get('DBSubnetGroupName', 'default'),
+            MasterUsername=kwargs.get('MasterUsername', 'admin'),
+            Endpoint='%s.cluster-xxxxxxxx.%s.rds.amazonaws.com' % (DBClusterIdentifier, REGION),
+            ClusterCreateTime=timestamp(now),
+            VpcSecurityGroups=[dict(VpcSecurityGroupId=g, Status='active') for g in VpcSecurityGroupIds or []],
+            MultiAZ=False,
+            StorageEncrypted=False,
+            TagList=Tags or [],
+        )
+        if 'DatabaseName' in kwargs:
+            data['DatabaseName'] = kwargs['DatabaseName']
+        resource = self.add('cluster', DBClusterIdentifier, data, now, self.create_steps('cluster', DBClusterIdentifier))
+        return dict(DBCluster=self.describe(resource, now))
+
+    def RestoreDBClusterFromSnapshot(self, now, DBClusterIdentifier, SnapshotIdentifier, Engine='aurora', **kwargs):
+        snapshot_id = SnapshotIdentifier.split(':')[-1]
+        snapshot = self.get('snapshot', snapshot_id, now, 'DBClusterSnapshotNotFoundFault')
+        kwargs.setdefault('EngineVersion', snapshot.data['EngineVersion'])
+        kwargs.setdefault('Port', snapshot.data['Port'])
+        return self.CreateDBCluster(now, DBClusterIdentifier, Engine=Engine, **kwargs)
+
+    def RestoreDBClusterToPointInTime(self, now, DBClusterIdentifier, SourceDBClusterIdentifier, RestoreType='full-copy', **kwargs):
+        source = self.get('cluster', SourceDBClusterIdentifier.split(':')[-1], now, 'DBClusterNotFoundFault')
+        for key in ('EngineVersion', 'Port', 'AvailabilityZones', 'DatabaseName', 'MasterUsername'):
+            if key in source.data:
+                kwargs.setdefault(key, source.data[key])
+        kwargs.pop('RestoreToTime', None)
+        kwargs.pop('UseLatestRestorableTime', None)
+        return self.CreateDBCluster(now, DBClusterIdentifier, Engine=source.data['Engine'], **kwargs)
+
+    def ModifyDBCluster(self, now, DBClusterIdentifier, **kwargs):
+        cluster = self.get('cluster', DBClusterIdentifier, now, 'DBClusterNotFoundFault')
+        self.modify(cluster, kwargs, now, 'DB cluster')
+        return dict(DBCluster=self.describe(cluster, now))
+
+    def DeleteDBCluster(self, now, DBClusterIdentifier, SkipFinalSnapshot=False, FinalDBSnapshotIdentifier=None, **kwargs):
+        cluster = self.get('cluster', DBClusterIdentifier, now, 'DBClusterNotFoundFault')
+        if any(i.data['DBClusterIdentifier'] == DBClusterIdentifier for i in self.live('instance', now)):
+            raise SimulatedError('InvalidDBClusterStateFault', 'Cluster cannot be deleted, it still contains DB instances in non-deleting state.')
+        if not SkipFinalSnapshot:
+            if not FinalDBSnapshotIdentifier:
+                raise SimulatedError('InvalidParameterCombination', 'FinalDBSnapshotIdentifier is required unless SkipFinalSnapshot is specified.')
+            self.CreateDBClusterSnapshot(now, FinalDBSnapshotIdentifier, DBClusterIdentifier)
+        self.delete(cluster, now, 'DB cluster')
+        return dict(DBCluster=self.describe(cluster, now))
+
+    def DescribeDBClusters(self, now, DBClusterIdentifier=None, Filters=None, MaxRecords=None, Marker=None, **kwargs):
+        if DBClusterIdentifier:
+            clusters = [self.get('cluster', DBClusterIdentifier.split(':')[-1], now, 'DBClusterNotFoundFault')]
+        else:
+            clusters = self.live('cluster', now)
+        clusters = [c for c in clusters if matches_filters(c.data, Filters, dict(
+            (('db-cluster-id', ('DBClusterIdentifier', 'DBClusterArn')), ('engine', ('Engine',)))))]
+        page, marker = paginate(clusters, MaxRecords, Marker)
+        members = self.members(now)
+        return dict(DBClusters=[self.describe(c, now, members) for c in page], Marker=marker)
+
+    # Instances
+
+    def CreateDBInstance(self, now, DBInstanceIdentifier, DBInstanceClass, Engine, DBClusterIdentifier=None, Tags=None, **kwargs):
+        if self.get('instance', DBInstanceIdentifier, now) is not None:
+            raise SimulatedError('DBInstanceAlreadyExists', 'DB instance already exists')
+        if DBClusterIdentifier:
+            self.get('cluster', DBClusterIdentifier, now, 'DBClusterNotFoundFault')
+        data = dict(
+            DBInstanceIdentifier=DBInstanceIdentifier,
+            DBInstanceArn=self.arn('instance', DBInstanceIdentifier),
+            DBInstanceClass=DBInstanceClass,
+            DBClusterIdentifier=DBClusterIdentifier,
+            Engine=Engine,
+            AvailabilityZone=kwargs.get('AvailabilityZone', 'us-east-1a'),
+            PreferredMaintenanceWindow=kwargs.get('PreferredMaintenanceWindow', 'sun:05:00-sun:05:30'),
+            DBParameterGroups=[dict(DBParameterGroupName=kwargs.get('DBParameterGroupName', 'default.aurora5.6'), ParameterApplyStatus='in-sync')],
+            MultiAZ=kwargs.get('MultiAZ', False),
+            AutoMinorVersionUpgrade=kwargs.get('AutoMinorVersionUpgrade', True),
+            PubliclyAccessible=kwargs.get('PubliclyAccessible', False),
+            CopyTagsToSnapshot=kwargs.get('CopyTagsToSnapshot', False),
+            MonitoringInterval=kwargs.get('MonitoringInterval', 0),
+            PromotionTier=kwargs.get('PromotionTier', 1),
+            PerformanceInsightsEnabled=kwargs.get('EnablePerformanceInsights', False),
+            InstanceCreateTime=timestamp(now),
+            TagList=Tags or [],
+        )
+        resource = self.add('instance', DBInstanceIdentifier, data, now, self.create_steps('instance', DBInstanceIdentifier))
+        return dict(DBInstance=self.describe(resource, now))
+
+    def ModifyDBInstance(self, now, DBInstanceIdentifier, ApplyImmediately=False, **kwargs):
+        instance = self.get('instance', DBInstanceIdentifier, now, 'DBInstanceNotFound')
+        if 'DBParameterGroupName' in kwargs:
+            instance.data['DBParameterGroups'] = [dict(DBParameterGroupName=kwargs.pop('DBParameterGroupName'), ParameterApplyStatus='applying')]
+        if 'EnablePerformanceInsights' in kwargs:
+            instance.data['PerformanceInsightsEnabled'] = kwargs.pop('EnablePerformanceInsights')
+        self.modify(instance, kwargs, now, 'DB instance')
+        return dict(DBInstance=self.describe(instance, now))
+
+    def DeleteDBInstance(self, now, DBInstanceIdentifier, SkipFinalSnapshot=False, **kwargs):
+        instance = self.get('instance', DBInstanceIdentifier, now, 'DBInstanceNotFound')
+        self.delete(instance, now, 'DB instance')
+        return dict(DBInstance=self.describe(instance, now))
+
+    def RebootDBInstance(self, now, DBInstanceIdentifier, **kwargs):
+        instance = self.get('instance', DBInstanceIdentifier, now, 'DBInstanceNotFound')
+        instance.schedule_from(now, [(0, 'rebooting', 'DB instance restarted', ['availability']),
+                                     (self.delays['modify'], 'available', 'DB instance is available', ['availability'])])
+        return dict(DBInstance=self.describe(instance, now))
+
+    def DescribeDBInstances(self, now, DBInstanceIdentifier=None, Filters=None, MaxRecords=None, Marker=None, **kwargs):
+        if DBInstanceIdentifier:
+            instances = [self.get('instance', DBInstanceIdentifier.split(':')[-1], now, 'DBInstanceNotFound')]
+        else:
+            instances = self.live('instance', now)
+        instances = [i for i in instances if matches_filters(i.data, Filters, dict((
+            ('db-cluster-id', ('DBClusterIdentifier',)), ('db-instance-id', ('DBInstanceIdentifier', 'DBInstanceArn')),
+            ('engine', ('Engine',)))))]
+        page, marker = paginate(instances, MaxRecords, Marker)
+        return dict(DBInstances=[self.describe(i, now) for i in page], Marker=marker)
+
+    # Cluster snapshots
+
+    def CreateDBClusterSnapshot(self, now, DBClusterSnapshotIdentifier, DBClusterIdentifier, Tags=None, **kwargs):
+        cluster = self.get('cluster', DBClusterIdentifier, now, 'DBClusterNotFoundFault')
+        if self.get('snapshot', DBClusterSnapshotIdentifier, now) is not None:
+            raise SimulatedError('DBClusterSnapshotAlreadyExistsFault', 'Cluster snapshot already exists')
+        data = self.snapshot_data(DBClusterSnapshotIdentifier, DBClusterIdentifier, now, 'manual')
+        data.update(EngineVersion=cluster.data['EngineVersion'], Port=cluster.data['Port'], TagList=Tags or [])
+        steps = [(0, 'creating', 'Creating manual DB cluster snapshot', ['creation'])]
+        if self.fails(DBClusterSnapshotIdentifier):
+            steps.append((self.delays['snapshot'], 'failed', 'Failed to create DB cluster snapshot', ['failure']))
+        else:
+            steps.append((self.delays['snapshot'], 'available', 'Manual DB cluster snapshot created', ['creation']))
+        snapshot = self.add('snapshot', DBClusterSnapshotIdentifier, data, now, steps)
+        return dict(DBClusterSnapshot=self.describe(snapshot, now))
+
+    def CopyDBClusterSnapshot(self, now, SourceDBClusterSnapshotIdentifier, TargetDBClusterSnapshotIdentifier, CopyTags=False, Tags=None, **kwargs):
+        source = self.get('snapshot', SourceDBClusterSnapshotIdentifier.split(':')[-1], now, 'DBClusterSnapshotNotFoundFault')
+        if self.get('snapshot', TargetDBClusterSnapshotIdentifier, now) is not None:
+            raise SimulatedError('DBClusterSnapshotAlreadyExistsFault', 'Cluster snapshot already exists')
+        data = dict(source.data, DBClusterSnapshotIdentifier=TargetDBClusterSnapshotIdentifier,
+                    DBClusterSnapshotArn=self.arn('snapshot', TargetDBClusterSnapshotIdentifier),
+                    SnapshotCreateTime=timestamp(now), SnapshotType='manual',
+                    SourceDBClusterSnapshotArn=source.data['DBClusterSnapshotArn'],
+                    TagList=(list(source.data['TagList']) if CopyTags else []) + (Tags or []))
+        snapshot = self.add('snapshot', TargetDBClusterSnapshotIdentifier, data, now, [
+            (0, 'copying', 'Copying DB cluster snapshot', ['creation']),
+            (self.delays['snapshot'], 'available', 'DB cluster snapshot copied', ['creation']),
+        ])
+        return dict(DBClusterSnapshot=self.describe(snapshot, now))
+
+    def DeleteDBClusterSnapshot(self, now, DBClusterSnapshotIdentifier, **kwargs):
+        snapshot = self.get('snapshot', DBClusterSnapshotIdentifier, now, 'DBClusterSnapshotNotFoundFault')
+        if snapshot.data['SnapshotType'] == 'automated':
+            raise SimulatedError('InvalidDBClusterSnapshotStateFault', 'Automated snapshots cannot be deleted')
+        described = self.describe(snapshot, now)
+        snapshot.schedule_from(now, [(0, 'deleted', 'Deleted DB cluster snapshot', ['deletion'])])
+        return dict(DBClusterSnapshot=described)
+
+    def DescribeDBClusterSnapshots(self, now, DBClusterIdentifier=None, DBClusterSnapshotIdentifier=None, SnapshotType=None,
+                                   Filters=None, MaxRecords=None, Marker=None, **kwargs):
+        if DBClusterSnapshotIdentifier:
+            snapshots = [self.get('snapshot', DBClusterSnapshotIdentifier.split(':')[-1], now, 'DBClusterSnapshotNotFoundFault')]
+        else:
+            snapshots = self.live('snapshot', now)
+        if DBClusterIdentifier:
+            snapshots = [s for s in snapshots if s.data['DBClusterIdentifier'] == DBClusterIdentifier]
+        if SnapshotType:
+            snapshots = [s for s in snapshots if s.data['SnapshotType'] == SnapshotType]
+        snapshots = [s for s in snapshots if matches_filters(s.data, Filters, dict((
+            ('db-cluster-id', ('DBClusterIdentifier',)), ('db-cluster-snapshot-id', ('DBClusterSnapshotIdentifier', 'DBClusterSnapshotArn')),
+            ('snapshot-type', ('SnapshotType',)), ('engine', ('Engine',)))))]
+        page, marker = paginate(snapshots, MaxRecords, Marker)
+        return dict(DBClusterSnapshots=[self.describe(s, now) for s in page], Marker=marker)
+
+    # Events and tags
+
+    def DescribeEvents(self, now, SourceIdentifier=None, SourceType=None, StartTime=None, EndTime=None, Duration=None,
+                       EventCategories=None, MaxRecords=None, Marker=None, **kwargs):
+        end = epoch(EndTime) if EndTime else now
+        if StartTime:
+            start = epoch(StartTime)
+        else:
+            start = end - 60 * (Duration or 60)
+
+        events = []
+        for kind, source_type in self.SOURCE_TYPES.items():
+            if SourceType and SourceType != source_type:
+                continue
+            for resource_id, resource in self.resources[kind].items():
+                if SourceIdentifier and SourceIdentifier != resource_id:
+                    continue
+                for at, status, message, categories in resource.schedule:
+                    if start <= at <= min(end, now) and (not EventCategories or set(categories) & set(EventCategories)):
+                        events.append(dict(SourceIdentifier=resource_id, SourceType=source_type, Message=message,
+                                           EventCategories=categories, Date=timestamp(at),
+                                           SourceArn=resource.data[self.arn_key(kind)]))
+        events.sort(key=lambda e: e['Date'])
+        page, marker = paginate(events, MaxRecords, Marker)
+        return dict(Events=page, Marker=marker)
+
+    def ListTagsForResource(self, now, ResourceName, **kwargs):
+        return dict(TagList=self.by_arn(ResourceName, now).data['TagList'])
+
+    def AddTagsToResource(self, now, ResourceName, Tags, **kwargs):
+        resource = self.by_arn(ResourceName, now)
+        tags = dict((t['Key'], t['Value']) for t in resource.data['TagList'])
+        tags.update((t['Key'], t['Value']) for t in Tags)
+        resource.data['TagList'] = [dict(Key=k, Value=v) for k, v in sorted(tags.items())]
+        return dict()
+
+    def RemoveTagsFromResource(self, now, ResourceName, TagKeys, **kwargs):
+        resource = self.by_arn(ResourceName, now)
+        resource.data['TagList'] = [t for t in resource.data['TagList'] if t['Key'] not in TagKeys]
+        return dict()
+
+    # State transitions shared by resource kinds
+
+    def modify(self, resource, changes, now, label):
+        shape = self.model.shape_for(dict(cluster='DBCluster', instance='DBInstance')[resource.kind])
+        for name, value in changes.items():
+            if name == 'VpcSecurityGroupIds':
+                resource.data['VpcSecurityGroups'] = [dict(VpcSecurityGroupId=g, Status='active') for g in value]
+            elif name in shape.members:
+                resource.data[name] = value
+        resource.schedule_from(now, [(0, 'modifying', 'Modifying %s' % label, ['configuration change']),
+                                     (self.delays['modify'], 'available', 'Finished modifying %s' % label, ['configuration change'])])
+
+    def delete(self, resource, now, label):
+        resource.schedule_from(now, [(0, 'deleting', '%s deleted' % label, ['deletion']),
+                                     (self.delays['delete'], 'deleted', '%s deleted' % label, ['deletion'])])
+
+
+def timestamp(seconds):
+    return datetime.datetime.fromtimestamp(seconds, tzutc())
+
+
+def epoch(value):
+    if not isinstance(value, datetime.datetime):
+        value = botocore.utils.parse_timestamp(value)
+    return (value - datetime.datetime(1970, 1, 1, tzinfo=tzutc())).total_seconds()
+
+
+def matches_filters(data, filters, keys):
+    """Whether a description matches all of the filters, given the keys each filter name matches on"""
+    for f in filters or []:
+        if f['Name'] not in keys:
+            raise SimulatedError('InvalidParameterValue', 'Unrecognized filter name: %s' % f['Name'])
+        if not any(data.get(k) in f['Values'] for k in keys[f['Name']]):
+            return False
+    return True
+
+
+def paginate(items, max_records, marker):
+    max_records = max_records or MAX_RECORDS
+    if not MIN_RECORDS <= max_records <= MAX_RECORDS:
+        raise SimulatedError('InvalidParameterValue', 'MaxRecords must be between %d and %d' % (MIN_RECORDS, MAX_RECORDS))
+    start = int(marker or 0)
+    end = start + max_records
+    return items[start:end], str(end) if end < len(items) else None
+
+
+# Query protocol serialization, driven by the botocore service model
+
+def parse_input(params, shape, key):
+    """Build the keyword arguments of an operation from its flattened query parameters"""
+    def join(name):
+        return '%s.%s' % (key, name) if key else name
+
+    if shape.type_name == 'structure':
+        result = dict()
+        for name, member in shape.members.items():
+            value = parse_input(params, member, join(member.serialization.get('name', name)))
+            if value is not None:
+                result[name] = value
+        return result if result or not key else None
+    if shape.type_name == 'list':
+        member_name = shape.member.serialization.get('name', 'member')
+        items = []
+        for n in itertools.count(1):
+            value = parse_input(params, shape.member, '%s.%s.%d' % (key, member_name, n))
+            if value is None:
+                break
+            items.append(value)
+        return items if items or key in params else None
+    if key not in params:
+        return None
+
+    value = params[key]
+    if shape.type_name in ('integer', 'long'):
+        return int(value)
+    if shape.type_name in ('float', 'double'):
+        return float(value)
+    if shape.type_name == 'boolean':
+        return value == 'true'
+    if shape.type_name == 'timestamp':
+        return botocore.utils.parse_timestamp(value)
+    return value
+
+
+def serialize_output(parent, shape, value):
+    if shape.type_name == 'structure':
+        for name, member in shape.members.items():
+            if value.get(name) is not None:
+                serialize_output(ElementTree.SubElement(parent, member.serialization.get('name', name)), member, value[name])
+    elif shape.type_name == 'list':
+        member_name = shape.member.serialization.get('name', 'member')
+        for item in value:
+            serialize_output(ElementTree.SubElement(parent, member_name), shape.member, item)
+    elif shape.type_name == 'boolean':
+        parent.text = 'true' if value else 'false'
+    elif shape.type_name == 'timestamp':
+        parent.text = value.astimezone(tzutc()).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    else:
+        parent.text = '%s' % value
+
+
+def success_response(operation, result, request_id):
+    root = ElementTree.Element('%sResponse' % operation.name, xmlns=XMLNS)
+    if operation.output_shape is not None:
+        wrapper = ElementTree.SubElement(root, operation.output_shape.serialization.get('resultWrapper', '%sResult' % operation.name))
+        serialize_output(wrapper, operation.output_shape, result)
+    metadata = ElementTree.SubElement(root, 'ResponseMetadata')
+    ElementTree.SubElement(metadata, 'RequestId').text = request_id
+    return ElementTree.tostring(root)
+
+
+def error_response(error, request_id):
+    root = ElementTree.Element('ErrorResponse', xmlns=XMLNS)
+    element = ElementTree.SubElement(root, 'Error')
+    ElementTree.SubElement(element, 'Type').text = 'Sender'
+    ElementTree.SubElement(element, 'Code').text = error.code
+    ElementTree.SubElement(element, 'Message').text = str(error)
+    ElementTree.SubElement(root, 'RequestId').text = request_id
+    return ElementTree.tostring(root)
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        params = dict((k, v[0]) for k, v in parse_qs(body.decode('utf-8'), keep_blank_values=True).items())
+        status, response = self.server.backend.handle(params)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RDSSimulator(ThreadingMixIn, HTTPServer):
+    """HTTP server for an RDSBackend, which can be run in a background thread with start()"""
+    daemon_threads = True
+
+    def __init__(self, backend, port=0, host='127.0.0.1'):
+        self.backend = backend
+        HTTPServer.__init__(self, (host, port), SimulatorHandler)
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def backend_argument_parser(parser):
+    """Add the options of RDSBackend to an argparse parser"""
+    for name, default in sorted(DEFAULT_DELAYS.items()):
+        parser.add_argument('--%s-delay' % name, type=float, default=default, help='seconds for %s transitions (default %%(default)s)' % name)
+    parser.add_argument('--latency', type=float, default=0, help='seconds added to every request')
+    parser.add_argument('--throttle-rate', type=float, default=0, help='fraction of requests to reject with Throttling')
+    parser.add_argument('--max-rps', type=float, default=0, help='requests per second above which requests are throttled (0 for no limit)')
+    parser.add_argument('--failure-rate', type=float, default=0, help='fraction of created resources which fail')
+    parser.add_argument('--fail-pattern', help='regular expression of resource IDs which fail to be created')
+    parser.add_argument('--seed', type=int, help='random seed, for repeatable throttling and failures')
+    return parser
+
+
+def backend_from_args(args):
+    return RDSBackend(
+        delays=dict((name, getattr(args, '%s_delay' % name)) for name in DEFAULT_DELAYS),
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        max_rps=args.max_rps,
+        failure_rate=args.failure_rate,
+        fail_pattern=args.fail_pattern,
+        seed=args.seed,
+    )
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Simulated RDS endpoint for the rds_cluster* modules')
+    parser.add_argument('--port', type=int, default=8765, help='port to listen on')
+    args = backend_argument_parser(parser).parse_args()
+
+    server = RDSSimulator(backend_from_args(args), args.port)
+    print('Simulated RDS endpoint listening on %s' % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -6,7 +6,7 @@ module: rds_cluster
 short_description: Manage RDS database clusters (currently Aurora)
 description:
     - Manages RDS database clusters
-    - Can additionally restore clusters from a snapshot
+    - Can additionally restore clusters from a snapshot, or clone an existing cluster to a point in time
 options:
   cluster_id:
     description:
@@ -18,6 +18,37 @@ options:
       - If specified, and cluster does not exist, will restore from the specified snapshot.
       - When not specified, a new cluster will be created.
     required: false
+  source_cluster_id:
+    description:
+      - ID of an existing cluster to clone.
+      - If specified, and cluster does not exist, will restore the source cluster to a point in time with
+        restore_db_cluster_to_point_in_time, which with I(restore_type=copy-on-write) is an Aurora fast clone.
+      - The engine, engine version, database name and availability zones are those of the source cluster.
+      - Mutually exclusive with I(snapshot_arn).
+    required: false
+  restore_type:
+    description:
+      - How to clone I(source_cluster_id).
+      - C(copy-on-write) shares the storage of the source cluster, only copying pages as they change, so the clone
+        is ready in minutes whatever the size of the cluster and only changed pages are paid for.
+      - C(full-copy) copies all of the storage of the source cluster, which takes as long as restoring a snapshot.
+    choices:
+      - copy-on-write
+      - full-copy
+    required: false
+    default: copy-on-write
+  restore_time:
+    description:
+      - Time to which to restore I(source_cluster_id), as an ISO 8601 timestamp such as C(2017-03-01T09:30:00Z).
+      - Must be within the backup retention period of the source cluster.
+    required: false
+    default: null
+  use_latest_restorable_time:
+    description:
+      - Restore I(source_cluster_id) to its latest restorable time, a few minutes before the present.
+      - One of I(restore_time) or I(use_latest_restorable_time=yes) is required with I(source_cluster_id).
+    required: false
+    default: false
   availability_zones:
     description:
       - List of availability zones in which to locate the new cluster
@@ -25,7 +56,7 @@ options:
   engine:
     description:
       - Database engine to use for the new cluster
-      - Used when creating a new cluster or restoring from snapshot.
+      - Used when creating a new cluster or restoring from snapshot. Clones use the engine of I(source_cluster_id).
     choices:
       - aurora
     default: aurora
@@ -37,12 +68,12 @@ options:
   master_username:
     description:
       - Master username to set.
-      - Used when state=present and snapshot_arn is not set.
+      - Used when state=present and neither snapshot_arn nor source_cluster_id is set.
     default: null
   master_password:
     description:
       - Master password to set.
-      - Used when state=present and snapshot_arn is not set.
+      - Used when state=present and neither snapshot_arn nor source_cluster_id is set.
     default: null
   port:
     description:
@@ -71,22 +102,120 @@ options:
       - absent
     default: present
     required: false
+  delete_instances:
+    description:
+      - When deleting the cluster, first delete all of its instances, all at the same time, and wait for them to be
+        deleted together.
+      - When C(no), a cluster which still has instances is not deleted.
+    required: false
+    default: false
+  final_snapshot_id:
+    description:
+      - ID of a snapshot to take of the cluster when it is deleted.
+      - Required when deleting a cluster, unless I(skip_final_snapshot=yes).
+    required: false
+    default: null
+  skip_final_snapshot:
+    description:
+      - Delete the cluster without taking a final snapshot.
+    required: false
+    default: false
   tags:
     description:
       - Dictionary of tags to assign to the new cluster
+      - When the cluster already exists, its tags are updated to match.
     default: null
+  purge_tags:
+    description:
+      - Whether to remove tags from an existing cluster which are not specified in I(tags).
+    default: true
   vpc_security_group_ids:
     description:
       - List of VPC security group IDs with which to associate the new cluster
     default: null
+  instances:
+    description:
+      - List of DB instances to create in (or modify to match in) the cluster.
+      - Each entry is a dictionary with I(instance_id), I(instance_type) and optionally any other option of the
+        rds_cluster_instance module which can be set for each of its I(instances), such as I(promotion_tier).
+      - The instances are created as soon as the cluster exists, without waiting for it to become available, so
+        that a restore and the launch of its instances overlap. Requests which are refused while the cluster is
+        not yet ready are retried until I(wait_timeout).
+      - With I(wait=yes), the cluster and its instances are waited for together.
+      - Changes to instances which already exist are made in the next maintenance window, unless
+        I(apply_immediately=yes).
+    required: false
+    default: null
+  apply_immediately:
+    description:
+      - Whether changes to existing instances in I(instances) are applied immediately, rather than during the next
+        maintenance window, as for the rds_cluster_instance module.
+    choices: ["yes", "no"]
+    required: false
+    default: false
+  concurrency:
+    description:
+      - Maximum number of I(instances) to create or modify, or instances to delete, at the same time.
+    required: false
+    default: 10
   wait:
     description:
       - Whether or not to wait for the restored cluster to become available
+      - When C(no), the module returns straight away with a I(wait_token) which can be passed to the
+        rds_cluster_wait module to wait for the cluster later, along with other clusters and instances.
     default: false
   wait_timeout:
     description:
       - Number of seconds to wait for the new cluster to become available before giving up
-    default: 600 when creating, 3600 when restoring from snapshot (yes an entire hour)
+    default: 600 when creating, 3600 when restoring from snapshot or with I(restore_type=full-copy) (yes an entire hour),
+      1200 when cloning with I(restore_type=copy-on-write), 1800 when deleting
+  wait_delay:
+    description:
+      - Number of seconds between the first status checks when I(wait=yes).
+    default: 5
+  wait_max_delay:
+    description:
+      - Maximum number of seconds between status checks when I(wait=yes).
+    default: 60
+  wait_backoff:
+    description:
+      - Factor by which the interval between status checks grows after each check.
+    default: 1.5
+  wait_jitter:
+    description:
+      - Fraction by which each interval between status checks is randomly varied.
+    default: 0.2
+  wait_method:
+    description:
+      - How to detect when the wait is over.
+      - C(poll) checks the status of the resources each time.
+      - C(events) follows the RDS event stream and only checks the status of the resources once an event
+        occurs for one of them, failing immediately on a failure event.
+    choices: ['poll', 'events']
+    default: poll
+  metrics:
+    description:
+      - Include a C(metrics) key in the result, with the number, latency, retries and throttles of the API calls made
+        per operation, and the time spent in each phase of the module.
+    required: false
+    default: false
+  rate_limit:
+    description:
+      - Maximum number of RDS requests per second, shared by all of the rds_cluster* module processes on the host
+        which use the same region and credentials, such as parallel forks. C(0) for no limit.
+      - Throttling responses from AWS reduce the rate, which then recovers to this limit over a minute.
+    required: false
+    default: 0
+  rate_limit_burst:
+    description:
+      - Number of requests which may be made at once before I(rate_limit) applies.
+    required: false
+    default: one second of requests at I(rate_limit)
+  rate_limit_path:
+    description:
+      - Directory in which to keep the state of the shared rate limit.
+    required: false
+    default: ~/.ansible/tmp/rds_cluster_rate_limit
 
 author: "Tom Bamford (@manicminer)"
 extends_documentation_fragment:
@@ -122,6 +251,94 @@ EXAMPLES = '''
       Env: staging
       Owner: my-name
     wait: yes
+
+# Clone a production cluster for staging as it was at the latest restorable time, with a writer
+- local_action:
+    module: rds_cluster
+    cluster_id: my-staging-cluster
+    source_cluster_id: my-production-cluster
+    restore_type: copy-on-write
+    use_latest_restorable_time: yes
+    subnet_group: my-subnet-group-name
+    instances:
+      - instance_id: my-staging-cluster-001
+        instance_type: db.r4.large
+    wait: yes
+
+# Full copy of a cluster as it was at a point in time
+- local_action:
+    module: rds_cluster
+    cluster_id: my-restored-cluster
+    source_cluster_id: my-production-cluster
+    restore_type: full-copy
+    restore_time: "2017-03-01T09:30:00Z"
+    subnet_group: my-subnet-group-name
+
+# Delete a test cluster and all of its instances, without a final snapshot
+- local_action:
+    module: rds_cluster
+    cluster_id: my-test-cluster
+    subnet_group: my-subnet-group-name
+    state: absent
+    delete_instances: yes
+    skip_final_snapshot: yes
+    wait: yes
+
+# Restore from a snapshot with a writer and a reader, launching the instances during the restore
+- local_action:
+    module: rds_cluster
+    cluster_id: my-new-cluster
+    snapshot_arn: "arn:aws:rds:us-east-1:1234567890:cluster-snapshot:rds:my-existing-snapshot"
+    subnet_group: my-subnet-group-name
+    instances:
+      - instance_id: my-new-cluster-001
+        instance_type: db.r4.large
+        promotion_tier: 0
+      - instance_id: my-new-cluster-002
+        instance_type: db.r4.large
+    wait: yes
+
+# Create two clusters without blocking, then wait for both at once
+- local_action:
+    module: rds_cluster
+    cluster_id: "{{ item }}"
+    subnet_group: my-subnet-group-name
+  with_items:
+    - my-first-cluster
+    - my-second-cluster
+  register: clusters
+
+- local_action:
+    module: rds_cluster_wait
+    tokens: "{{ clusters.results | map(attribute='wait_token') | list }}"
+    wait_timeout: 1200
+'''
+
+RETURN = '''
+diff:
+    description:
+      - The options which were changed, with their values I(before) and I(after), or all of the options given when
+        the cluster was created.
+      - I(availability_zones) and I(database_name) can only be set when the cluster is created, so are not compared.
+    returned: when state=present
+    type: dict
+    sample: {"before": {"port": 3306}, "after": {"port": 3307}}
+instances:
+    description:
+      - The result of creating or modifying each of I(instances), with a I(wait_token) for each when I(wait=no).
+      - When deleting the cluster with I(delete_instances=yes), the result of deleting each of its instances.
+    returned: when instances is set, or when instances of the cluster were deleted
+    type: list
+    sample: [{"instance_id": "my-new-cluster-001", "changed": true, "result": {"DBInstance": {"DBInstanceStatus": "creating"}}}]
+metrics:
+    description:
+      - API call counts, latencies, retries and throttles per operation, the seconds spent in each phase, and the
+        seconds spent waiting for I(rate_limit).
+    returned: when metrics is enabled
+    type: dict
+    sample: {"wall_time": 3.2, "api_calls": 2, "throttles": 0, "rate_limit_wait": 0.0, "phases": {"describe": 0.4},
+             "operations": {"describe_db_clusters": {"calls": 1, "errors": 0, "retries": 0, "throttles": 0,
+                                                     "time": 0.4, "max_time": 0.4, "bytes": 2048}}}
 '''
 
 try:
@@ -131,6 +348,49 @@ try:
 except ImportError:
     HAS_BOTO3 = False
 
+from multiprocessing.pool import ThreadPool
+
+# Arguments of a new cluster which a clone takes from its source cluster instead
+CLONE_SOURCE_ARGS = ['AvailabilityZones', 'DatabaseName', 'Engine', 'EngineVersion']
+
+# Errors returned when creating an instance in a cluster which is not yet ready for it
+MEMBER_RETRY_ERRORS = ['InvalidDBClusterStateFault']
+
+
+def create_members(client, **params):
+    """Create or modify the instances of the cluster concurrently
+
+    Each instance is created as soon as the cluster accepts it, retrying
+    with backoff until wait_timeout while the cluster is not ready.
+    """
+    options = waiter_options(params)
+    del options['events']
+
+    def ensure(instance_params):
+        outcome = dict(instance_id=instance_params['instance_id'])
+
+        def attempt():
+            try:
+                return True, ensure_db_instance(client, **instance_params)
+            except RDSClusterError as e:
+                if e.details.get('error_code') in MEMBER_RETRY_ERRORS:
+                    return False, None
+                raise
+
+        try:
+            outcome['changed'], outcome['result'], outcome['diff'] = wait_for(attempt, params['wait_timeout'], **options)
+        except RDSClusterError as e:
+            outcome.update(e.details, failed=True, msg=str(e))
+        except WaitTimeout:
+            outcome.update(failed=True, msg='Timed out waiting for DB cluster to accept the instance')
+        return outcome
+
+    pool = ThreadPool(max(1, min(params['concurrency'], len(params['instances']))))
+    try:
+        return pool.map(ensure, params['instances'])
+    finally:
+        pool.close()
+
 
 def create_cluster(module, client, **params):
 
@@ -147,32 +407,39 @@ def create_cluster(module, client, **params):
         api_args['OptionGroupName'] = params['option_group']
     if params['vpc_security_group_ids'] is not None:
         api_args['VpcSecurityGroupIds'] = params['vpc_security_group_ids']
-    if params['tags'] is not None:
-        api_args['Tags'] = [dict(Key=k, Value=v) for k, v in params['tags'].iteritems()]
+
+    changed = False
 
     try:
-        check_cluster = client.describe_db_clusters(DBClusterIdentifier=params['cluster_id'])
+        with phase('describe'):
+            check_cluster = client.describe_db_clusters(DBClusterIdentifier=params['cluster_id'])
 
         if 'DBClusters' not in check_cluster or len(check_cluster['DBClusters']) != 1:
             module.fail_json(msg='Failed to retrieve details for existing cluster')
 
         # Determine cluster modifications to make
         cluster = check_cluster['DBClusters'][0]
-        modify_args = dict()
-        for opt, val in api_args.iteritems():
-            if opt == 'VpcSecurityGroupIds':
-                if sorted([g['VpcSecurityGroupId'] for g in cluster['VpcSecurityGroups']]) != sorted(val):
-                    modify_args[opt] = val
-            elif cluster[opt] != val:
-                modify_args[opt] = val
+        with phase('diff'):
+            modify_args, diff = diff_resource(CLUSTER_FIELDS, cluster, api_args)
 
         if modify_args:
             # Modify existing cluster
-            result = client.modify_db_cluster(DBClusterIdentifier=params['cluster_id'], **modify_args)
+            with phase('modify'):
+                result = client.modify_db_cluster(DBClusterIdentifier=params['cluster_id'], **modify_args)
+            changed = True
         else:
             # Return existing cluster details verbatim
             result = dict(DBCluster=cluster)
 
+        # Set cluster tags
+        if params['tags'] is not None:
+            with phase('tagging'):
+                current_tags = resource_tags(client, cluster)
+                tag_diff = reconcile_tags(client, cluster['DBClusterArn'], current_tags, params['tags'], params['purge_tags'])
+            if any(tag_diff.values()):
+                changed = True
+                tags_diff(diff, current_tags, tag_diff, params['tags'])
+
         if params['wait_timeout'] == 0:
             params['wait_timeout'] = 600
 
@@ -185,12 +452,34 @@ def create_cluster(module, client, **params):
                 api_args['Engine'] = params['engine']
             if params['subnet_group'] is not None:
                 api_args['DBSubnetGroupName'] = params['subnet_group']
+            if params['tags'] is not None:
+                api_args['Tags'] = [dict(Key=k, Value=v) for k, v in params['tags'].items()]
 
+            if params['source_cluster_id'] is not None:
+                for key in CLONE_SOURCE_ARGS:
+                    api_args.pop(key, None)
+
+            changed = True
+            diff = creation_diff(CLUSTER_FIELDS, api_args)
             try:
+                # Clone an existing cluster
+                if params['source_cluster_id'] is not None:
+                    api_args['SourceDBClusterIdentifier'] = params['source_cluster_id']
+                    api_args['RestoreType'] = params['restore_type']
+                    if params['restore_time'] is not None:
+                        api_args['RestoreToTime'] = params['restore_time']
+                    if params['use_latest_restorable_time']:
+                        api_args['UseLatestRestorableTime'] = True
+                    with phase('create'):
+                        result = client.restore_db_cluster_to_point_in_time(**api_args)
+                    if params['wait_timeout'] == 0:
+                        params['wait_timeout'] = 1200 if params['restore_type'] == 'copy-on-write' else 3600
+
                 # Restore from snapshot
-                if params['snapshot_arn'] is not None:
+                elif params['snapshot_arn'] is not None:
                     api_args['SnapshotIdentifier'] = params['snapshot_arn']
-                    result = client.restore_db_cluster_from_snapshot(**api_args)
+                    with phase('create'):
+                        result = client.restore_db_cluster_from_snapshot(**api_args)
                     if params['wait_timeout'] == 0:
                         params['wait_timeout'] = 3600
 
@@ -200,7 +489,8 @@ def create_cluster(module, client, **params):
                         api_args['MasterUsername'] = params['master_username']
                     if params['master_password'] is not None:
                         api_args['MasterUserPassword'] = params['master_password']
-                    result = client.create_db_cluster(**api_args)
+                    with phase('create'):
+                        result = client.create_db_cluster(**api_args)
                     if params['wait_timeout'] == 0:
                         params['wait_timeout'] = 600
 
@@ -209,30 +499,113 @@ def create_cluster(module, client, **params):
         else:
             module.fail_json(msg=str(e), api_args=api_args)
 
-    if params['wait']:
-        wait_timeout = time.time() + params['wait_timeout']
-        ready = False
-        while not ready and wait_timeout > time.time():
-            try:
-                check_cluster = client.describe_db_clusters(DBClusterIdentifier=params['cluster_id'])
-                if 'DBClusters' in check_cluster and len(check_cluster['DBClusters']) == 1:
-                    if check_cluster['DBClusters'][0]['Status'].lower() == 'available':
-                        ready = True
+    members = dict()
+    if params['instances'] is not None:
+        # Launch the instances without waiting for the cluster, so that they are created while it is restored
+        with phase('instances'):
+            members['instances'] = create_members(client, **params)
+        changed = changed or any(r.get('changed') for r in members['instances'])
+        failed = [r for r in members['instances'] if r.get('failed')]
+        if failed:
+            module.fail_json(msg='Failed to create or modify %d of %d DB instances' % (len(failed), len(members['instances'])),
+                             changed=changed, result=result, diff=diff, **members)
 
-            except (botocore.exceptions.ClientError, boto.exception.BotoServerError), e:
-                pass
+    if not params['wait']:
+        token = wait_token('cluster', params['cluster_id'], params['region'])
+        for r in members.get('instances', []):
+            r['wait_token'] = wait_token('instance', r['instance_id'], params['region'], cluster_id=params['cluster_id'])
+        module.exit_json(changed=changed, result=result, diff=diff, wait_token=token, **members)
+
+    instances = dict((r['instance_id'], (params['cluster_id'], 'available')) for r in members.get('instances', []))
+    try:
+        with phase('wait'):
+            wait_for_resources(client, params['wait_timeout'], clusters={params['cluster_id']: 'available'}, instances=instances,
+                               **waiter_options(params))
+    except RDSClusterError as e:
+        module.fail_json(msg=str(e), **e.details)
+    except WaitTimeout as e:
+        last = e.last or {}
+        module.fail_json(msg='Timed out waiting for DB cluster to become available', cluster=last.get(('cluster', params['cluster_id'])),
+                         instances=dict((i, d) for (t, i), d in last.items() if t == 'instance'))
+    except botocore.exceptions.ClientError as e:
+        module.fail_json(msg=str(e))
+
+    module.exit_json(changed=changed, result=result, diff=diff, **members)
+
+
+def terminate_cluster(module, client, **params):
+    """Delete the cluster, after deleting all of its instances concurrently when delete_instances is set"""
+    if params['wait_timeout'] == 0:
+        params['wait_timeout'] = 1800
+
+    try:
+        with phase('describe'):
+            cluster = poll_clusters(client, [params['cluster_id']]).get(params['cluster_id'])
+    except botocore.exceptions.ClientError as e:
+        module.fail_json(msg=str(e))
 
-            if not ready:
-                time.sleep(5)
+    if cluster is None:
+        module.exit_json(changed=False)
+    if cluster['Status'] == 'deleting' and not params['wait']:
+        module.exit_json(changed=False, result=dict(DBCluster=cluster), wait_token=wait_token('cluster', params['cluster_id'], params['region'], status='deleted'))
 
-        if wait_timeout <= time.time():
-            if 'DBClusters' in check_cluster and len(check_cluster['DBClusters']) == 1:
-                cluster = check_cluster['DBClusters'][0]
-            else:
-                cluster = None
-            module.fail_json(msg='Timed out waiting for DB cluster to become available', cluster=cluster)
+    changed = False
+    members = [m['DBInstanceIdentifier'] for m in cluster.get('DBClusterMembers', [])]
+    instances = None
+    if members and cluster['Status'] != 'deleting':
+        if not params['delete_instances']:
+            module.fail_json(msg='DB cluster %s still has instances, set delete_instances to delete them too' % params['cluster_id'],
+                             instances=members)
 
-    module.exit_json(result=result)
+        with phase('delete'):
+            instances = delete_db_instances(client, members, params['concurrency'])
+        changed = any(i['changed'] for i in instances)
+        failed = [i for i in instances if i.get('failed')]
+        if failed:
+            module.fail_json(msg='Failed to delete %d of %d DB instances' % (len(failed), len(instances)), changed=changed, instances=instances)
+
+        # The cluster can only be deleted once its instances are gone
+        targets = dict((i, (params['cluster_id'], 'deleted')) for i in members)
+        try:
+            with phase('wait'):
+                wait_for_resources(client, params['wait_timeout'], instances=targets, **waiter_options(params))
+        except RDSClusterError as e:
+            module.fail_json(msg=str(e), changed=changed, instances=instances, **e.details)
+        except WaitTimeout as e:
+            module.fail_json(msg='Timed out waiting for the DB instances of the cluster to be deleted', changed=changed, instances=instances,
+                             pending=dict((i, d) for (t, i), d in (e.last or {}).items()))
+        except botocore.exceptions.ClientError as e:
+            module.fail_json(msg=str(e), changed=changed, instances=instances)
+
+    result = dict(DBCluster=cluster)
+    if cluster['Status'] != 'deleting':
+        api_args = dict(DBClusterIdentifier=params['cluster_id'], SkipFinalSnapshot=params['skip_final_snapshot'])
+        if params['final_snapshot_id'] is not None:
+            api_args['FinalDBSnapshotIdentifier'] = params['final_snapshot_id']
+        try:
+            with phase('delete'):
+                result = client.delete_db_cluster(**api_args)
+            changed = True
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] != 'DBClusterNotFoundFault':
+                module.fail_json(msg=str(e), changed=changed, api_args=api_args, instances=instances)
+
+    members = dict(instances=instances) if instances is not None else dict()
+    if not params['wait']:
+        token = wait_token('cluster', params['cluster_id'], params['region'], status='deleted')
+        module.exit_json(changed=changed, result=result, wait_token=token, **members)
+
+    try:
+        with phase('wait'):
+            wait_for_resources(client, params['wait_timeout'], clusters={params['cluster_id']: 'deleted'}, **waiter_options(params))
+    except RDSClusterError as e:
+        module.fail_json(msg=str(e), changed=changed, **e.details)
+    except WaitTimeout as e:
+        module.fail_json(msg='Timed out waiting for DB cluster to be deleted', changed=changed, cluster=(e.last or {}).get(('cluster', params['cluster_id'])))
+    except botocore.exceptions.ClientError as e:
+        module.fail_json(msg=str(e), changed=changed)
+
+    module.exit_json(changed=changed, result=result, **members)
 
 
 def main():
@@ -250,23 +623,70 @@ def main():
         state = dict(required=False, default='present', choices=['present', 'absent']),
         subnet_group=dict(required=True),
         tags=dict(type='dict', required=False),
+        purge_tags=dict(type='bool', required=False, default=True),
         vpc_security_group_ids=dict(type='list', required=False),
         wait=dict(type='bool', required=False, default=False),
         wait_timeout=dict(type='int', required=False, default=0),
+        instances=dict(type='list', required=False),
+        apply_immediately=dict(type='bool', required=False, default=False),
+        concurrency=dict(type='int', required=False, default=10),
+        delete_instances=dict(type='bool', required=False, default=False),
+        final_snapshot_id=dict(required=False),
+        skip_final_snapshot=dict(type='bool', required=False, default=False),
+        source_cluster_id=dict(required=False),
+        restore_type=dict(required=False, choices=['copy-on-write', 'full-copy'], default='copy-on-write'),
+        restore_time=dict(required=False),
+        use_latest_restorable_time=dict(type='bool', required=False, default=False),
     )
+    module_args.update(waiter_argument_spec())
+    module_args.update(metrics_argument_spec())
+    module_args.update(rate_limit_argument_spec())
     argument_spec = ec2_argument_spec()
     argument_spec.update(module_args)
-    module = AnsibleModule(argument_spec=argument_spec)
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        mutually_exclusive=[['snapshot_arn', 'source_cluster_id'], ['restore_time', 'use_latest_restorable_time']],
+    )
     args_dict = {arg: module.params.get(arg) for arg in module_args.keys()}
 
+    if args_dict['source_cluster_id'] is None and (args_dict['restore_time'] is not None or args_dict['use_latest_restorable_time']):
+        module.fail_json(msg='restore_time and use_latest_restorable_time require source_cluster_id')
+    if args_dict['source_cluster_id'] is not None and args_dict['restore_time'] is None and not args_dict['use_latest_restorable_time']:
+        module.fail_json(msg='restore_time or use_latest_restorable_time is required with source_cluster_id')
+    if args_dict['source_cluster_id'] is not None:
+        inherited = [opt for opt in ('availability_zones', 'database_name', 'engine_version') if args_dict[opt] is not None]
+        if inherited:
+            module.fail_json(msg='%s can not be set when cloning, they are those of the source cluster' % ', '.join(inherited))
+
+    if args_dict['state'] == 'absent' and not args_dict['skip_final_snapshot'] and args_dict['final_snapshot_id'] is None:
+        module.fail_json(msg='final_snapshot_id is required to delete a cluster, unless skip_final_snapshot is set')
+
+    if args_dict['instances'] is not None:
+        instance_args = instance_argument_spec()
+        defaults = dict((opt, spec.get('default')) for opt, spec in instance_args.items())
+        defaults.update(
+            cluster_id=args_dict['cluster_id'],
+            subnet_group=args_dict['subnet_group'],
+            engine=args_dict['engine'],
+            apply_immediately=args_dict['apply_immediately'],
+        )
+        args_dict['instances'] = [instance_params(module, instance_args, defaults, i) for i in args_dict['instances']]
+
     if not HAS_BOTO3:
         module.fail_json(msg='boto3 required for this module')
 
     try:
         region, ec2_url, aws_connect_kwargs = get_aws_connection_info(module, boto3=True)
-        rds = boto3_conn(module, conn_type='client', resource='rds', region=region, endpoint=ec2_url, **aws_connect_kwargs)
-    except botocore.exceptions.ClientError, e:
+        rds = rds_client(module, region, ec2_url, aws_connect_kwargs)
+    except botocore.exceptions.ClientError as e:
         module.fail_json(msg="Boto3 Client Error - " + str(e))
+    args_dict['region'] = region
+
+    if module.params.get('metrics'):
+        instrument(module, rds)
+
+    if module.params.get('rate_limit'):
+        rate_limit(rds, module.params, region, ec2_url, aws_connect_kwargs)
 
     if module.params.get('state') == 'present':
         create_cluster(module=module, client=rds, **args_dict)
@@ -276,6 +696,12 @@ def main():
 # import module snippets
 from ansible.module_utils.basic import *
 from ansible.module_utils.ec2 import *
+from ansible.module_utils.rds_cluster_broker import rds_client
+from ansible.module_utils.rds_cluster_diff import CLUSTER_FIELDS, creation_diff, diff_resource, tags_diff
+from ansible.module_utils.rds_cluster_instances import delete_db_instances, ensure_db_instance, instance_argument_spec, instance_params
+from ansible.module_utils.rds_cluster_metrics import instrument, metrics_argument_spec, phase
+from ansible.module_utils.rds_cluster_ratelimit import rate_limit, rate_limit_argument_spec
+from ansible.module_utils.rds_cluster_utils import *
 
 if __name__ == '__main__':
     main()
@@ -74,7 +74,40 @@ options:
   instance_id:
     description:
       - Identifier of a DB instance
+      - One of I(instance_id) or I(instances) is required.
     required: false
+  instances:
+    description:
+      - List of DB instances to manage together, instead of a single I(instance_id).
+      - Each entry is a dictionary which must contain I(instance_id), and may set any of
+        I(auto_minor_version_upgrade), I(availability_zone), I(cloudwatch_logs_exports), I(cluster_id),
+        I(copy_tags_to_snapshot), I(instance_type), I(monitoring_interval), I(monitoring_role_arn), I(multi_az),
+        I(option_group), I(parameter_group), I(performance_insights), I(preferred_maintenance_window),
+        I(promotion_tier), I(publicly_accessible), I(purge_tags), I(subnet_group) and I(tags) to override the module options.
+      - The instances are created or modified concurrently and, when I(wait=yes), waited for together
+        with a single status request per cluster.
+    required: false
+    default: null
+  concurrency:
+    description:
+      - Maximum number of instances in I(instances) to create, modify or delete at the same time.
+    required: false
+    default: 10
+  rolling:
+    description:
+      - Modify the existing members of the cluster in I(instances) in batches, waiting for each batch to be available
+        again before the next, so that only I(max_unavailable) readers are out of service at a time.
+      - Readers are modified first, ordered by promotion tier and then ID, and the writer last on its own.
+        Instances which are not yet members of the cluster are created together before the update starts.
+      - Changes are always applied immediately, as with I(apply_immediately=yes).
+      - Requires I(cluster_id) and I(instances).
+    required: false
+    default: false
+  max_unavailable:
+    description:
+      - Maximum number of readers to modify at the same time when I(rolling=yes).
+    required: false
+    default: 1
   instance_type:
     description:
       - The instance type of the database.
@@ -149,6 +182,7 @@ options:
   state:
     description:
       - "present" to create an instance, "absent" to delete an instance
+      - With I(instances), all of them are deleted at the same time and, when I(wait=yes), waited for together.
     choices:
       - present
       - absent
@@ -164,12 +198,21 @@ options:
     description:
       - Dictionary of tags to apply to a resource.
       - Used when state=present.
+      - When omitted, the tags on an existing instance are left unchanged.
     required: false
     default: null
+  purge_tags:
+    description:
+      - Whether to remove tags from an existing instance which are not specified in I(tags).
+      - Used when state=present and I(tags) is specified.
+    choices: ["yes", "no"]
+    required: false
+    default: true
   wait:
     description:
-      - Whether or not to wait for instance to become available.
-      - Used when state=present.
+      - Whether or not to wait for instance to become available, or to be deleted when state=absent.
+      - When C(no), the module returns straight away with a I(wait_token) for each instance which can be passed
+        to the rds_cluster_wait module to wait for the instance later, along with other clusters and instances.
     choices:
         - yes
         - no
@@ -177,11 +220,62 @@ options:
     default: false
   wait_timeout:
     description:
-      - How long to wait for instance to become available, when wait=yes
+      - How long to wait for instance to become available (or to be deleted), when wait=yes
       - Defaults to 20 minutes.
-      - Used when state=present and wait=yes.
     required: false
     default: 1200
+  wait_delay:
+    description:
+      - Number of seconds between the first status checks when I(wait=yes).
+    required: false
+    default: 5
+  wait_max_delay:
+    description:
+      - Maximum number of seconds between status checks when I(wait=yes).
+    required: false
+    default: 60
+  wait_backoff:
+    description:
+      - Factor by which the interval between status checks grows after each check.
+    required: false
+    default: 1.5
+  wait_jitter:
+    description:
+      - Fraction by which each interval between status checks is randomly varied.
+    required: false
+    default: 0.2
+  wait_method:
+    description:
+      - How to detect when the wait is over.
+      - C(poll) checks the status of the resources each time.
+      - C(events) follows the RDS event stream and only checks the status of the resources once an event
+        occurs for one of them, failing immediately on a failure event.
+    choices: ['poll', 'events']
+    required: false
+    default: poll
+  metrics:
+    description:
+      - Include a C(metrics) key in the result, with the number, latency, retries and throttles of the API calls made
+        per operation, and the time spent in each phase of the module.
+    required: false
+    default: false
+  rate_limit:
+    description:
+      - Maximum number of RDS requests per second, shared by all of the rds_cluster* module processes on the host
+        which use the same region and credentials, such as parallel forks. C(0) for no limit.
+      - Throttling responses from AWS reduce the rate, which then recovers to this limit over a minute.
+    required: false
+    default: 0
+  rate_limit_burst:
+    description:
+      - Number of requests which may be made at once before I(rate_limit) applies.
+    required: false
+    default: one second of requests at I(rate_limit)
+  rate_limit_path:
+    description:
+      - Directory in which to keep the state of the shared rate limit.
+    required: false
+    default: ~/.ansible/tmp/rds_cluster_rate_limit
 
 author: "Tom Bamford (@manicminer)"
 extends_documentation_fragment:
@@ -200,6 +294,71 @@ EXAMPLES = '''
     tags:
       Name: my-new-instance
     state: present
+
+# Create three reader instances at once and wait for all of them
+- local_action:
+    module: rds_cluster_instance
+    cluster_id: my-aurora-cluster
+    instance_type: db.r4.large
+    subnet_group: my-db-subnet-group
+    instances:
+      - instance_id: my-aurora-cluster-002
+      - instance_id: my-aurora-cluster-003
+      - instance_id: my-aurora-cluster-004
+        promotion_tier: 15
+    wait: yes
+
+# Resize the instances of a cluster two readers at a time, then the writer
+- local_action:
+    module: rds_cluster_instance
+    cluster_id: my-aurora-cluster
+    instance_type: db.r4.2xlarge
+    instances:
+      - instance_id: my-aurora-cluster-001
+      - instance_id: my-aurora-cluster-002
+      - instance_id: my-aurora-cluster-003
+      - instance_id: my-aurora-cluster-004
+    rolling: yes
+    max_unavailable: 2
+
+# Delete the readers of a cluster at the same time
+- local_action:
+    module: rds_cluster_instance
+    cluster_id: my-aurora-cluster
+    instances:
+      - instance_id: my-aurora-cluster-002
+      - instance_id: my-aurora-cluster-003
+    state: absent
+    wait: yes
+'''
+
+RETURN = '''
+diff:
+    description:
+      - The options which were changed, with their values I(before) and I(after), or all of the options given when
+        the instance was created. With I(instances), each of the I(results) includes its own diff.
+      - Options which can only be set when the instance is created are not compared.
+    returned: when state=present
+    type: dict
+    sample: {"before": {"instance_type": "db.r4.large"}, "after": {"instance_type": "db.r4.xlarge"}}
+results:
+    description:
+      - The result of creating or modifying each of I(instances), with its I(timings), the number of seconds after
+        the task started at which the instance was created or modified (C(request)) and became available (C(available)).
+      - With I(rolling=yes), the I(batch) in which each existing instance was modified, in the order they were modified.
+      - With state=absent, the result of deleting each of I(instances).
+    returned: when instances is set
+    type: list
+    sample: [{"instance_id": "my-aurora-cluster-002", "changed": true, "batch": 1, "timings": {"request": 0.8, "available": 412.5}}]
+metrics:
+    description:
+      - API call counts, latencies, retries and throttles per operation, the seconds spent in each phase, and the
+        seconds spent waiting for I(rate_limit).
+    returned: when metrics is enabled
+    type: dict
+    sample: {"wall_time": 3.2, "api_calls": 2, "throttles": 0, "rate_limit_wait": 0.0, "phases": {"describe": 0.4},
+             "operations": {"describe_db_clusters": {"calls": 1, "errors": 0, "retries": 0, "throttles": 0,
+                                                     "time": 0.4, "max_time": 0.4, "bytes": 2048}}}
 '''
 
 try:
@@ -210,173 +369,274 @@ except ImportError:
     HAS_BOTO3 = False
 
 import time
+from multiprocessing.pool import ThreadPool
 
 
 def create_db_instance(module, client, **params):
 
-    api_args = dict()
-
-    if params['instance_type'] is not None:
-        api_args['DBInstanceClass'] = params['instance_type']
-    if params['availability_zone'] is not None:
-        api_args['AvailabilityZone'] = params['availability_zone']
-    if params['preferred_maintenance_window'] is not None:
-        api_args['PreferredMaintenanceWindow'] = params['preferred_maintenance_window']
-    if params['parameter_group'] is not None:
-        api_args['DBParameterGroupName'] = params['parameter_group']
-    if params['multi_az'] is not None:
-        api_args['MultiAZ'] = params['multi_az']
-    if params['auto_minor_version_upgrade'] is not None:
-        api_args['AutoMinorVersionUpgrade'] = params['auto_minor_version_upgrade']
-    if params['option_group'] is not None:
-        api_args['OptionGroupName'] = params['option_group']
-    if params['publicly_accessible'] is not None:
-        api_args['PubliclyAccessible'] = params['publicly_accessible']
-    if params['copy_tags_to_snapshot'] is not None:
-        api_args['CopyTagsToSnapshot'] = params['copy_tags_to_snapshot']
-    if params['monitoring_interval'] is not None:
-        api_args['MonitoringInterval'] = params['monitoring_interval']
-    if params['monitoring_role_arn'] is not None:
-        api_args['MonitoringRoleArn'] = params['monitoring_role_arn']
-    if params['promotion_tier'] is not None:
-        api_args['PromotionTier'] = params['promotion_tier']
-    if params['performance_insights'] is not None:
-        api_args['EnablePerformanceInsights'] = params['performance_insights']
-    if params['cloudwatch_logs_exports'] is not None:
-        api_args['EnableCloudwatchLogsExports'] = params['cloudwatch_logs_exports']
-
-    tags = None
-    if params['tags'] is not None:
-        tags = [{'Key': k, 'Value': v} for k, v in params['tags'].iteritems()]
+    try:
+        changed, result, diff = ensure_db_instance(client, **params)
+    except RDSClusterError as e:
+        module.fail_json(msg=str(e), **e.details)
+
+    cluster_id = result['DBInstance'].get('DBClusterIdentifier')
+    if not params['wait']:
+        token = wait_token('instance', params['instance_id'], params['region'], cluster_id=cluster_id)
+        module.exit_json(changed=changed, result=result, diff=diff, wait_token=token)
+
+    try:
+        with phase('wait'):
+            wait_for_instances(client, {params['instance_id']: cluster_id}, params['wait_timeout'], **waiter_options(params))
+    except RDSClusterError as e:
+        module.fail_json(msg=str(e), **e.details)
+    except WaitTimeout as e:
+        module.fail_json(msg='Timed out waiting for DB instance to become available', instance=(e.last or {}).get(params['instance_id']))
+    except botocore.exceptions.ClientError as e:
+        module.fail_json(msg=str(e))
+
+    module.exit_json(changed=changed, result=result, diff=diff)
+
+
+def ensure_db_instances(client, instances, concurrency, started):
+    """Create or modify each of the instances concurrently, returning the outcome of each"""
 
+    def ensure(instance_params):
+        outcome = dict(instance_id=instance_params['instance_id'])
+        try:
+            outcome['changed'], outcome['result'], outcome['diff'] = ensure_db_instance(client, **instance_params)
+        except RDSClusterError as e:
+            outcome.update(e.details, failed=True, msg=str(e))
+        outcome['timings'] = dict(request=time.time() - started)
+        return outcome
+
+    pool = ThreadPool(max(1, min(concurrency, len(instances))))
     try:
-        check_instance = client.describe_db_instances(DBInstanceIdentifier=params['instance_id'])
-
-        if 'DBInstances' not in check_instance or len(check_instance['DBInstances']) != 1:
-            module.fail_json(msg='Failed to retrieve details for existing database instance')
-
-        # Determine instance modifications to make
-        instance = check_instance['DBInstances'][0]
-        modify_args = dict()
-        for opt, val in api_args.iteritems():
-            if opt == 'DBParameterGroupName':
-                if [g['DBParameterGroupName'] for g in instance['DBParameterGroups']] != [val,]:
-                    modify_args[opt] = val
-            elif opt == 'EnablePerformanceInsights':
-                if instance['PerformanceInsightsEnabled'] != val:
-                    modify_args[opt] = val
-            elif opt not in instance or instance[opt] != val:
-                modify_args[opt] = val
-
-        if modify_args:
-            # Modify existing instance
-            result = client.modify_db_instance(DBInstanceIdentifier=params['instance_id'], ApplyImmediately=params['apply_immediately'], **modify_args)
-        else:
-            # Return existing instance details verbatim
-            result = dict(DBInstance=instance)
-
-        # Set instance tags
-        tags_result = client.list_tags_for_resource(ResourceName=check_instance['DBInstances'][0]['DBInstanceArn'])
-        if 'TagList' in tags_result:
-            client.remove_tags_from_resource(ResourceName=check_instance['DBInstances'][0]['DBInstanceArn'], TagKeys=[t['Key'] for t in tags_result['TagList']])
-            if tags is not None:
-                api_args['Tags'] = tags
-                client.add_tags_to_resource(ResourceName=check_instance['DBInstances'][0]['DBInstanceArn'], Tags=tags)
+        return pool.map(ensure, instances)
+    finally:
+        pool.close()
+
+
+def create_db_instances(module, client, **params):
+    """Create or modify each of the instances concurrently, then wait for them together"""
+    started = time.time()
+    results = ensure_db_instances(client, params['instances'], params['concurrency'], started)
+
+    failed = [r for r in results if r.get('failed')]
+    changed = any(r.get('changed') for r in results)
+    if failed:
+        module.fail_json(msg='Failed to create or modify %d of %d DB instances' % (len(failed), len(results)), changed=changed, results=results)
+
+    if not params['wait']:
+        for r in results:
+            r['wait_token'] = wait_token('instance', r['instance_id'], params['region'], cluster_id=r['result']['DBInstance'].get('DBClusterIdentifier'))
+    else:
+        try:
+            instances = dict((r['instance_id'], r['result']['DBInstance'].get('DBClusterIdentifier')) for r in results)
+            with phase('wait'):
+                ready_at = wait_for_instances(client, instances, params['wait_timeout'], **waiter_options(params))
+        except RDSClusterError as e:
+            module.fail_json(msg=str(e), changed=changed, results=results, **e.details)
+        except WaitTimeout as e:
+            module.fail_json(msg='Timed out waiting for DB instances to become available', changed=changed, results=results, instances=e.last)
+        except botocore.exceptions.ClientError as e:
+            module.fail_json(msg=str(e), changed=changed, results=results)
+
+        for r in results:
+            r['timings']['available'] = ready_at[r['instance_id']] - started
+
+    module.exit_json(changed=changed, results=results)
+
+
+def rolling_batches(members, instances, max_unavailable):
+    """Split the instances which are members of the cluster into batches for a rolling update
+
+    The readers come first, ordered by promotion tier and ID, up to
+    max_unavailable at a time, and the writer last on its own.
+    """
+    tiers = dict((m['DBInstanceIdentifier'], m.get('PromotionTier', 1)) for m in members)
+    writers = set(m['DBInstanceIdentifier'] for m in members if m['IsClusterWriter'])
+
+    readers = sorted((i for i in instances if i['instance_id'] in tiers and i['instance_id'] not in writers),
+                     key=lambda i: (tiers[i['instance_id']], i['instance_id']))
+    batches = [readers[n:n + max_unavailable] for n in range(0, len(readers), max_unavailable)]
+    batches.extend([i] for i in instances if i['instance_id'] in writers)
+    return batches
+
+
+def update_db_instances_rolling(module, client, **params):
+    """Create the new instances, then modify the members of the cluster a batch at a time"""
+    started = time.time()
+    cluster_id = params['cluster_id']
+    options = waiter_options(params)
+    del options['events']
 
+    try:
+        with phase('describe'):
+            cluster = poll_clusters(client, [cluster_id]).get(cluster_id)
     except botocore.exceptions.ClientError as e:
-        if e.response['Error']['Code'] == 'DBInstanceNotFound':
-            api_args['DBInstanceIdentifier'] = params['instance_id']
-
-            if params['cluster_id'] is not None:
-                api_args['DBClusterIdentifier'] = params['cluster_id']
-            if params['engine'] is not None:
-                api_args['Engine'] = params['engine']
-            if params['subnet_group'] is not None:
-                api_args['DBSubnetGroupName'] = params['subnet_group']
-            if tags is not None:
-                api_args['Tags'] = tags
-
-            try:
-                result = client.create_db_instance(**api_args)
-            except (botocore.exceptions.ClientError, boto.exception.BotoServerError), e:
-                module.fail_json(msg=str(e), api_args=api_args)
-
-        else:
-            module.fail_json(msg=str(e), api_args=api_args)
-
-    except boto.exception.BotoServerError as e:
-        module.fail_json(msg=str(e), api_args=api_args)
-
-    if params['wait']:
-        wait_timeout = time.time() + params['wait_timeout']
-        ready = False
-        while not ready and wait_timeout > time.time():
-            try:
-                check_instance = client.describe_db_instances(DBInstanceIdentifier=params['instance_id'])
-                if 'DBInstances' in check_instance and len(check_instance['DBInstances']) == 1:
-                    if check_instance['DBInstances'][0]['DBInstanceStatus'].lower() == 'available':
-                        ready = True
-
-            except (botocore.exceptions.ClientError, boto.exception.BotoServerError), e:
-                pass
-
-            if not ready:
-                time.sleep(5)
-
-        if wait_timeout <= time.time():
-            if 'DBInstances' in check_instance and len(check_instance['DBInstances']) == 1:
-                instance = check_instance['DBInstances'][0]
-            else:
-                instance = None
-            module.fail_json(msg='Timed out waiting for DB instance to become available', instance=instance)
-
-    module.exit_json(result=result)
+        module.fail_json(msg=str(e))
+    if cluster is None:
+        module.fail_json(msg='DB cluster %s not found' % cluster_id)
+
+    members = cluster.get('DBClusterMembers', [])
+    member_ids = set(m['DBInstanceIdentifier'] for m in members)
+    instances = [dict(i, apply_immediately=True) for i in params['instances']]
+    new = [i for i in instances if i['instance_id'] not in member_ids]
+
+    results = []
+
+    def failed(msg, **details):
+        module.fail_json(msg=msg, changed=any(r.get('changed') for r in results), results=results, **details)
+
+    # New instances add capacity, so are all created at the start
+    if new:
+        results.extend(ensure_db_instances(client, new, params['concurrency'], started))
+        errors = [r for r in results if r.get('failed')]
+        if errors:
+            failed('Failed to create %d of %d DB instances' % (len(errors), len(new)))
+
+    for number, batch in enumerate(rolling_batches(members, instances, params['max_unavailable'])):
+        with phase('modify'):
+            outcomes = ensure_db_instances(client, batch, params['concurrency'], started)
+        for outcome in outcomes:
+            outcome['batch'] = number + 1
+        results.extend(outcomes)
+        if any(o.get('failed') for o in outcomes):
+            failed('Failed to modify DB instances in batch %d, stopping the rolling update' % (number + 1))
+
+        modified = dict((o['instance_id'], cluster_id) for o in outcomes if o['changed'])
+        if not modified:
+            continue
+        try:
+            with phase('wait'):
+                wait_for_modified_instances(client, modified, params['wait_timeout'], **options)
+        except WaitTimeout as e:
+            failed('Timed out waiting for batch %d of DB instances to become available' % (number + 1), instances=e.last)
+        except botocore.exceptions.ClientError as e:
+            failed(str(e))
+        for outcome in outcomes:
+            if outcome['changed']:
+                outcome['timings']['available'] = time.time() - started
+
+    changed = any(r.get('changed') for r in results)
+    new_ids = dict((i['instance_id'], cluster_id) for i in new)
+    if not params['wait']:
+        for r in results:
+            if r['instance_id'] in new_ids:
+                r['wait_token'] = wait_token('instance', r['instance_id'], params['region'], cluster_id=cluster_id)
+    elif new_ids:
+        try:
+            with phase('wait'):
+                ready_at = wait_for_instances(client, new_ids, params['wait_timeout'], **waiter_options(params))
+        except RDSClusterError as e:
+            failed(str(e), **e.details)
+        except WaitTimeout as e:
+            failed('Timed out waiting for DB instances to become available', instances=e.last)
+        except botocore.exceptions.ClientError as e:
+            failed(str(e))
+        for r in results:
+            if r['instance_id'] in ready_at:
+                r['timings']['available'] = ready_at[r['instance_id']] - started
+
+    module.exit_json(changed=changed, results=results)
+
+
+def terminate_db_instance(module, client, **params):
+    """Delete the instance, or all of the instances concurrently, then wait for them to be deleted together"""
+    if params['instances'] is not None:
+        instance_ids = [i['instance_id'] for i in params['instances']]
+    else:
+        instance_ids = [params['instance_id']]
+
+    with phase('delete'):
+        results = delete_db_instances(client, instance_ids, params['concurrency'])
+    changed = any(r['changed'] for r in results)
+    failed = [r for r in results if r.get('failed')]
+    if failed:
+        module.fail_json(msg='Failed to delete %d of %d DB instances' % (len(failed), len(results)), changed=changed, results=results)
+
+    for r in results:
+        r.setdefault('cluster_id', params['cluster_id'])
+
+    if not params['wait']:
+        for r in results:
+            r['wait_token'] = wait_token('instance', r['instance_id'], params['region'], cluster_id=r['cluster_id'], status='deleted')
+    else:
+        targets = dict((r['instance_id'], (r['cluster_id'], 'deleted')) for r in results)
+        try:
+            with phase('wait'):
+                wait_for_resources(client, params['wait_timeout'], instances=targets, **waiter_options(params))
+        except RDSClusterError as e:
+            module.fail_json(msg=str(e), changed=changed, results=results, **e.details)
+        except WaitTimeout as e:
+            module.fail_json(msg='Timed out waiting for DB instances to be deleted', changed=changed, results=results,
+                             instances=dict((i, d) for (t, i), d in (e.last or {}).items()))
+        except botocore.exceptions.ClientError as e:
+            module.fail_json(msg=str(e), changed=changed, results=results)
+
+    if params['instances'] is not None:
+        module.exit_json(changed=changed, results=results)
+    outcome = dict((k, v) for k, v in results[0].items() if k in ('result', 'wait_token'))
+    module.exit_json(changed=changed, **outcome)
 
 
 def main():
-    module_args = dict(
+    module_args = instance_argument_spec()
+    module_args.update(
         apply_immediately = dict(required=False, type='bool', default=False),
-        auto_minor_version_upgrade = dict(required=False, type='bool', default=True),
-        availability_zone = dict(required=False, default=None),
-        cloudwatch_logs_exports = dict(required=False, default=None),
-        cluster_id = dict(required=False),
-        copy_tags_to_snapshot = dict(required=False, type='bool', default=True),
         engine = dict(required=False, choices=['aurora'], default='aurora'),
-        instance_id = dict(required=True),
-        instance_type = dict(required=False),
-        monitoring_interval = dict(required=False, type='int', default=0, choices=[0, 1, 5, 10, 15, 30, 60]),
-        monitoring_role_arn = dict(required=False, default=None),
-        multi_az = dict(required=False, type='bool', default=False),
-        option_group = dict(required=False, default=None),
-        parameter_group = dict(required=False, default=None),
-        performance_insights = dict(required=False, type='bool', default=False),
-        preferred_maintenance_window = dict(required=False, default=None),
-        promotion_tier = dict(required=False, type='int', default=None),
-        publicly_accessible = dict(required=False, type='bool', default=False),
+        instances = dict(required=False, type='list'),
+        concurrency = dict(required=False, type='int', default=10),
+        rolling = dict(required=False, type='bool', default=False),
+        max_unavailable = dict(required=False, type='int', default=1),
         state = dict(required=False, default='present', choices=['present', 'absent']),
-        subnet_group = dict(required=False, default=None),
-        tags = dict(required=False, type='dict', default={}),
         wait = dict(required=False, type='bool', default=False),
         wait_timeout = dict(required=False, type='int', default=1200),
     )
+    module_args.update(waiter_argument_spec())
+    module_args.update(metrics_argument_spec())
+    module_args.update(rate_limit_argument_spec())
     argument_spec = ec2_argument_spec()
     argument_spec.update(module_args)
-    module = AnsibleModule(argument_spec=argument_spec)
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        required_one_of=[['instance_id', 'instances']],
+        mutually_exclusive=[['instance_id', 'instances']],
+    )
 
     args_dict = {arg: module.params.get(arg) for arg in module_args.keys()}
     #module.fail_json(msg='test', args_dict=args_dict)
 
+    if args_dict['rolling'] and (args_dict['instances'] is None or args_dict['cluster_id'] is None):
+        module.fail_json(msg='rolling requires cluster_id and instances')
+    if args_dict['max_unavailable'] < 1:
+        module.fail_json(msg='max_unavailable must be at least 1')
+
+    if args_dict['instances'] is not None:
+        args_dict['instances'] = [instance_params(module, module_args, args_dict, i) for i in args_dict['instances']]
+
     if not HAS_BOTO3:
         module.fail_json(msg='boto3 required for this module')
 
     try:
         region, ec2_url, aws_connect_kwargs = get_aws_connection_info(module, boto3=True)
-        rds = boto3_conn(module, conn_type='client', resource='rds', region=region, endpoint=ec2_url, **aws_connect_kwargs)
+        rds = rds_client(module, region, ec2_url, aws_connect_kwargs)
 
-    except botocore.exceptions.ClientError, e:
+    except botocore.exceptions.ClientError as e:
         module.fail_json(msg="Boto3 Client Error - " + str(e))
+    args_dict['region'] = region
+
+    if module.params.get('metrics'):
+        instrument(module, rds)
+
+    if module.params.get('rate_limit'):
+        rate_limit(rds, module.params, region, ec2_url, aws_connect_kwargs)
 
-    if module.params.get('state') == 'present':
+    if module.params.get('state') == 'present' and args_dict['rolling']:
+        update_db_instances_rolling(module, rds, **args_dict)
+    elif module.params.get('state') == 'present' and args_dict['instances'] is not None:
+        create_db_instances(module, rds, **args_dict)
+    elif module.params.get('state') == 'present':
         create_db_instance(module, rds, **args_dict)
     elif module.params.get('state') == 'absent':
         terminate_db_instance(module, rds, **args_dict)
@@ -385,6 +645,11 @@ def main():
 # import module snippets
 from ansible.module_utils.basic import *
 from ansible.module_utils.ec2 import *
+from ansible.module_utils.rds_cluster_broker import rds_client
+from ansible.module_utils.rds_cluster_instances import delete_db_instances, ensure_db_instance, instance_argument_spec, instance_params
+from ansible.module_utils.rds_cluster_metrics import instrument, metrics_argument_spec, phase
+from ansible.module_utils.rds_cluster_ratelimit import rate_limit, rate_limit_argument_spec
+from ansible.module_utils.rds_cluster_utils import *
 
 if __name__ == '__main__':
     main()
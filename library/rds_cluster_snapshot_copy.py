@@ -0,0 +1,506 @@
+#!/usr/bin/python
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+DOCUMENTATION = '''
+---
+module: rds_cluster_snapshot_copy
+short_description: Copies RDS cluster snapshots to other regions and KMS keys
+description:
+    - Copies any number of RDS cluster snapshots to one or more destination regions (or KMS keys) at the same time,
+      and optionally waits for the copies to complete, reporting their progress.
+    - Copies which already exist in their destination are not copied again, so the module is idempotent.
+    - The progress of the copies is checked with one request per destination region for up to 50 copies at a time.
+options:
+  snapshots:
+    description:
+      - List of snapshots to copy.
+      - Each entry is either a snapshot ID or ARN, or a dictionary such as a result of I(rds_cluster_snapshot_facts),
+        with I(snapshot_id) and optionally I(region) and I(db_cluster_snapshot_arn).
+      - Snapshots shared from other accounts must be given by ARN.
+    required: true
+  source_region:
+    description:
+      - Region of the snapshots which do not include their own I(region). Defaults to I(region).
+    required: false
+    default: null
+  destinations:
+    description:
+      - List of destinations to copy every snapshot to.
+      - Each entry is a dictionary with I(region) (defaults to the source region of each snapshot) and optionally
+        I(kms_key_id), the KMS key with which to encrypt the copies, which is required to copy encrypted snapshots
+        between regions.
+    required: true
+  target_id_format:
+    description:
+      - Format of the ID of each copy, with the fields C(snapshot_id) (without any C(rds:) prefix),
+        C(source_region) and C(region).
+    required: false
+    default: '%(snapshot_id)s'
+  copy_tags:
+    description:
+      - Whether to copy the tags of the source snapshots to the copies.
+    required: false
+    default: true
+  concurrency:
+    description:
+      - Maximum number of copies to request at the same time.
+      - Throttled requests are retried with an increasing delay, which may be combined with I(rate_limit).
+    required: false
+    default: 10
+  max_records:
+    description:
+      - Number of records to request per page of results from AWS (between 20 and 100).
+    required: false
+    default: null
+  wait:
+    description:
+      - Wait for all of the copies to complete.
+    required: false
+    default: false
+  wait_timeout:
+    description:
+      - How long to wait for the copies to complete, in seconds.
+    required: false
+    default: 3600
+  wait_delay:
+    description:
+      - Initial number of seconds between checks of the progress of the copies.
+    required: false
+    default: 5
+  wait_max_delay:
+    description:
+      - Maximum number of seconds between checks, as the interval grows by I(wait_backoff).
+    required: false
+    default: 60
+  wait_backoff:
+    description:
+      - Factor by which the interval between checks grows after each check.
+    required: false
+    default: 1.5
+  wait_jitter:
+    description:
+      - Fraction by which each interval is randomly varied, so that parallel tasks do not check in lockstep.
+    required: false
+    default: 0.2
+  metrics:
+    description:
+      - Include a C(metrics) key in the result, with the number, latency, retries and throttles of the API calls made
+        per operation, and the time spent in each phase of the module.
+    required: false
+    default: false
+  rate_limit:
+    description:
+      - Maximum number of RDS requests per second, shared by all of the rds_cluster* module processes on the host
+        which use the same region and credentials, such as parallel forks. C(0) for no limit.
+      - Throttling responses from AWS reduce the rate, which then recovers to this limit over a minute.
+    required: false
+    default: 0
+  rate_limit_burst:
+    description:
+      - Number of requests which may be made at once before I(rate_limit) applies.
+    required: false
+    default: one second of requests at I(rate_limit)
+  rate_limit_path:
+    description:
+      - Directory in which to keep the state of the shared rate limit.
+    required: false
+    default: ~/.ansible/tmp/rds_cluster_rate_limit
+
+author: "Tom Bamford (@manicminer)"
+extends_documentation_fragment:
+    - aws
+    - ec2
+'''
+
+EXAMPLES = '''
+# Copy the newest snapshot of every cluster to two DR regions, and wait for the copies
+- local_action:
+    module: rds_cluster_snapshot_facts
+    group_by: cluster_id
+    snapshot_type: automated
+    status: available
+    sort: snapshot_create_time
+    sort_order: descending
+    sort_end: 1
+  register: latest
+- local_action:
+    module: rds_cluster_snapshot_copy
+    snapshots: "{{ latest.groups.values() | map('first') | list }}"
+    destinations:
+      - region: us-west-2
+        kms_key_id: arn:aws:kms:us-west-2:123456789012:key/11111111-2222-3333-4444-555555555555
+      - region: eu-west-1
+        kms_key_id: arn:aws:kms:eu-west-1:123456789012:key/66666666-7777-8888-9999-000000000000
+    target_id_format: 'dr-%(snapshot_id)s'
+    concurrency: 20
+    wait: yes
+
+# Re-encrypt a snapshot with another key in the same region
+- local_action:
+    module: rds_cluster_snapshot_copy
+    snapshots: ['my-rds-cluster-snapshot']
+    destinations:
+      - kms_key_id: alias/rds-shared
+    target_id_format: '%(snapshot_id)s-shared'
+'''
+
+RETURN = '''
+copies:
+    description:
+      - Each copy, with its source and destination, current status and percent complete.
+    returned: always
+    type: list
+    sample: [{"snapshot_id": "rds:my-rds-cluster-2017-06-01-00-00", "source_region": "us-east-1", "region": "us-west-2",
+              "target_snapshot_id": "dr-my-rds-cluster-2017-06-01-00-00", "kms_key_id": null, "changed": true,
+              "status": "available", "percent_progress": 100}]
+progress:
+    description:
+      - Progress of all of the copies together. C(percent) is weighted by the allocated storage of each copy, and
+        C(throughput_gb_per_hour) and C(eta_seconds) are estimated from the copies made by this task.
+    returned: always
+    type: dict
+    sample: {"copies": 4, "available": 2, "failed": 0, "percent": 62.5, "elapsed": 600.0,
+             "throughput_gb_per_hour": 900.0, "eta_seconds": 360}
+progress_history:
+    description: The elapsed seconds and percent complete at each check while waiting.
+    returned: when wait is set
+    type: list
+    sample: [{"elapsed": 5.0, "percent": 2.5}, {"elapsed": 12.5, "percent": 6.0}]
+metrics:
+    description:
+      - API call counts, latencies, retries and throttles per operation, the seconds spent in each phase, and the
+        seconds spent waiting for I(rate_limit).
+    returned: when metrics is enabled
+    type: dict
+    sample: {"wall_time": 3.2, "api_calls": 2, "throttles": 0, "rate_limit_wait": 0.0, "phases": {"describe": 0.4},
+             "operations": {"describe_db_clusters": {"calls": 1, "errors": 0, "retries": 0, "throttles": 0,
+                                                     "time": 0.4, "max_time": 0.4, "bytes": 2048}}}
+'''
+
+try:
+    import boto3
+    import botocore.exceptions
+    HAS_BOTO3 = True
+except ImportError:
+    HAS_BOTO3 = False
+
+import time
+from multiprocessing.pool import ThreadPool
+
+# Statuses from which a copy will not progress any further
+FINAL_STATUSES = ['available', 'failed', 'deleted']
+
+# Number of checks in a row which must not find a copy before it is considered deleted,
+# as a new copy may not be returned by describe calls straight away
+MISSING_CHECKS = 3
+
+
+def snapshot_source(module, snapshot, source_region):
+    """Return the (snapshot ID, ARN, region) of an entry of `snapshots`"""
+    if isinstance(snapshot, dict):
+        snapshot_id = snapshot.get('snapshot_id')
+        snapshot_arn = snapshot.get('db_cluster_snapshot_arn')
+        region = snapshot.get('region') or source_region
+        if not snapshot_id and not snapshot_arn:
+            module.fail_json(msg='Each snapshot to copy requires a snapshot_id', snapshot=snapshot)
+    else:
+        snapshot_id, snapshot_arn, region = snapshot, None, source_region
+
+    if snapshot_id and snapshot_id.startswith('arn:'):
+        snapshot_arn = snapshot_id
+    if snapshot_arn:
+        # arn:aws:rds:<region>:<account>:cluster-snapshot:<id>, where the ID of an automated snapshot starts with rds:
+        parts = snapshot_arn.split(':')
+        region = parts[3]
+        snapshot_id = ':'.join(parts[6:]) if len(parts) > 6 else snapshot_id
+    return snapshot_id, snapshot_arn, region
+
+
+def copy_plan(module, snapshots, destinations, source_region, target_id_format):
+    """Return a copy for each snapshot and destination"""
+    copies = []
+    for snapshot in snapshots:
+        snapshot_id, snapshot_arn, region = snapshot_source(module, snapshot, source_region)
+        for destination in destinations:
+            if not isinstance(destination, dict):
+                module.fail_json(msg='Each destination must be a dictionary with region and/or kms_key_id', destination=destination)
+            fields = dict(
+                snapshot_id=snapshot_id[4:] if snapshot_id.startswith('rds:') else snapshot_id,
+                source_region=region,
+                region=destination.get('region') or region,
+            )
+            try:
+                target_snapshot_id = target_id_format % fields
+            except (KeyError, TypeError, ValueError) as e:
+                module.fail_json(msg='Invalid target_id_format: %s' % str(e))
+            if fields['region'] == region and target_snapshot_id == snapshot_id:
+                module.fail_json(msg='Snapshot %s would be copied to itself, set a target_id_format which gives the copy another ID' % snapshot_id)
+            copies.append(dict(
+                snapshot_id=snapshot_id,
+                snapshot_arn=snapshot_arn,
+                source_region=region,
+                region=fields['region'],
+                kms_key_id=destination.get('kms_key_id'),
+                target_snapshot_id=target_snapshot_id,
+            ))
+    return copies
+
+
+def resolve_arns(clients, copies, page_size=None):
+    """Look up the ARNs of source snapshots given by ID, which are needed to copy between regions
+
+    Only copies to another region need the ARN, and the snapshots of each
+    source region are described together.
+    """
+    by_region = dict()
+    for copy in copies:
+        if copy['snapshot_arn'] is None and copy['region'] != copy['source_region']:
+            by_region.setdefault(copy['source_region'], set()).add(copy['snapshot_id'])
+
+    arns = dict()
+    for region, snapshot_ids in sorted(by_region.items()):
+        for snapshot in describe_snapshots_by_id(clients[region], sorted(snapshot_ids), page_size=page_size):
+            arns[(region, snapshot['DBClusterSnapshotIdentifier'])] = snapshot['DBClusterSnapshotArn']
+
+    for copy in copies:
+        if copy['snapshot_arn'] is None and copy['region'] != copy['source_region']:
+            copy['snapshot_arn'] = arns.get((copy['source_region'], copy['snapshot_id']))
+            if copy['snapshot_arn'] is None:
+                raise RDSClusterError('Snapshot %s not found in %s' % (copy['snapshot_id'], copy['source_region']))
+
+
+def describe_copies(clients, copies, page_size=None):
+    """Describe the target snapshots of the copies, with one request per destination region for up to 50 copies
+
+    Returns a dict of (region, target snapshot ID) to description, for the
+    target snapshots which exist.
+    """
+    by_region = dict()
+    for copy in copies:
+        by_region.setdefault(copy['region'], set()).add(copy['target_snapshot_id'])
+
+    found = dict()
+    for region, snapshot_ids in sorted(by_region.items()):
+        for snapshot in describe_snapshots_by_id(clients[region], sorted(snapshot_ids), page_size=page_size):
+            found[(region, snapshot['DBClusterSnapshotIdentifier'])] = snapshot
+    return found
+
+
+def update_copy(copy, snapshot):
+    copy.update(status=snapshot['Status'], percent_progress=snapshot.get('PercentProgress', 0),
+                    allocated_storage=snapshot.get('AllocatedStorage', 0))
+
+
+def start_copy(client, copy, copy_tags):
+    """Request a copy, returning the description of the new snapshot"""
+    api_args = dict(
+        TargetDBClusterSnapshotIdentifier=copy['target_snapshot_id'],
+        CopyTags=copy_tags,
+    )
+    if copy['region'] != copy['source_region']:
+        # boto3 presigns the request in the source region when SourceRegion is given
+        api_args['SourceDBClusterSnapshotIdentifier'] = copy['snapshot_arn']
+        api_args['SourceRegion'] = copy['source_region']
+    else:
+        api_args['SourceDBClusterSnapshotIdentifier'] = copy['snapshot_arn'] or copy['snapshot_id']
+    if copy['kms_key_id']:
+        api_args['KmsKeyId'] = copy['kms_key_id']
+
+    try:
+        return call_with_backoff(lambda: client.copy_db_cluster_snapshot(**api_args))['DBClusterSnapshot']
+    except botocore.exceptions.ClientError as e:
+        raise RDSClusterError(str(e), api_args=api_args)
+
+
+def copy_progress(copies, started):
+    """Summarise the progress of all of the copies"""
+    elapsed = time.time() - started
+    total = done = 0.0
+    copied = copied_total = 0.0
+    for copy in copies:
+        weight = max(copy.get('allocated_storage') or 0, 1)
+        fraction = 1.0 if copy['status'] == 'available' else copy['percent_progress'] / 100.0
+        total += weight
+        done += weight * fraction
+        if copy['changed']:
+            copied_total += copy.get('allocated_storage') or 0
+            copied += (copy.get('allocated_storage') or 0) * fraction
+
+    progress = dict(
+        copies=len(copies),
+        available=len([c for c in copies if c['status'] == 'available']),
+        failed=len([c for c in copies if c['status'] in ('failed', 'deleted')]),
+        percent=round(100 * done / total, 1) if total else 100.0,
+        elapsed=round(elapsed, 1),
+        throughput_gb_per_hour=None,
+        eta_seconds=None,
+    )
+    if copied and elapsed > 0:
+        rate = copied / elapsed
+        progress['throughput_gb_per_hour'] = round(rate * 3600, 1)
+        progress['eta_seconds'] = int((copied_total - copied) / rate)
+    return progress
+
+
+def copy_snapshots(module, clients, copies, **params):
+    started = time.time()
+
+    try:
+        with phase('describe'):
+            existing = describe_copies(clients, copies, page_size=params['max_records'])
+            pending = [c for c in copies if (c['region'], c['target_snapshot_id']) not in existing]
+            resolve_arns(clients, pending, page_size=params['max_records'])
+    except RDSClusterError as e:
+        module.fail_json(msg=str(e), **e.details)
+    except botocore.exceptions.ClientError as e:
+        module.fail_json(msg=str(e))
+
+    for copy in copies:
+        snapshot = existing.get((copy['region'], copy['target_snapshot_id']))
+        copy['changed'] = snapshot is None
+        if snapshot is not None:
+            update_copy(copy, snapshot)
+
+    def start(copy):
+        try:
+            update_copy(copy, start_copy(clients[copy['region']], copy, params['copy_tags']))
+        except RDSClusterError as e:
+            copy.update(e.details, failed=True, msg=str(e), changed=False, status='failed', percent_progress=0)
+
+    if pending and not module.check_mode:
+        with phase('copy'):
+            pool = ThreadPool(max(1, min(params['concurrency'], len(pending))))
+            try:
+                pool.map(start, pending)
+            finally:
+                pool.close()
+    elif pending:
+        for copy in pending:
+            copy.update(status='copying', percent_progress=0)
+
+    changed = any(c['changed'] for c in copies)
+    failed = [c for c in copies if c.get('failed')]
+    if failed:
+        module.fail_json(msg='Failed to copy %d of %d DB cluster snapshots' % (len(failed), len(copies)), changed=changed,
+                         copies=copies, progress=copy_progress(copies, started))
+
+    if not params['wait'] or module.check_mode:
+        module.exit_json(changed=changed, copies=copies, progress=copy_progress(copies, started))
+
+    history = []
+    missing = dict()
+
+    def check():
+        incomplete = [c for c in copies if c['status'] not in FINAL_STATUSES]
+        if incomplete:
+            found = describe_copies(clients, incomplete, page_size=params['max_records'])
+            for copy in incomplete:
+                key = (copy['region'], copy['target_snapshot_id'])
+                if key in found:
+                    update_copy(copy, found[key])
+                    missing.pop(key, None)
+                else:
+                    missing[key] = missing.get(key, 0) + 1
+                    if missing[key] >= MISSING_CHECKS:
+                        copy['status'] = 'deleted'
+        progress = copy_progress(copies, started)
+        history.append(dict(elapsed=progress['elapsed'], percent=progress['percent']))
+        return not [c for c in copies if c['status'] not in FINAL_STATUSES], progress
+
+    options = dict(
+        delay=params['wait_delay'],
+        max_delay=params['wait_max_delay'],
+        backoff=params['wait_backoff'],
+        jitter=params['wait_jitter'],
+    )
+    try:
+        with phase('wait'):
+            progress = wait_for(check, params['wait_timeout'], **options)
+    except WaitTimeout as e:
+        module.fail_json(msg='Timed out waiting for DB cluster snapshot copies to complete', changed=changed,
+                         copies=copies, progress=e.last, progress_history=history)
+    except botocore.exceptions.ClientError as e:
+        module.fail_json(msg=str(e), changed=changed, copies=copies, progress_history=history)
+
+    failed = [c for c in copies if c['status'] != 'available']
+    if failed:
+        module.fail_json(msg='%d of %d DB cluster snapshot copies failed' % (len(failed), len(copies)), changed=changed,
+                         copies=copies, progress=progress, progress_history=history)
+
+    module.exit_json(changed=changed, copies=copies, progress=progress, progress_history=history)
+
+
+def main():
+    module_args = dict(
+        snapshots = dict(required=True, type='list'),
+        source_region = dict(required=False, default=None),
+        destinations = dict(required=True, type='list'),
+        target_id_format = dict(required=False, default='%(snapshot_id)s'),
+        copy_tags = dict(required=False, type='bool', default=True),
+        concurrency = dict(required=False, type='int', default=10),
+        max_records = dict(required=False, type='int', default=None),
+        wait = dict(required=False, type='bool', default=False),
+        wait_timeout = dict(required=False, type='int', default=3600),
+    )
+    waiter_args = waiter_argument_spec()
+    # Progress can only be followed by polling
+    del waiter_args['wait_method']
+    module_args.update(waiter_args)
+    module_args.update(metrics_argument_spec())
+    module_args.update(rate_limit_argument_spec())
+    argument_spec = ec2_argument_spec()
+    argument_spec.update(module_args)
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        supports_check_mode=True,
+    )
+
+    args_dict = {arg: module.params.get(arg) for arg in module_args.keys()}
+
+    if not HAS_BOTO3:
+        module.fail_json(msg='boto3 required for this module')
+
+    region, ec2_url, aws_connect_kwargs = get_aws_connection_info(module, boto3=True)
+    copies = copy_plan(module, args_dict['snapshots'], args_dict['destinations'], args_dict['source_region'] or region,
+                       args_dict['target_id_format'])
+
+    clients = dict()
+    for copy_region in set([c['region'] for c in copies] + [c['source_region'] for c in copies]):
+        try:
+            clients[copy_region] = rds_client(module, copy_region, ec2_url, aws_connect_kwargs)
+        except botocore.exceptions.ClientError as e:
+            module.fail_json(msg="Boto3 Client Error - " + str(e))
+
+        if module.params.get('metrics'):
+            instrument(module, clients[copy_region])
+
+        if module.params.get('rate_limit'):
+            rate_limit(clients[copy_region], module.params, copy_region, ec2_url, aws_connect_kwargs)
+
+    copy_snapshots(module, clients, copies, **args_dict)
+
+
+# import module snippets
+from ansible.module_utils.basic import *
+from ansible.module_utils.ec2 import *
+from ansible.module_utils.rds_cluster_broker import rds_client
+from ansible.module_utils.rds_cluster_metrics import instrument, metrics_argument_spec, phase
+from ansible.module_utils.rds_cluster_ratelimit import rate_limit, rate_limit_argument_spec
+from ansible.module_utils.rds_cluster_snapshots import describe_snapshots_by_id
+from ansible.module_utils.rds_cluster_utils import *
+
+if __name__ == '__main__':
+    main()
@@ -17,11 +17,19 @@ options:
     required: false
   max_records:
     description:
-      - Maximum number of records returned [by AWS]
+      - Number of records to request per page of results from AWS (between 20 and 100).
+      - All pages are always retrieved, this only controls the page size.
     required: false
   id_regex:
     description:
       - Filter the results by matching this regular expression against the snapshot ID.
+      - The expression is matched from the start of the ID.
+      - When the expression matches a single literal ID (for example C(^my-snapshot$)) the search is performed by AWS.
+    default: null
+    required: false
+  engine:
+    description:
+      - Filter the results by database engine, e.g. C(aurora) or C(aurora-postgresql).
     default: null
     required: false
   snapshot_type:
@@ -68,8 +76,77 @@ options:
     description:
       - Which result to end with (when sorting).
       - Corresponds to Python slice notation.
+      - When set, only the top I(sort_end) snapshots are kept in memory while results are retrieved.
+    default: null
+    required: false
+  cache_ttl:
+    description:
+      - Number of seconds for which a locally cached snapshot catalog is used without contacting AWS.
+      - Once expired, the cache is refreshed incrementally, only retrieving snapshots created since the newest
+        cached snapshot and re-checking cached snapshots which have not yet reached a final status.
+      - A full listing is made when no cache exists or when it was last fully refreshed more than a day ago.
+      - Not used when I(snapshot_type) is C(shared) or C(public).
+      - Set to 0 to disable caching.
+    default: 0
+    required: false
+  cache_path:
+    description:
+      - Directory in which to store the snapshot catalog cache.
+      - Parallel tasks sharing the same directory, region and credentials will share the same cache.
+    default: ~/.ansible/tmp/rds_cluster_snapshot_facts
+    required: false
+  regions:
+    description:
+      - List of regions to search at the same time, instead of I(region).
+      - The snapshots of all of the regions are sorted and sliced together, as if they were in one region.
+    default: null
+    required: false
+  fields:
+    description:
+      - List of the fields to return for each snapshot, instead of all of them, to keep large results small.
+      - Any of C(region), C(snapshot_id), C(cluster_id), C(snapshot_create_time), C(cluster_create_time), C(status),
+        C(snapshot_type), C(engine), C(engine_version), C(port), C(vpc_id), C(availability_zones), C(allocated_storage),
+        C(master_username), C(license_model), C(percent_progress), C(storage_encrypted), C(db_cluster_snapshot_arn),
+        C(iam_database_authentication_enabled), C(kms_key_id) and C(source_db_cluster_snapshot_arn).
     default: null
     required: false
+  count_only:
+    description:
+      - Only return the I(count) of matching snapshots (after any sorting and slicing), without the snapshots.
+    default: false
+    required: false
+  group_by:
+    description:
+      - Group the snapshots by the given attribute, and sort and slice each group separately.
+      - Results are returned in I(groups) rather than I(results), so that (for example) the newest snapshot of every
+        cluster is found with one listing of all of the snapshots, instead of one search per cluster.
+      - Clusters without any matching snapshots are not included.
+    choices: ['cluster_id']
+    default: null
+    required: false
+  metrics:
+    description:
+      - Include a C(metrics) key in the result, with the number, latency, retries and throttles of the API calls made
+        per operation, and the time spent in each phase of the module.
+    required: false
+    default: false
+  rate_limit:
+    description:
+      - Maximum number of RDS requests per second, shared by all of the rds_cluster* module processes on the host
+        which use the same region and credentials, such as parallel forks. C(0) for no limit.
+      - Throttling responses from AWS reduce the rate, which then recovers to this limit over a minute.
+    required: false
+    default: 0
+  rate_limit_burst:
+    description:
+      - Number of requests which may be made at once before I(rate_limit) applies.
+    required: false
+    default: one second of requests at I(rate_limit)
+  rate_limit_path:
+    description:
+      - Directory in which to keep the state of the shared rate limit.
+    required: false
+    default: ~/.ansible/tmp/rds_cluster_rate_limit
 
 author: "Tom Bamford (@manicminer)"
 extends_documentation_fragment:
@@ -96,6 +173,88 @@ EXAMPLES = '''
     sort: snapshot_create_time
     sort_order: descending
     sort_end: 1
+
+# Same as above, sharing a cached snapshot catalog for up to 5 minutes
+- local_action:
+    module: rds_cluster_snapshot_facts
+    cluster_id: my-rds-cluster
+    snapshot_type: automated
+    status: available
+    sort: snapshot_create_time
+    sort_order: descending
+    sort_end: 1
+    cache_ttl: 300
+
+# Find the newest available snapshot of a cluster across its DR regions
+- local_action:
+    module: rds_cluster_snapshot_facts
+    regions: ['us-east-1', 'us-west-2', 'eu-west-1']
+    cluster_id: my-rds-cluster
+    status: available
+    sort: snapshot_create_time
+    sort_order: descending
+    sort_end: 1
+
+# Count the manual snapshots, and list just the IDs and times of the oldest 100
+- local_action:
+    module: rds_cluster_snapshot_facts
+    snapshot_type: manual
+    count_only: yes
+- local_action:
+    module: rds_cluster_snapshot_facts
+    snapshot_type: manual
+    fields: ['snapshot_id', 'snapshot_create_time']
+    sort: snapshot_create_time
+    sort_end: 100
+
+# Find the newest available snapshot of every cluster in one search
+- local_action:
+    module: rds_cluster_snapshot_facts
+    group_by: cluster_id
+    status: available
+    sort: snapshot_create_time
+    sort_order: descending
+    sort_end: 1
+  register: latest
+- debug:
+    msg: "{{ latest.groups['my-rds-cluster'][0].snapshot_id }}"
+'''
+
+RETURN = '''
+results:
+    description:
+      - List of matching snapshots.
+      - Each snapshot includes the I(region) it is in, unless I(fields) leaves it out.
+    returned: unless count_only or group_by is set
+    type: list
+groups:
+    description:
+      - Matching snapshots of each group, keyed by the I(group_by) attribute.
+      - With I(count_only), the number of matching snapshots of each group.
+    returned: when group_by is set
+    type: dict
+    sample: {"my-rds-cluster": [{"snapshot_id": "rds:my-rds-cluster-2017-06-01-00-00", "region": "us-east-1"}]}
+count:
+    description: Number of matching snapshots (after any sorting and slicing), over all groups.
+    returned: always
+    type: int
+    sample: 42
+pushed_down:
+    description:
+      - Names of the search criteria which were applied by AWS rather than by filtering results locally.
+      - Empty when results were served from the snapshot catalog cache.
+    returned: always
+    type: list
+    sample: ['cluster_id', 'snapshot_type', 'engine']
+metrics:
+    description:
+      - API call counts, latencies, retries and throttles per operation, the seconds spent in each phase, and the
+        seconds spent waiting for I(rate_limit).
+    returned: when metrics is enabled
+    type: dict
+    sample: {"wall_time": 3.2, "api_calls": 2, "throttles": 0, "rate_limit_wait": 0.0, "phases": {"describe": 0.4},
+             "operations": {"describe_db_clusters": {"calls": 1, "errors": 0, "retries": 0, "throttles": 0,
+                                                     "time": 0.4, "max_time": 0.4, "bytes": 2048}}}
 '''
 
 try:
@@ -105,85 +264,97 @@ try:
 except ImportError:
     HAS_BOTO3 = False
 
+import itertools
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+
+
+def merge_groups(searches, count_only=False, fields=None, sort=None, sort_order=None, sort_start=None, sort_end=None):
+    """Combine the groups found in each region, then sort and slice each group"""
+    if count_only and not sort:
+        counts = defaultdict(int)
+        for grouped, api_args, pushed_down in searches:
+            for name, count in grouped.items():
+                counts[name] += count
+        return dict(counts)
 
-def find_snapshot_facts(module, client, snapshot_id=None, cluster_id=None, max_records=None, id_regex=None, snapshot_type=None, status=None, sort=None, sort_order=None, sort_start=None, sort_end=None):
-
-    api_args = dict()
-    if snapshot_id:
-        api_args['DBClusterSnapshotIdentifier'] = snapshot_id
-    if cluster_id:
-        api_args['DBClusterIdentifier'] = cluster_id
-    if snapshot_type:
-        api_args['SnapshotType'] = snapshot_type
-    if max_records:
-        api_args['MaxRecords'] = max_records
-
-    try:
-        snapshots = client.describe_db_cluster_snapshots(**api_args)
-    except (botocore.exceptions.ClientError, boto.exception.BotoServerError), e:
-        module.fail_json(msg=str(e), api_args=api_args)
-
-    results = []
-
-    if 'DBClusterSnapshots' in snapshots:
-        if id_regex:
-            regex = re.compile(id_regex)
-
-        for snapshot in snapshots['DBClusterSnapshots']:
-
-            data = {
-                'availability_zones': snapshot['AvailabilityZones'],
-                'snapshot_id': snapshot['DBClusterSnapshotIdentifier'],
-                'cluster_id': snapshot['DBClusterIdentifier'],
-                'snapshot_create_time': snapshot['SnapshotCreateTime'],
-                'engine': snapshot['Engine'],
-                'allocated_storage': snapshot['AllocatedStorage'],
-                'status': snapshot['Status'],
-                'port': snapshot['Port'],
-                'vpc_id': snapshot['VpcId'],
-                'cluster_create_time': snapshot['ClusterCreateTime'],
-                'master_username': snapshot['MasterUsername'],
-                'engine_version': snapshot['EngineVersion'],
-                'license_model': snapshot['LicenseModel'],
-                'snapshot_type': snapshot['SnapshotType'],
-                'percent_progress': snapshot['PercentProgress'],
-                'storage_encrypted': snapshot['StorageEncrypted'],
-                'db_cluster_snapshot_arn': snapshot['DBClusterSnapshotArn'],
-                'iam_database_authentication_enabled': snapshot['IAMDatabaseAuthenticationEnabled'],
-            }
-            if 'KmsKeyId' in snapshot:
-                data['kms_key_id'] = snapshot['KmsKeyId']
-            if 'SourceDBClusterSnapshotArn' in snapshot:
-                data['source_db_cluster_snapshot_arn'] = snapshot['SourceDBClusterSnapshotArn']
-
-            if id_regex:
-                if not regex.match(data['snapshot_id']):
-                    continue
-
-            if snapshot_type:
-                if data['snapshot_type'] != snapshot_type:
-                    continue
-
-            if status:
-                if data['status'] != status:
-                    continue
-
-            results.append(data)
-
-    if sort:
-        results.sort(key=lambda e: e[sort], reverse=(sort_order=='descending'))
-
-    try:
-        if sort and sort_start and sort_end:
-            results = results[int(sort_start):int(sort_end)]
-        elif sort and sort_start:
-            results = results[int(sort_start):]
-        elif sort and sort_end:
-            results = results[:int(sort_end)]
-    except TypeError:
-        module.fail_json(msg="Please supply numeric values for sort_start and/or sort_end")
-
-    module.exit_json(results=results)
+    merged = defaultdict(list)
+    for grouped, api_args, pushed_down in searches:
+        for name, matches in grouped.items():
+            merged[name].extend(matches)
+
+    groups = dict()
+    for name, matches in merged.items():
+        selected = select_snapshots(matches, sort=sort, sort_order=sort_order, sort_start=sort_start, sort_end=sort_end)
+        if not selected:
+            continue
+        if count_only:
+            groups[name] = len(selected)
+        else:
+            groups[name] = [snapshot_data(snapshot, region, fields) for region, snapshot in selected]
+    return groups
+
+
+def find_snapshot_facts(module, clients, snapshot_id=None, cluster_id=None, max_records=None, id_regex=None, snapshot_type=None, status=None, sort=None, sort_order=None, sort_start=None, sort_end=None, catalogs=None, engine=None, fields=None, count_only=False, group_by=None):
+    """Search the snapshots of each region concurrently, then sort and slice them together
+
+    clients is a list of (region, client) tuples, and catalogs a dict of
+    region to SnapshotCatalog for the regions with a cache.
+    """
+    criteria = dict(
+        snapshot_id=snapshot_id,
+        cluster_id=cluster_id,
+        engine=engine,
+        id_regex=id_regex,
+        snapshot_type=snapshot_type,
+    )
+    if sort_start is not None and sort_start < 0:
+        region_sort_end = None
+    else:
+        region_sort_end = sort_end
+
+    def search(region_client):
+        region, client = region_client
+        try:
+            return search_region(client, region, catalog=(catalogs or {}).get(region), max_records=max_records, status=status,
+                                 sort=sort, sort_order=sort_order, sort_end=region_sort_end, count_only=count_only, group_by=group_by, **criteria)
+        except (botocore.exceptions.ClientError, botocore.exceptions.BotoCoreError) as e:
+            return dict(msg='%s: %s' % (region, str(e)), api_args=snapshot_query(**criteria)[0])
+        except (IOError, OSError) as e:
+            return dict(msg='%s: Failed to access snapshot cache: %s' % (region, str(e)))
+
+    with phase('describe'):
+        pool = ThreadPool(len(clients))
+        try:
+            searches = pool.map(search, clients)
+        finally:
+            pool.close()
+
+    for outcome in searches:
+        if isinstance(outcome, dict):
+            module.fail_json(**outcome)
+
+    pushed_down = searches[0][2]
+    if group_by:
+        groups = merge_groups(searches, count_only=count_only, fields=fields, sort=sort, sort_order=sort_order,
+                              sort_start=sort_start, sort_end=sort_end)
+        if count_only:
+            count = sum(groups.values())
+        else:
+            count = sum(len(results) for results in groups.values())
+        module.exit_json(groups=groups, count=count, pushed_down=pushed_down)
+
+    if count_only and not sort:
+        module.exit_json(count=sum(count for count, api_args, pushed_down in searches), pushed_down=pushed_down)
+
+    merged = itertools.chain.from_iterable(matches for matches, api_args, pushed_down in searches)
+    selected = select_snapshots(merged, sort=sort, sort_order=sort_order, sort_start=sort_start, sort_end=sort_end)
+    if count_only:
+        module.exit_json(count=len(selected), pushed_down=pushed_down)
+
+    # Only the selected snapshots are built into results
+    results = [snapshot_data(snapshot, region, fields) for region, snapshot in selected]
+    module.exit_json(results=results, count=len(results), pushed_down=pushed_down)
 
 
 def main():
@@ -192,8 +363,9 @@ def main():
         dict(
             snapshot_id=dict(),
             cluster_id=dict(),
-            max_records=dict(),
+            max_records=dict(type='int'),
             id_regex=dict(required=False, default=None),
+            engine=dict(required=False, default=None),
             snapshot_type=dict(required=False, default=None,
                 choices=['automated', 'manual', 'shared', 'public']),
             status = dict(required=False, default=None,
@@ -201,13 +373,21 @@ def main():
                          'deleting', 'failed', 'modifying', 'rebooting',
                          'resetting-master-credentials']),
             sort = dict(required=False, default=None,
-                choices=['id', 'snapshot_create_time']),
+                choices=['id', 'snapshot_create_time', 'cluster_create_time']),
             sort_order = dict(required=False, default='ascending',
                 choices=['ascending', 'descending']),
-            sort_start = dict(required=False),
-            sort_end = dict(required=False),
+            sort_start = dict(required=False, type='int'),
+            sort_end = dict(required=False, type='int'),
+            cache_ttl = dict(required=False, type='int', default=0),
+            cache_path = dict(required=False, type='path', default='~/.ansible/tmp/rds_cluster_snapshot_facts'),
+            regions = dict(required=False, type='list', default=None),
+            fields = dict(required=False, type='list', default=None),
+            count_only = dict(required=False, type='bool', default=False),
+            group_by = dict(required=False, default=None, choices=['cluster_id']),
         )
     )
+    argument_spec.update(metrics_argument_spec())
+    argument_spec.update(rate_limit_argument_spec())
     module = AnsibleModule(argument_spec=argument_spec, mutually_exclusive=['snapshot_id', 'cluster_id'])
 
     if not HAS_BOTO3:
@@ -217,22 +397,55 @@ def main():
     cluster_id = module.params.get('cluster_id')
     max_records = module.params.get('max_records')
     id_regex = module.params.get('id_regex')
+    engine = module.params.get('engine')
     snapshot_type = module.params.get('snapshot_type')
     status = module.params.get('status')
     sort = module.params.get('sort')
     sort_order = module.params.get('sort_order')
     sort_start = module.params.get('sort_start')
     sort_end = module.params.get('sort_end')
+    cache_ttl = module.params.get('cache_ttl')
+    cache_path = module.params.get('cache_path')
+    fields = module.params.get('fields')
+    count_only = module.params.get('count_only')
+    group_by = module.params.get('group_by')
+
+    if fields is not None:
+        unknown = set(fields) - set(SNAPSHOT_FIELDS) - set(['region'])
+        if unknown:
+            module.fail_json(msg='Unsupported fields: %s. Supported fields are: %s' % (
+                ', '.join(sorted(unknown)), ', '.join(['region'] + sorted(SNAPSHOT_FIELDS))))
+
+    region, ec2_url, aws_connect_kwargs = get_aws_connection_info(module, boto3=True)
+    regions = module.params.get('regions') or [region]
+
+    clients = []
+    catalogs = dict()
+    for region in regions:
+        try:
+            rds = rds_client(module, region, ec2_url, aws_connect_kwargs)
+        except botocore.exceptions.ClientError as e:
+            module.fail_json(msg="Boto3 Client Error - " + str(e))
+
+        if module.params.get('metrics'):
+            instrument(module, rds)
+
+        if module.params.get('rate_limit'):
+            rate_limit(rds, module.params, region, ec2_url, aws_connect_kwargs)
 
-    try:
-        region, ec2_url, aws_connect_kwargs = get_aws_connection_info(module, boto3=True)
-        rds = boto3_conn(module, conn_type='client', resource='rds', region=region, endpoint=ec2_url, **aws_connect_kwargs)
-    except botocore.exceptions.ClientError, e:
-        module.fail_json(msg="Boto3 Client Error - " + str(e))
+        if cache_ttl > 0:
+            cache_key = dict(
+                region=region,
+                endpoint=ec2_url,
+                profile=aws_connect_kwargs.get('profile_name'),
+                access_key=aws_connect_kwargs.get('aws_access_key_id'),
+            )
+            catalogs[region] = SnapshotCatalog(cache_path, cache_key, cache_ttl)
+        clients.append((region, rds))
 
     find_snapshot_facts(
         module=module,
-        client=rds,
+        clients=clients,
         snapshot_id=snapshot_id,
         cluster_id=cluster_id,
         max_records=max_records,
@@ -242,12 +455,21 @@ def main():
         sort=sort,
         sort_order=sort_order,
         sort_start=sort_start,
-        sort_end=sort_end
+        sort_end=sort_end,
+        catalogs=catalogs,
+        engine=engine,
+        fields=fields,
+        count_only=count_only,
+        group_by=group_by,
     )
 
 # import module snippets
 from ansible.module_utils.basic import *
 from ansible.module_utils.ec2 import *
+from ansible.module_utils.rds_cluster_broker import rds_client
+from ansible.module_utils.rds_cluster_metrics import instrument, metrics_argument_spec, phase
+from ansible.module_utils.rds_cluster_ratelimit import rate_limit, rate_limit_argument_spec
+from ansible.module_utils.rds_cluster_snapshots import SNAPSHOT_FIELDS, SnapshotCatalog, search_region, select_snapshots, snapshot_data, snapshot_query
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,293 @@
+#!/usr/bin/python
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+DOCUMENTATION = '''
+---
+module: rds_cluster_snapshot_prune
+short_description: Deletes manual RDS cluster snapshots outside a retention policy
+description:
+    - Deletes the manual snapshots of RDS clusters which are neither among the newest of their cluster nor recent enough
+      to keep, with a single listing of the snapshots and a number of deletions at the same time.
+    - Only snapshots with a status of C(available) are counted or deleted. Automated snapshots are never deleted.
+    - Supports check mode, in which the snapshots which would be deleted are returned.
+options:
+  cluster_id:
+    description:
+      - Only prune the snapshots of this DB cluster. All clusters are pruned when not given.
+    required: false
+    default: null
+  id_regex:
+    description:
+      - Only prune snapshots whose ID matches this regular expression, matched from the start of the ID.
+      - Snapshots which do not match are neither deleted nor counted towards I(keep_newest).
+    required: false
+    default: null
+  engine:
+    description:
+      - Only prune snapshots of this database engine.
+    required: false
+    default: null
+  keep_newest:
+    description:
+      - Number of the newest snapshots of each cluster to keep.
+    required: false
+    default: null
+  older_than_days:
+    description:
+      - Only delete snapshots created more than this number of days ago.
+      - With I(keep_newest), snapshots are deleted when they are both older than this and not among the newest of their cluster.
+    required: false
+    default: null
+  concurrency:
+    description:
+      - Maximum number of snapshots to delete at the same time.
+      - Throttled deletions are retried with an increasing delay, which may be combined with I(rate_limit).
+    required: false
+    default: 10
+  max_records:
+    description:
+      - Number of records to request per page of results from AWS (between 20 and 100).
+    required: false
+    default: null
+  metrics:
+    description:
+      - Include a C(metrics) key in the result, with the number, latency, retries and throttles of the API calls made
+        per operation, and the time spent in each phase of the module.
+    required: false
+    default: false
+  rate_limit:
+    description:
+      - Maximum number of RDS requests per second, shared by all of the rds_cluster* module processes on the host
+        which use the same region and credentials, such as parallel forks. C(0) for no limit.
+      - Throttling responses from AWS reduce the rate, which then recovers to this limit over a minute.
+    required: false
+    default: 0
+  rate_limit_burst:
+    description:
+      - Number of requests which may be made at once before I(rate_limit) applies.
+    required: false
+    default: one second of requests at I(rate_limit)
+  rate_limit_path:
+    description:
+      - Directory in which to keep the state of the shared rate limit.
+    required: false
+    default: ~/.ansible/tmp/rds_cluster_rate_limit
+
+author: "Tom Bamford (@manicminer)"
+extends_documentation_fragment:
+    - aws
+    - ec2
+'''
+
+EXAMPLES = '''
+# Keep the 7 newest manual snapshots of every cluster
+- local_action:
+    module: rds_cluster_snapshot_prune
+    keep_newest: 7
+
+# Delete the manual snapshots of a cluster older than 30 days, but always keep the newest 3
+- local_action:
+    module: rds_cluster_snapshot_prune
+    cluster_id: my-rds-cluster
+    keep_newest: 3
+    older_than_days: 30
+    concurrency: 20
+    rate_limit: 10
+
+# Show which nightly snapshots would be deleted
+- local_action:
+    module: rds_cluster_snapshot_prune
+    id_regex: 'nightly-'
+    older_than_days: 90
+  check_mode: yes
+'''
+
+RETURN = '''
+deleted:
+    description:
+      - The snapshots deleted (or which would be deleted in check mode), oldest first within each cluster.
+    returned: always
+    type: list
+    sample: [{"snapshot_id": "my-rds-cluster-2017-06-01", "cluster_id": "my-rds-cluster",
+              "snapshot_create_time": "2017-06-01T00:00:00+00:00"}]
+kept:
+    description: Number of matching snapshots kept.
+    returned: always
+    type: int
+    sample: 21
+failed_snapshots:
+    description: The snapshots which could not be deleted, with the error for each.
+    returned: on failure
+    type: list
+    sample: [{"snapshot_id": "my-rds-cluster-2017-06-01", "msg": "An error occurred (InvalidDBClusterSnapshotStateFault) ..."}]
+metrics:
+    description:
+      - API call counts, latencies, retries and throttles per operation, the seconds spent in each phase, and the
+        seconds spent waiting for I(rate_limit).
+    returned: when metrics is enabled
+    type: dict
+    sample: {"wall_time": 3.2, "api_calls": 2, "throttles": 0, "rate_limit_wait": 0.0, "phases": {"describe": 0.4},
+             "operations": {"describe_db_clusters": {"calls": 1, "errors": 0, "retries": 0, "throttles": 0,
+                                                     "time": 0.4, "max_time": 0.4, "bytes": 2048}}}
+'''
+
+try:
+    import boto3
+    import botocore.exceptions
+    import dateutil.tz
+    HAS_BOTO3 = True
+except ImportError:
+    HAS_BOTO3 = False
+
+import datetime
+from multiprocessing.pool import ThreadPool
+
+# Fields returned for each deleted snapshot
+PRUNE_FIELDS = ['snapshot_id', 'cluster_id', 'snapshot_create_time']
+
+
+def prune_candidates(groups, keep_newest=None, older_than=None):
+    """Return the snapshots of each group outside the retention policy, and the number kept
+
+    groups is a dict of cluster ID to (region, snapshot) tuples, as returned
+    by group_snapshots. Each group is sorted newest first, its first
+    keep_newest are kept, and only those of the rest created before
+    older_than are returned, oldest first.
+    """
+    candidates = []
+    kept = 0
+    for cluster_id in sorted(groups):
+        snapshots = select_snapshots(groups[cluster_id], sort='snapshot_create_time', sort_order='descending', sort_start=keep_newest)
+        if older_than is not None:
+            snapshots = [s for s in snapshots if s[1]['SnapshotCreateTime'] < older_than]
+        kept += len(groups[cluster_id]) - len(snapshots)
+        candidates.extend(reversed(snapshots))
+    return candidates, kept
+
+
+def delete_snapshots(client, snapshots, concurrency):
+    """Delete the snapshots concurrently, returning the outcome of each"""
+
+    def delete(snapshot):
+        outcome = snapshot_data(snapshot, fields=PRUNE_FIELDS)
+        snapshot_id = snapshot['DBClusterSnapshotIdentifier']
+        try:
+            call_with_backoff(lambda: client.delete_db_cluster_snapshot(DBClusterSnapshotIdentifier=snapshot_id))
+        except botocore.exceptions.ClientError as e:
+            # Already deleted by something else
+            if e.response['Error']['Code'] != 'DBClusterSnapshotNotFoundFault':
+                outcome.update(failed=True, msg=str(e))
+        return outcome
+
+    pool = ThreadPool(max(1, min(concurrency, len(snapshots))))
+    try:
+        return pool.map(delete, snapshots)
+    finally:
+        pool.close()
+
+
+def prune_snapshots(module, client, region, **params):
+    criteria = dict(
+        snapshot_id=None,
+        cluster_id=params['cluster_id'],
+        engine=params['engine'],
+        id_regex=params['id_regex'],
+        snapshot_type='manual',
+    )
+
+    older_than = None
+    if params['older_than_days'] is not None:
+        older_than = datetime.datetime.now(dateutil.tz.tzutc()) - datetime.timedelta(days=params['older_than_days'])
+
+    try:
+        with phase('describe'):
+            groups = search_region(client, region, max_records=params['max_records'], status='available',
+                                   group_by='cluster_id', **criteria)[0]
+    except (botocore.exceptions.ClientError, botocore.exceptions.BotoCoreError) as e:
+        module.fail_json(msg=str(e))
+
+    candidates, kept = prune_candidates(groups, keep_newest=params['keep_newest'], older_than=older_than)
+    snapshots = [snapshot for region, snapshot in candidates]
+
+    if module.check_mode or not snapshots:
+        module.exit_json(changed=bool(snapshots), deleted=[snapshot_data(s, fields=PRUNE_FIELDS) for s in snapshots], kept=kept)
+
+    with phase('delete'):
+        outcomes = delete_snapshots(client, snapshots, params['concurrency'])
+
+    deleted = [o for o in outcomes if not o.get('failed')]
+    failed = [dict(snapshot_id=o['snapshot_id'], msg=o['msg']) for o in outcomes if o.get('failed')]
+    if failed:
+        module.fail_json(msg='Failed to delete %d of %d DB cluster snapshots' % (len(failed), len(outcomes)),
+                         changed=bool(deleted), deleted=deleted, kept=kept + len(failed), failed_snapshots=failed)
+
+    module.exit_json(changed=True, deleted=deleted, kept=kept)
+
+
+def main():
+    module_args = dict(
+        cluster_id = dict(required=False, default=None),
+        id_regex = dict(required=False, default=None),
+        engine = dict(required=False, default=None),
+        keep_newest = dict(required=False, type='int', default=None),
+        older_than_days = dict(required=False, type='int', default=None),
+        concurrency = dict(required=False, type='int', default=10),
+        max_records = dict(required=False, type='int', default=None),
+    )
+    module_args.update(metrics_argument_spec())
+    module_args.update(rate_limit_argument_spec())
+    argument_spec = ec2_argument_spec()
+    argument_spec.update(module_args)
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        required_one_of=[['keep_newest', 'older_than_days']],
+        supports_check_mode=True,
+    )
+
+    args_dict = {arg: module.params.get(arg) for arg in module_args.keys()}
+
+    if args_dict['keep_newest'] is not None and args_dict['keep_newest'] < 0:
+        module.fail_json(msg='keep_newest must not be negative')
+
+    if not HAS_BOTO3:
+        module.fail_json(msg='boto3 required for this module')
+
+    try:
+        region, ec2_url, aws_connect_kwargs = get_aws_connection_info(module, boto3=True)
+        rds = rds_client(module, region, ec2_url, aws_connect_kwargs)
+    except botocore.exceptions.ClientError as e:
+        module.fail_json(msg="Boto3 Client Error - " + str(e))
+
+    if module.params.get('metrics'):
+        instrument(module, rds)
+
+    if module.params.get('rate_limit'):
+        rate_limit(rds, module.params, region, ec2_url, aws_connect_kwargs)
+
+    prune_snapshots(module, rds, region, **args_dict)
+
+
+# import module snippets
+from ansible.module_utils.basic import *
+from ansible.module_utils.ec2 import *
+from ansible.module_utils.rds_cluster_broker import rds_client
+from ansible.module_utils.rds_cluster_metrics import instrument, metrics_argument_spec, phase
+from ansible.module_utils.rds_cluster_ratelimit import rate_limit, rate_limit_argument_spec
+from ansible.module_utils.rds_cluster_snapshots import search_region, select_snapshots, snapshot_data
+from ansible.module_utils.rds_cluster_utils import call_with_backoff
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/python
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+DOCUMENTATION = '''
+---
+module: rds_cluster_wait
+short_description: Waits for RDS clusters and cluster instances to reach a status
+description:
+    - Waits for any number of RDS clusters and cluster instances to reach their target statuses, all at the same time.
+    - Clusters are checked with a single request, and instances with a single request per cluster, however many are waited for.
+options:
+  clusters:
+    description:
+      - List of clusters to wait for.
+      - Each entry is either a cluster ID, or a dictionary with I(id) and optionally I(status).
+    required: false
+    default: null
+  instances:
+    description:
+      - List of cluster instances to wait for.
+      - Each entry is either an instance ID, or a dictionary with I(id) and optionally I(cluster_id) and I(status).
+      - Providing I(cluster_id) allows instances of the same cluster to be checked together.
+    required: false
+    default: null
+  tokens:
+    description:
+      - List of I(wait_token) values returned by the rds_cluster and rds_cluster_instance modules when I(wait=no).
+    required: false
+    default: null
+  status:
+    description:
+      - Status to wait for, for entries which do not specify their own.
+      - C(deleted) waits until the resource no longer exists.
+    required: false
+    default: available
+  wait_timeout:
+    description:
+      - Number of seconds to wait for all of the resources before giving up.
+    required: false
+    default: 3600
+  wait_delay:
+    description:
+      - Number of seconds between the first status checks.
+    required: false
+    default: 5
+  wait_max_delay:
+    description:
+      - Maximum number of seconds between status checks.
+    required: false
+    default: 60
+  wait_backoff:
+    description:
+      - Factor by which the interval between status checks grows after each check.
+    required: false
+    default: 1.5
+  wait_jitter:
+    description:
+      - Fraction by which each interval between status checks is randomly varied.
+    required: false
+    default: 0.2
+  wait_method:
+    description:
+      - How to detect when the wait is over.
+      - C(poll) checks the status of the resources each time.
+      - C(events) follows the RDS event stream and only checks the status of the resources once an event
+        occurs for one of them, failing immediately on a failure event.
+    choices: ['poll', 'events']
+    required: false
+    default: poll
+  metrics:
+    description:
+      - Include a C(metrics) key in the result, with the number, latency, retries and throttles of the API calls made
+        per operation, and the time spent in each phase of the module.
+    required: false
+    default: false
+  rate_limit:
+    description:
+      - Maximum number of RDS requests per second, shared by all of the rds_cluster* module processes on the host
+        which use the same region and credentials, such as parallel forks. C(0) for no limit.
+      - Throttling responses from AWS reduce the rate, which then recovers to this limit over a minute.
+    required: false
+    default: 0
+  rate_limit_burst:
+    description:
+      - Number of requests which may be made at once before I(rate_limit) applies.
+    required: false
+    default: one second of requests at I(rate_limit)
+  rate_limit_path:
+    description:
+      - Directory in which to keep the state of the shared rate limit.
+    required: false
+    default: ~/.ansible/tmp/rds_cluster_rate_limit
+
+author: "Tom Bamford (@manicminer)"
+extends_documentation_fragment:
+    - aws
+    - ec2
+'''
+
+EXAMPLES = '''
+# Wait for a cluster and its instances, which were created with wait=no
+- local_action:
+    module: rds_cluster_wait
+    clusters:
+      - my-aurora-cluster
+    instances:
+      - id: my-aurora-cluster-001
+        cluster_id: my-aurora-cluster
+      - id: my-aurora-cluster-002
+        cluster_id: my-aurora-cluster
+    wait_timeout: 3600
+
+# Wait using the tokens returned by earlier tasks
+- local_action:
+    module: rds_cluster_wait
+    tokens:
+      - "{{ cluster.wait_token }}"
+      - "{{ instance.wait_token }}"
+
+# Wait for an old cluster to be deleted
+- local_action:
+    module: rds_cluster_wait
+    clusters:
+      - id: my-old-cluster
+        status: deleted
+'''
+
+RETURN = '''
+resources:
+    description:
+      - The resources waited for, with the number of seconds each took to reach its status.
+      - On timeout, the resources which did not reach their status, with their C(current) status.
+    returned: always
+    type: list
+    sample: [{"type": "cluster", "id": "my-aurora-cluster", "status": "available", "elapsed": 412.5}]
+metrics:
+    description:
+      - API call counts, latencies, retries and throttles per operation, the seconds spent in each phase, and the
+        seconds spent waiting for I(rate_limit).
+    returned: when metrics is enabled
+    type: dict
+    sample: {"wall_time": 3.2, "api_calls": 2, "throttles": 0, "rate_limit_wait": 0.0, "phases": {"describe": 0.4},
+             "operations": {"describe_db_clusters": {"calls": 1, "errors": 0, "retries": 0, "throttles": 0,
+                                                     "time": 0.4, "max_time": 0.4, "bytes": 2048}}}
+'''
+
+try:
+    import boto3
+    import botocore.exceptions
+    HAS_BOTO3 = True
+except ImportError:
+    HAS_BOTO3 = False
+
+import time
+
+
+def wait_targets(module, region, clusters, instances, tokens, status):
+    """Gather the target status of every cluster and instance to wait for"""
+    cluster_targets = dict()
+    instance_targets = dict()
+
+    def entry(item):
+        if isinstance(item, dict):
+            if not item.get('id'):
+                module.fail_json(msg='Each cluster and instance to wait for requires an id', entry=item)
+            return item
+        return dict(id=item)
+
+    for item in clusters:
+        item = entry(item)
+        cluster_targets[item['id']] = item.get('status') or status
+    for item in instances:
+        item = entry(item)
+        instance_targets[item['id']] = (item.get('cluster_id'), item.get('status') or status)
+
+    for token in tokens:
+        if token.get('region') not in (None, region):
+            module.fail_json(msg='Wait token for %s is for region %s, not %s' % (token.get('id'), token['region'], region))
+        if token.get('type') == 'cluster':
+            cluster_targets[token['id']] = token.get('status') or status
+        elif token.get('type') == 'instance':
+            instance_targets[token['id']] = (token.get('cluster_id'), token.get('status') or status)
+        else:
+            module.fail_json(msg='Invalid wait token', token=token)
+
+    return cluster_targets, instance_targets
+
+
+def wait_for_all(module, client, cluster_targets, instance_targets, **params):
+    started = time.time()
+
+    try:
+        with phase('wait'):
+            reached_at = wait_for_resources(client, params['wait_timeout'], clusters=cluster_targets, instances=instance_targets, **waiter_options(params))
+    except RDSClusterError as e:
+        module.fail_json(msg=str(e), **e.details)
+    except WaitTimeout as e:
+        pending = []
+        for (resource, resource_id), described in sorted(e.last.items()):
+            described = described or {}
+            if resource == 'cluster':
+                pending.append(dict(type=resource, id=resource_id, status=cluster_targets[resource_id], current=described.get('Status')))
+            else:
+                pending.append(dict(type=resource, id=resource_id, status=instance_targets[resource_id][1], current=described.get('DBInstanceStatus')))
+        module.fail_json(msg='Timed out waiting for %d DB clusters and instances' % len(pending), resources=pending)
+    except botocore.exceptions.ClientError as e:
+        module.fail_json(msg=str(e))
+
+    resources = [dict(type='cluster', id=i, status=s, elapsed=reached_at[('cluster', i)] - started)
+                 for i, s in sorted(cluster_targets.items())]
+    resources += [dict(type='instance', id=i, status=s, elapsed=reached_at[('instance', i)] - started)
+                  for i, (c, s) in sorted(instance_targets.items())]
+    module.exit_json(changed=False, resources=resources)
+
+
+def main():
+    module_args = dict(
+        clusters = dict(required=False, type='list', default=None),
+        instances = dict(required=False, type='list', default=None),
+        tokens = dict(required=False, type='list', default=None),
+        status = dict(required=False, default='available'),
+        wait_timeout = dict(required=False, type='int', default=3600),
+    )
+    module_args.update(waiter_argument_spec())
+    module_args.update(metrics_argument_spec())
+    module_args.update(rate_limit_argument_spec())
+    argument_spec = ec2_argument_spec()
+    argument_spec.update(module_args)
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        required_one_of=[['clusters', 'instances', 'tokens']],
+    )
+
+    args_dict = {arg: module.params.get(arg) for arg in module_args.keys()}
+
+    if not HAS_BOTO3:
+        module.fail_json(msg='boto3 required for this module')
+
+    try:
+        region, ec2_url, aws_connect_kwargs = get_aws_connection_info(module, boto3=True)
+        rds = rds_client(module, region, ec2_url, aws_connect_kwargs)
+    except botocore.exceptions.ClientError as e:
+        module.fail_json(msg="Boto3 Client Error - " + str(e))
+
+    if module.params.get('metrics'):
+        instrument(module, rds)
+
+    if module.params.get('rate_limit'):
+        rate_limit(rds, module.params, region, ec2_url, aws_connect_kwargs)
+
+    cluster_targets, instance_targets = wait_targets(module, region, args_dict['clusters'] or [], args_dict['instances'] or [], args_dict['tokens'] or [], args_dict['status'])
+    wait_for_all(module, rds, cluster_targets, instance_targets, **args_dict)
+
+
+# import module snippets
+from ansible.module_utils.basic import *
+from ansible.module_utils.ec2 import *
+from ansible.module_utils.rds_cluster_broker import rds_client
+from ansible.module_utils.rds_cluster_metrics import instrument, metrics_argument_spec, phase
+from ansible.module_utils.rds_cluster_ratelimit import rate_limit, rate_limit_argument_spec
+from ansible.module_utils.rds_cluster_utils import *
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+#!/usr/bin/python
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Optional broker which keeps warm boto3 RDS clients for the rds_cluster* modules
+
+Each module task is a new Python process which would otherwise import boto3,
+load the service model, resolve credentials and build a client before making
+any calls. When a broker is running on the controller, the modules send their
+API calls to it over a Unix socket instead, and it reuses one client per
+region, endpoint and set of credentials. This saves creating the client, but
+not importing boto3, which ansible.module_utils.ec2 does in every module.
+
+Start the broker on the controller with:
+
+    python module_utils/rds_cluster_broker.py [--socket PATH] [--idle-timeout SECONDS]
+
+The modules find it through the RDS_CLUSTER_BROKER_SOCKET environment
+variable, or at ~/.ansible/rds_cluster_broker.sock by default. When no broker
+is listening they create a client directly with boto3_conn as usual. If it
+stops responding part way through a call, read-only calls are made again with
+a direct client, but calls which change something fail, since the broker may
+already have made them.
+
+Messages are pickled, so the socket is only accessible to the user running
+the broker.
+"""
+
+import os
+import pickle
+import socket
+import struct
+import sys
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+try:
+    import boto3
+    import botocore.exceptions
+    from botocore.paginate import TokenEncoder
+    HAS_BOTO3 = True
+except ImportError:
+    HAS_BOTO3 = False
+
+try:
+    from ansible.module_utils.ec2 import boto3_conn
+    from ansible.module_utils.rds_cluster_utils import THROTTLING_ERRORS
+except ImportError:
+    pass  # only needed by the modules, not when running the broker itself
+
+DEFAULT_SOCKET = '~/.ansible/rds_cluster_broker.sock'
+PICKLE_PROTOCOL = 2
+
+# Prefixes of the operations which only read, so can safely be made again if the broker is lost during them
+READ_PREFIXES = ('describe_', 'list_')
+
+# Request parameter of the RDS describe operations which continues a listing from the Marker of a page
+MARKER = 'Marker'
+
+
+def broker_socket_path():
+    return os.path.expanduser(os.environ.get('RDS_CLUSTER_BROKER_SOCKET', DEFAULT_SOCKET))
+
+
+def send_message(sock, message):
+    data = pickle.dumps(message, PICKLE_PROTOCOL)
+    sock.sendall(struct.pack('!I', len(data)) + data)
+
+
+def receive_message(sock):
+    header = receive_exactly(sock, 4)
+    if header is None:
+        return None
+    data = receive_exactly(sock, struct.unpack('!I', header)[0])
+    if data is None:
+        return None
+    return pickle.loads(data)
+
+
+def receive_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+if HAS_BOTO3:
+    class BrokerError(botocore.exceptions.BotoCoreError):
+        """Raised for failures in the broker other than ClientErrors"""
+        fmt = '{msg}'
+
+
+class BrokerClient(object):
+    """Stand-in for a boto3 RDS client which sends API calls through the broker
+
+    Supports plain API calls and get_paginator(). If the broker can not be
+    reached, that call and all later ones are made with a client from
+    `fallback` instead. If the connection is lost during a read-only call, it
+    is made again with the fallback client, and listings continue from the
+    last page received. A call which changes something may already have been
+    made by the broker, so it fails with BrokerError rather than being made
+    twice. When
+    set, `observer` is called with the latency and response or error code of
+    each call (or page) made, and `limiter` is given a chance to delay each
+    call (or listing) and told of throttling errors.
+    """
+
+    def __init__(self, path, client_spec, fallback):
+        self._path = path
+        self._client_spec = client_spec
+        self._fallback = fallback
+        self._direct = None
+        self._lock = threading.Lock()
+        self.observer = None
+        self.limiter = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self._path)
+        return sock
+
+    def _direct_client(self):
+        with self._lock:
+            if self._direct is None:
+                self._direct = self._fallback()
+        return self._direct
+
+    def _request(self, message):
+        """Send a request to the broker, returning the connected socket, or None if it is unavailable"""
+        if self.limiter is not None:
+            self.limiter.acquire()
+        if self._direct is not None:
+            return None
+        sock = None
+        try:
+            sock = self._connect()
+            send_message(sock, dict(message, client=self._client_spec))
+            return sock
+        except socket.error:
+            if sock is not None:
+                sock.close()
+            return None
+
+    def _receive(self, sock):
+        """Receive a response from the broker, or None if the connection was lost"""
+        try:
+            return receive_message(sock)
+        except socket.error:
+            return None
+
+    def _result(self, response):
+        if 'client_error' in response:
+            raise botocore.exceptions.ClientError(response['client_error'], response['operation'])
+        if 'error' in response:
+            raise BrokerError(msg=response['error'])
+        return response['result']
+
+    def _observe(self, operation, started, response=None, error=None):
+        if self.observer is not None:
+            self.observer(operation, time.time() - started, response=response, error=error)
+
+    def _observed(self, operation, responses):
+        """Pass each response through to the observer as it is received"""
+        started = time.time()
+        try:
+            for response in responses:
+                self._observe(operation, started, response)
+                yield response
+                started = time.time()
+        except botocore.exceptions.ClientError as e:
+            self._observe(operation, started, error=e.response['Error']['Code'])
+            if self.limiter is not None and e.response['Error']['Code'] in THROTTLING_ERRORS:
+                self.limiter.throttled()
+            raise
+
+    def _call(self, operation, **kwargs):
+        sock = self._request(dict(call=operation, kwargs=kwargs))
+        if sock is not None:
+            try:
+                response = self._receive(sock)
+            finally:
+                sock.close()
+            if response is not None:
+                yield self._result(response)
+                return
+            if not operation.startswith(READ_PREFIXES):
+                # Later calls are made directly
+                self._direct_client()
+                raise BrokerError(msg='Connection to RDS client broker was lost during %s, which may have been made' % operation)
+        yield getattr(self._direct_client(), operation)(**kwargs)
+
+    def _paginate(self, operation, **kwargs):
+        sock = self._request(dict(paginate=operation, kwargs=kwargs))
+        if sock is not None:
+            marker = None
+            try:
+                while True:
+                    response = self._receive(sock)
+                    if response is None:
+                        break
+                    page = self._result(response)
+                    if page is None:
+                        return
+                    yield page
+                    marker = page.get(MARKER)
+                    if marker is None:
+                        return
+            finally:
+                sock.close()
+            if marker is not None:
+                # Continue the listing where the broker left off
+                config = dict(kwargs.get('PaginationConfig') or {}, StartingToken=TokenEncoder().encode({MARKER: marker}))
+                kwargs = dict(kwargs, PaginationConfig=config)
+
+        for page in self._direct_client().get_paginator(operation).paginate(**kwargs):
+            yield page
+
+    def call(self, operation, **kwargs):
+        return next(self._observed(operation, self._call(operation, **kwargs)))
+
+    def paginate(self, operation, **kwargs):
+        return self._observed(operation, self._paginate(operation, **kwargs))
+
+    def get_paginator(self, operation):
+        return BrokerPaginator(self, operation)
+
+    def __getattr__(self, operation):
+        if operation.startswith('_'):
+            raise AttributeError(operation)
+
+        def call(**kwargs):
+            return self.call(operation, **kwargs)
+        return call
+
+
+class BrokerPaginator(object):
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, **kwargs):
+        return self.client.paginate(self.operation, **kwargs)
+
+
+def rds_client(module, region, endpoint, aws_connect_kwargs):
+    """Return an RDS client, using the broker when one is running"""
+
+    def direct():
+        return boto3_conn(module, conn_type='client', resource='rds', region=region, endpoint=endpoint, **aws_connect_kwargs)
+
+    path = broker_socket_path()
+    if not os.path.exists(path):
+        return direct()
+
+    client_spec = dict(region=region, endpoint=endpoint, connect_kwargs=aws_connect_kwargs)
+    return BrokerClient(path, client_spec, direct)
+
+
+class BrokerHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        message = receive_message(self.request)
+        if message is None:
+            return
+        self.server.touch()
+
+        try:
+            client = self.server.client(message['client'])
+            if 'paginate' in message:
+                for page in client.get_paginator(message['paginate']).paginate(**message['kwargs']):
+                    send_message(self.request, dict(result=page))
+                send_message(self.request, dict(result=None))
+            else:
+                send_message(self.request, dict(result=getattr(client, message['call'])(**message['kwargs'])))
+        except botocore.exceptions.ClientError as e:
+            send_message(self.request, dict(client_error=e.response, operation=e.operation_name))
+        except Exception as e:
+            send_message(self.request, dict(error='%s: %s' % (type(e).__name__, e)))
+
+
+class BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, idle_timeout):
+        self.clients = dict()
+        self.clients_lock = threading.Lock()
+        self.idle_timeout = idle_timeout
+        self.last_used = time.time()
+        socketserver.UnixStreamServer.__init__(self, path, BrokerHandler)
+
+    def touch(self):
+        self.last_used = time.time()
+
+    def client(self, spec):
+        """Return a client for the region, endpoint and credentials, creating it on first use"""
+        connect_kwargs = dict(spec['connect_kwargs'])
+        key = pickle.dumps((spec['region'], spec['endpoint'], sorted(connect_kwargs.items())), PICKLE_PROTOCOL)
+
+        with self.clients_lock:
+            if key not in self.clients:
+                profile = connect_kwargs.pop('profile_name', None)
+                session = boto3.session.Session(profile_name=profile)
+                self.clients[key] = session.client('rds', region_name=spec['region'], endpoint_url=spec['endpoint'], **connect_kwargs)
+            return self.clients[key]
+
+    def watch_idle(self):
+        """Shut the server down once it has been idle for idle_timeout seconds"""
+        while time.time() - self.last_used < self.idle_timeout:
+            time.sleep(min(60, self.idle_timeout))
+        self.shutdown()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Keep warm boto3 RDS clients for the rds_cluster* modules')
+    parser.add_argument('--socket', default=broker_socket_path(), help='path of the Unix socket to listen on')
+    parser.add_argument('--idle-timeout', type=int, default=3600, help='exit after this many seconds without requests (0 to never exit)')
+    args = parser.parse_args()
+
+    if not HAS_BOTO3:
+        sys.exit('boto3 required for the RDS client broker')
+
+    path = os.path.expanduser(args.socket)
+    if os.path.exists(path):
+        os.unlink(path)
+
+    old_umask = os.umask(0o177)
+    try:
+        server = BrokerServer(path, args.idle_timeout)
+    finally:
+        os.umask(old_umask)
+
+    if args.idle_timeout:
+        watcher = threading.Thread(target=server.watch_idle)
+        watcher.daemon = True
+        watcher.start()
+
+    try:
+        server.serve_forever(poll_interval=1)
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
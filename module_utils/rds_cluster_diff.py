@@ -0,0 +1,157 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Comparison of the desired state of clusters and instances with their descriptions
+
+Each API argument used to create a resource is mapped to the option it comes
+from, how to find its current value in the describe output (preferring a
+value pending modification, so that a change already requested is not
+requested again), how to normalise both values before comparing them, and
+how to request a change. Arguments which cannot be modified after creation
+are never compared.
+"""
+
+
+def pending(key):
+    """Return a getter for an attribute, or the value it is pending modification to"""
+    def current(resource):
+        return resource.get('PendingModifiedValues', {}).get(key, resource.get(key))
+    return current
+
+
+def attribute(key):
+    def current(resource):
+        return resource.get(key)
+    return current
+
+
+def sorted_list(value):
+    return sorted(value or [])
+
+
+def lower(value):
+    return value.lower() if value is not None else None
+
+
+def boolean(value):
+    return bool(value) if value is not None else None
+
+
+def integer(value):
+    return int(value) if value is not None else None
+
+
+def modify_logs_exports(desired, current):
+    """Request a change of the exported log types as the types to enable and to disable"""
+    return dict(CloudwatchLogsExportConfiguration=dict(
+        EnableLogTypes=sorted(set(desired) - set(current)),
+        DisableLogTypes=sorted(set(current) - set(desired)),
+    ))
+
+
+CLUSTER_FIELDS = dict(
+    AvailabilityZones=dict(option='availability_zones', create_only=True),
+    DatabaseName=dict(option='database_name', create_only=True),
+    EngineVersion=dict(option='engine_version', current=pending('EngineVersion')),
+    Port=dict(option='port', current=pending('Port'), normalize=integer),
+    OptionGroupName=dict(
+        option='option_group',
+        current=lambda c: ([g['DBClusterOptionGroupName'] for g in c.get('DBClusterOptionGroupMemberships', [])] or [None])[0],
+    ),
+    VpcSecurityGroupIds=dict(
+        option='vpc_security_group_ids',
+        current=lambda c: [g['VpcSecurityGroupId'] for g in c.get('VpcSecurityGroups', [])],
+        normalize=sorted_list,
+    ),
+)
+
+INSTANCE_FIELDS = dict(
+    AvailabilityZone=dict(option='availability_zone', create_only=True),
+    DBInstanceClass=dict(option='instance_type', current=pending('DBInstanceClass')),
+    PreferredMaintenanceWindow=dict(option='preferred_maintenance_window', current=attribute('PreferredMaintenanceWindow'), normalize=lower),
+    DBParameterGroupName=dict(
+        option='parameter_group',
+        current=lambda i: ([g['DBParameterGroupName'] for g in i.get('DBParameterGroups', [])] or [None])[0],
+    ),
+    MultiAZ=dict(option='multi_az', current=pending('MultiAZ'), normalize=boolean),
+    AutoMinorVersionUpgrade=dict(option='auto_minor_version_upgrade', current=attribute('AutoMinorVersionUpgrade'), normalize=boolean),
+    OptionGroupName=dict(
+        option='option_group',
+        current=lambda i: ([g['OptionGroupName'] for g in i.get('OptionGroupMemberships', [])] or [None])[0],
+    ),
+    PubliclyAccessible=dict(option='publicly_accessible', current=attribute('PubliclyAccessible'), normalize=boolean),
+    CopyTagsToSnapshot=dict(option='copy_tags_to_snapshot', current=attribute('CopyTagsToSnapshot'), normalize=boolean),
+    MonitoringInterval=dict(option='monitoring_interval', current=attribute('MonitoringInterval'), normalize=integer),
+    MonitoringRoleArn=dict(option='monitoring_role_arn', current=attribute('MonitoringRoleArn')),
+    PromotionTier=dict(option='promotion_tier', current=attribute('PromotionTier'), normalize=integer),
+    EnablePerformanceInsights=dict(option='performance_insights', current=attribute('PerformanceInsightsEnabled'), normalize=boolean),
+    EnableCloudwatchLogsExports=dict(
+        option='cloudwatch_logs_exports',
+        current=attribute('EnabledCloudwatchLogsExports'),
+        normalize=sorted_list,
+        modify=modify_logs_exports,
+    ),
+)
+
+
+def diff_resource(fields, resource, api_args):
+    """Compare the arguments with which a resource would be created against its description
+
+    Returns the arguments for the modify call (empty when nothing has
+    changed), and a diff of the changed options with their normalised
+    values before and after, as used by Ansible's --diff.
+    """
+    modify_args = dict()
+    diff = dict(before=dict(), after=dict())
+
+    for arg, value in sorted(api_args.items()):
+        field = fields.get(arg)
+        if field is None or field.get('create_only'):
+            continue
+
+        normalize = field.get('normalize', lambda v: v)
+        current = normalize(field['current'](resource))
+        desired = normalize(value)
+        if current == desired:
+            continue
+
+        if 'modify' in field:
+            modify_args.update(field['modify'](desired, current))
+        else:
+            modify_args[arg] = value
+        diff['before'][field['option']] = current
+        diff['after'][field['option']] = desired
+
+    return modify_args, diff
+
+
+def creation_diff(fields, api_args):
+    """Return the diff for a resource created with the arguments"""
+    after = dict()
+    for arg, value in api_args.items():
+        if arg in fields:
+            after[fields[arg]['option']] = fields[arg].get('normalize', lambda v: v)(value)
+    return dict(before=dict(), after=after)
+
+
+def tags_diff(diff, current_tags, tag_diff, desired_tags):
+    """Add the tags to a diff, when reconcile_tags() changed any"""
+    if not any(tag_diff.values()):
+        return
+    before = dict((t['Key'], t['Value']) for t in current_tags)
+    after = dict((k, v) for k, v in before.items() if k not in tag_diff['removed'])
+    after.update((k, '%s' % v) for k, v in desired_tags.items())
+    diff['before']['tags'] = before
+    diff['after']['tags'] = after
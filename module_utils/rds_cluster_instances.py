@@ -0,0 +1,219 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Creation and modification of the DB instances of a cluster, shared by the rds_cluster and rds_cluster_instance modules"""
+
+try:
+    import botocore.exceptions
+except ImportError:
+    pass  # caught by the HAS_BOTO3 check in each module
+
+from multiprocessing.pool import ThreadPool
+
+from ansible.module_utils.rds_cluster_diff import INSTANCE_FIELDS, creation_diff, diff_resource, tags_diff
+from ansible.module_utils.rds_cluster_metrics import phase
+from ansible.module_utils.rds_cluster_utils import RDSClusterError, call_with_backoff, reconcile_tags, resource_tags
+
+# Error returned when deleting an instance which is already gone
+DELETED_INSTANCE_ERROR = 'DBInstanceNotFound'
+
+# Error returned when deleting an instance in a status from which it can not be deleted, including deleting
+INVALID_STATE_ERROR = 'InvalidDBInstanceState'
+
+
+def instance_argument_spec():
+    """Options of a DB instance, which may also be set for each entry of `instances`"""
+    return dict(
+        auto_minor_version_upgrade = dict(required=False, type='bool', default=True),
+        availability_zone = dict(required=False, default=None),
+        cloudwatch_logs_exports = dict(required=False, type='list', default=None),
+        cluster_id = dict(required=False),
+        copy_tags_to_snapshot = dict(required=False, type='bool', default=True),
+        instance_id = dict(required=False),
+        instance_type = dict(required=False),
+        monitoring_interval = dict(required=False, type='int', default=0, choices=[0, 1, 5, 10, 15, 30, 60]),
+        monitoring_role_arn = dict(required=False, default=None),
+        multi_az = dict(required=False, type='bool', default=False),
+        option_group = dict(required=False, default=None),
+        parameter_group = dict(required=False, default=None),
+        performance_insights = dict(required=False, type='bool', default=False),
+        preferred_maintenance_window = dict(required=False, default=None),
+        promotion_tier = dict(required=False, type='int', default=None),
+        publicly_accessible = dict(required=False, type='bool', default=False),
+        subnet_group = dict(required=False, default=None),
+        tags = dict(required=False, type='dict', default=None),
+        purge_tags = dict(required=False, type='bool', default=True),
+    )
+
+
+def ensure_db_instance(client, **params):
+    """Create the instance, or modify it to match params if it already exists
+
+    Returns a tuple of (changed, result, diff). Raises RDSClusterError on failure.
+    """
+
+    api_args = dict()
+    if params['instance_type'] is not None:
+        api_args['DBInstanceClass'] = params['instance_type']
+    if params['availability_zone'] is not None:
+        api_args['AvailabilityZone'] = params['availability_zone']
+    if params['preferred_maintenance_window'] is not None:
+        api_args['PreferredMaintenanceWindow'] = params['preferred_maintenance_window']
+    if params['parameter_group'] is not None:
+        api_args['DBParameterGroupName'] = params['parameter_group']
+    if params['multi_az'] is not None:
+        api_args['MultiAZ'] = params['multi_az']
+    if params['auto_minor_version_upgrade'] is not None:
+        api_args['AutoMinorVersionUpgrade'] = params['auto_minor_version_upgrade']
+    if params['option_group'] is not None:
+        api_args['OptionGroupName'] = params['option_group']
+    if params['publicly_accessible'] is not None:
+        api_args['PubliclyAccessible'] = params['publicly_accessible']
+    if params['copy_tags_to_snapshot'] is not None:
+        api_args['CopyTagsToSnapshot'] = params['copy_tags_to_snapshot']
+    if params['monitoring_interval'] is not None:
+        api_args['MonitoringInterval'] = params['monitoring_interval']
+    if params['monitoring_role_arn'] is not None:
+        api_args['MonitoringRoleArn'] = params['monitoring_role_arn']
+    if params['promotion_tier'] is not None:
+        api_args['PromotionTier'] = params['promotion_tier']
+    if params['performance_insights'] is not None:
+        api_args['EnablePerformanceInsights'] = params['performance_insights']
+    if params['cloudwatch_logs_exports'] is not None:
+        api_args['EnableCloudwatchLogsExports'] = params['cloudwatch_logs_exports']
+
+    tags = None
+    if params['tags'] is not None:
+        tags = [{'Key': k, 'Value': v} for k, v in params['tags'].items()]
+
+    try:
+        with phase('describe'):
+            check_instance = client.describe_db_instances(DBInstanceIdentifier=params['instance_id'])
+
+        if 'DBInstances' not in check_instance or len(check_instance['DBInstances']) != 1:
+            raise RDSClusterError('Failed to retrieve details for existing database instance')
+
+        # Determine instance modifications to make
+        instance = check_instance['DBInstances'][0]
+        with phase('diff'):
+            modify_args, diff = diff_resource(INSTANCE_FIELDS, instance, api_args)
+
+        changed = bool(modify_args)
+        if modify_args:
+            # Modify existing instance
+            with phase('modify'):
+                result = client.modify_db_instance(DBInstanceIdentifier=params['instance_id'], ApplyImmediately=params['apply_immediately'], **modify_args)
+        else:
+            # Return existing instance details verbatim
+            result = dict(DBInstance=instance)
+
+        # Set instance tags
+        if params['tags'] is not None:
+            with phase('tagging'):
+                current_tags = resource_tags(client, instance)
+                tag_diff = reconcile_tags(client, instance['DBInstanceArn'], current_tags, params['tags'], params['purge_tags'])
+            if any(tag_diff.values()):
+                changed = True
+                tags_diff(diff, current_tags, tag_diff, params['tags'])
+
+    except botocore.exceptions.ClientError as e:
+        if e.response['Error']['Code'] == 'DBInstanceNotFound':
+            api_args['DBInstanceIdentifier'] = params['instance_id']
+
+            if params['cluster_id'] is not None:
+                api_args['DBClusterIdentifier'] = params['cluster_id']
+            if params['engine'] is not None:
+                api_args['Engine'] = params['engine']
+            if params['subnet_group'] is not None:
+                api_args['DBSubnetGroupName'] = params['subnet_group']
+            if tags is not None:
+                api_args['Tags'] = tags
+
+            try:
+                with phase('create'):
+                    result = client.create_db_instance(**api_args)
+                changed = True
+                diff = creation_diff(INSTANCE_FIELDS, api_args)
+            except botocore.exceptions.ClientError as e:
+                raise RDSClusterError(str(e), api_args=api_args, error_code=e.response['Error']['Code'])
+
+        else:
+            raise RDSClusterError(str(e), api_args=api_args)
+
+    return changed, result, diff
+
+
+def instance_params(module, module_args, params, instance):
+    """Merge the options for one entry of `instances` over the module options"""
+    unsupported = set(instance) - set(instance_argument_spec())
+    if unsupported:
+        module.fail_json(msg='Unsupported options for instance %s: %s' % (instance.get('instance_id'), ', '.join(sorted(unsupported))))
+    if not instance.get('instance_id'):
+        module.fail_json(msg='instance_id is required for each entry in instances')
+
+    merged = dict(params)
+    for opt, val in instance.items():
+        arg_type = module_args[opt].get('type')
+        if val is not None and arg_type == 'bool':
+            val = module.boolean(val)
+        elif val is not None and arg_type == 'int':
+            val = int(val)
+        merged[opt] = val
+    return merged
+
+
+def invalid_state_outcome(client, instance_id, msg):
+    """Return the outcome of an instance which could not be deleted in its current status"""
+    try:
+        instances = call_with_backoff(lambda: client.describe_db_instances(DBInstanceIdentifier=instance_id))['DBInstances']
+    except botocore.exceptions.ClientError as e:
+        if e.response['Error']['Code'] == DELETED_INSTANCE_ERROR:
+            return dict()
+        return dict(failed=True, msg=str(e))
+
+    instance = instances[0]
+    if instance['DBInstanceStatus'] == 'deleting':
+        return dict(result=dict(DBInstance=instance), cluster_id=instance.get('DBClusterIdentifier'))
+    return dict(failed=True, status=instance['DBInstanceStatus'], msg='DB instance %s can not be deleted while %s: %s' % (
+        instance_id, instance['DBInstanceStatus'], msg))
+
+
+def delete_db_instances(client, instance_ids, concurrency):
+    """Delete the instances concurrently, returning the outcome of each
+
+    Instances which no longer exist or are already being deleted are not
+    changed. Instances which can not be deleted in their current status, such
+    as creating, are failed rather than waited for. A final snapshot can not
+    be taken of an instance in a cluster, so none is.
+    """
+
+    def delete(instance_id):
+        outcome = dict(instance_id=instance_id, changed=False)
+        try:
+            result = call_with_backoff(lambda: client.delete_db_instance(DBInstanceIdentifier=instance_id, SkipFinalSnapshot=True))
+            outcome.update(changed=True, result=result, cluster_id=result['DBInstance'].get('DBClusterIdentifier'))
+        except botocore.exceptions.ClientError as e:
+            code = e.response['Error']['Code']
+            if code == INVALID_STATE_ERROR:
+                outcome.update(invalid_state_outcome(client, instance_id, str(e)))
+            elif code != DELETED_INSTANCE_ERROR:
+                outcome.update(failed=True, msg=str(e))
+        return outcome
+
+    pool = ThreadPool(max(1, min(concurrency, len(instance_ids))))
+    try:
+        return pool.map(delete, instance_ids)
+    finally:
+        pool.close()
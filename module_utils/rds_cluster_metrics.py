@@ -0,0 +1,181 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Optional instrumentation of the API calls and phases of the rds_cluster* modules"""
+
+import contextlib
+import threading
+import time
+
+try:
+    from botocore import xform_name
+except ImportError:
+    pass  # caught by the HAS_BOTO3 check in each module
+
+from ansible.module_utils.rds_cluster_utils import THROTTLING_ERRORS
+
+# The collector for the running module, when metrics are enabled
+_collector = None
+
+
+def metrics_argument_spec():
+    return dict(
+        metrics = dict(required=False, type='bool', default=False),
+    )
+
+
+class ApiMetrics(object):
+    """Records the latency, retries, throttles and response size of each API call, and the time spent in each phase"""
+
+    def __init__(self, module=None):
+        self.module = module
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.operations = dict()
+        self.phases = dict()
+        self.rate_limit_wait = 0.0
+
+    def operation(self, name):
+        if name not in self.operations:
+            self.operations[name] = dict(calls=0, errors=0, retries=0, throttles=0, time=0.0, max_time=0.0, bytes=0)
+        return self.operations[name]
+
+    def record_call(self, name, latency, retries=0, error=None, size=None):
+        with self.lock:
+            op = self.operation(name)
+            op['calls'] += 1
+            op['time'] += latency
+            op['max_time'] = max(op['max_time'], latency)
+            op['retries'] += retries
+            if error:
+                op['errors'] += 1
+            if size:
+                op['bytes'] += size
+
+    def record_throttle(self, name):
+        with self.lock:
+            self.operation(name)['throttles'] += 1
+
+    def record_phase(self, name, elapsed):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def record_rate_limit_wait(self, seconds):
+        with self.lock:
+            self.rate_limit_wait += seconds
+
+    def report(self):
+        with self.lock:
+            return dict(
+                wall_time=time.time() - self.started,
+                api_calls=sum(op['calls'] for op in self.operations.values()),
+                throttles=sum(op['throttles'] for op in self.operations.values()),
+                rate_limit_wait=self.rate_limit_wait,
+                operations=dict((name, dict(op)) for name, op in self.operations.items()),
+                phases=dict(self.phases),
+            )
+
+    # botocore event handlers
+
+    def before_call(self, model, context, **kwargs):
+        # after-call-error is not given the model, so the operation is kept in the request context
+        context['metrics_operation'] = xform_name(model.name)
+        context['metrics_started'] = time.time()
+
+    def after_call(self, http_response, parsed, model, context, **kwargs):
+        latency = time.time() - context.get('metrics_started', time.time())
+        # The header avoids reading the body again, and is absent from stubbed responses
+        size = int(http_response.headers.get('content-length', 0)) if http_response is not None else None
+        self.record_call(
+            xform_name(model.name),
+            latency,
+            retries=parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0),
+            error=parsed.get('Error', {}).get('Code'),
+            size=size,
+        )
+
+    def after_call_error(self, context, exception, **kwargs):
+        latency = time.time() - context.get('metrics_started', time.time())
+        self.record_call(context.get('metrics_operation', 'unknown'), latency, error=type(exception).__name__)
+
+    def needs_retry(self, operation, response=None, **kwargs):
+        if response is not None and response[1].get('Error', {}).get('Code') in THROTTLING_ERRORS:
+            self.record_throttle(xform_name(operation.name))
+        return None
+
+    # Observer for clients which send their calls through the broker
+
+    def observe(self, operation, latency, response=None, error=None):
+        retries = (response or {}).get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        self.record_call(operation, latency, retries=retries, error=error)
+        if error in THROTTLING_ERRORS:
+            self.record_throttle(operation)
+
+
+def instrument(module, client):
+    """Collect metrics for the API calls made with client, and add them to the module result
+
+    May be called for more than one client, which share the same metrics.
+    """
+    global _collector
+    if _collector is not None and _collector.module is module:
+        collector = _collector
+    else:
+        _collector = collector = ApiMetrics(module)
+        wrap_results(module, collector)
+
+    events = getattr(getattr(client, 'meta', None), 'events', None)
+    if events is not None:
+        events.register('before-parameter-build.rds', collector.before_call)
+        events.register('after-call.rds', collector.after_call)
+        events.register('after-call-error.rds', collector.after_call_error)
+        events.register('needs-retry.rds', collector.needs_retry)
+    else:
+        client.observer = collector.observe
+    return collector
+
+
+def wrap_results(module, collector):
+    """Add the metrics to the result of the module, whether it exits or fails"""
+    exit_json = module.exit_json
+    fail_json = module.fail_json
+
+    def exit_with_metrics(**kwargs):
+        kwargs['metrics'] = collector.report()
+        exit_json(**kwargs)
+
+    def fail_with_metrics(**kwargs):
+        kwargs['metrics'] = collector.report()
+        fail_json(**kwargs)
+
+    module.exit_json = exit_with_metrics
+    module.fail_json = fail_with_metrics
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Record the wall time spent in a phase of the module, when metrics are enabled"""
+    started = time.time()
+    try:
+        yield
+    finally:
+        if _collector is not None:
+            _collector.record_phase(name, time.time() - started)
+
+
+def rate_limit_waited(seconds):
+    """Record time spent waiting for the shared rate limit, when metrics are enabled"""
+    if _collector is not None:
+        _collector.record_rate_limit_wait(seconds)
@@ -0,0 +1,156 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Optional request rate limit shared by all of the rds_cluster* module processes on a host
+
+The state of a token bucket is kept in a small file for each region, endpoint
+and set of credentials, and updated under an exclusive lock, so that parallel
+forks share one budget. Throttling responses halve the rate, which then
+recovers linearly to the configured limit.
+"""
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import time
+
+from ansible.module_utils.rds_cluster_metrics import rate_limit_waited
+from ansible.module_utils.rds_cluster_utils import THROTTLING_ERRORS
+
+# Seconds over which the rate recovers to the limit after being throttled
+RECOVERY_SECONDS = 60.0
+
+# Lowest fraction of the limit to which throttling reduces the rate
+MIN_RATE_FRACTION = 0.05
+
+# Minimum seconds between rate reductions, so a burst of throttled calls only counts once
+DECREASE_INTERVAL = 1.0
+
+
+def rate_limit_argument_spec():
+    return dict(
+        rate_limit = dict(required=False, type='float', default=0),
+        rate_limit_burst = dict(required=False, type='int', default=None),
+        rate_limit_path = dict(required=False, type='path', default='~/.ansible/tmp/rds_cluster_rate_limit'),
+    )
+
+
+class RateLimiter(object):
+    """Token bucket kept in a file shared between processes"""
+
+    def __init__(self, path, key, rate, burst=None):
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+        self.path = os.path.join(os.path.expanduser(path), 'bucket-%s.json' % digest)
+        self.limit = float(rate)
+        self.burst = float(burst or max(1, rate))
+
+    def rate(self, state, now):
+        """Return the current rate, recovering linearly from the last throttle"""
+        throttled_rate = state.get('throttled_rate')
+        if throttled_rate is None:
+            return self.limit
+        recovered = (self.limit - throttled_rate) * (now - state['throttled_at']) / RECOVERY_SECONDS
+        return min(self.limit, throttled_rate + recovered)
+
+    def update(self, change):
+        """Apply change(state, now) to the shared state under the lock"""
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, 'r+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                try:
+                    state = json.loads(f.read() or '{}')
+                except ValueError:
+                    state = dict()
+                now = time.time()
+                if 'tokens' not in state:
+                    state.update(tokens=self.burst, updated=now)
+
+                rate = self.rate(state, now)
+                state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated']) * rate)
+                state['updated'] = now
+                result = change(state, now, rate)
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return result
+
+    def acquire(self, **kwargs):
+        """Take a token, sleeping until it is available
+
+        Tokens are reserved in order, so the bucket may go negative while
+        processes wait their turn.
+        """
+        def take(state, now, rate):
+            state['tokens'] -= 1
+            return max(0.0, -state['tokens'] / rate)
+
+        wait = self.update(take)
+        if wait > 0:
+            rate_limit_waited(wait)
+            time.sleep(wait)
+
+    def throttled(self, **kwargs):
+        """Halve the rate after a throttling response"""
+        def decrease(state, now, rate):
+            if now - state.get('throttled_at', 0) < DECREASE_INTERVAL:
+                return
+            state['throttled_rate'] = max(rate / 2, self.limit * MIN_RATE_FRACTION)
+            state['throttled_at'] = now
+            state['tokens'] = min(state['tokens'], 0)
+
+        self.update(decrease)
+
+    # botocore event handler
+
+    def needs_retry(self, response=None, **kwargs):
+        if response is not None and response[1].get('Error', {}).get('Code') in THROTTLING_ERRORS:
+            self.throttled()
+        return None
+
+
+def rate_limit(client, params, region, endpoint, aws_connect_kwargs):
+    """Limit the rate of requests made with client, as configured by the rate_limit options
+
+    Each attempt, including retries, takes a token. Clients which send their
+    calls through the broker take one token per call or paginated listing.
+    """
+    key = dict(
+        region=region,
+        endpoint=endpoint,
+        profile=aws_connect_kwargs.get('profile_name'),
+        access_key=aws_connect_kwargs.get('aws_access_key_id'),
+    )
+    limiter = RateLimiter(params['rate_limit_path'], key, params['rate_limit'], params['rate_limit_burst'])
+
+    events = getattr(getattr(client, 'meta', None), 'events', None)
+    if events is not None:
+        events.register('before-send.rds', limiter.acquire)
+        events.register('needs-retry.rds', limiter.needs_retry)
+    else:
+        client.limiter = limiter
+    return limiter
@@ -0,0 +1,395 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Listing, caching and selection of RDS cluster snapshots, shared by the rds_cluster_snapshot* modules"""
+
+import datetime
+import errno
+import fcntl
+import hashlib
+import heapq
+import json
+import os
+import re
+import tempfile
+import time
+from collections import defaultdict
+
+try:
+    import botocore.utils
+    import dateutil.tz
+except ImportError:
+    pass  # caught by the HAS_BOTO3 check in each module
+
+# Snapshot attribute by which each sort option orders the results
+SORT_KEYS = {
+    'id': 'DBClusterSnapshotIdentifier',
+    'snapshot_create_time': 'SnapshotCreateTime',
+    'cluster_create_time': 'ClusterCreateTime',
+}
+
+# Snapshot attribute by which each group_by option groups the results
+GROUP_KEYS = {
+    'cluster_id': 'DBClusterIdentifier',
+}
+
+# Snapshot attribute returned for each result field
+SNAPSHOT_FIELDS = {
+    'availability_zones': 'AvailabilityZones',
+    'snapshot_id': 'DBClusterSnapshotIdentifier',
+    'cluster_id': 'DBClusterIdentifier',
+    'snapshot_create_time': 'SnapshotCreateTime',
+    'engine': 'Engine',
+    'allocated_storage': 'AllocatedStorage',
+    'status': 'Status',
+    'port': 'Port',
+    'vpc_id': 'VpcId',
+    'cluster_create_time': 'ClusterCreateTime',
+    'master_username': 'MasterUsername',
+    'engine_version': 'EngineVersion',
+    'license_model': 'LicenseModel',
+    'snapshot_type': 'SnapshotType',
+    'percent_progress': 'PercentProgress',
+    'storage_encrypted': 'StorageEncrypted',
+    'db_cluster_snapshot_arn': 'DBClusterSnapshotArn',
+    'iam_database_authentication_enabled': 'IAMDatabaseAuthenticationEnabled',
+    'kms_key_id': 'KmsKeyId',
+    'source_db_cluster_snapshot_arn': 'SourceDBClusterSnapshotArn',
+}
+
+# Fields only returned for the snapshots which have them
+OPTIONAL_FIELDS = ['kms_key_id', 'source_db_cluster_snapshot_arn']
+
+# Snapshot statuses after which a cached snapshot no longer needs re-checking
+FINAL_STATUSES = ['available', 'failed', 'deleted']
+
+# Cached snapshot attributes holding timestamps
+TIMESTAMP_KEYS = ['SnapshotCreateTime', 'ClusterCreateTime']
+
+# Maximum age of a cache before a full listing is made instead of an incremental refresh
+FULL_REFRESH_INTERVAL = 86400
+
+# Margin applied to the high-water mark to allow for clock skew between snapshot and event times
+REFRESH_SKEW = 300
+
+
+def describe_snapshots(client, page_size=None, **api_args):
+    """Yield every snapshot, following the Marker across all result pages"""
+    pagination_config = dict()
+    if page_size:
+        pagination_config['PageSize'] = page_size
+
+    paginator = client.get_paginator('describe_db_cluster_snapshots')
+    for page in paginator.paginate(PaginationConfig=pagination_config, **api_args):
+        for snapshot in page.get('DBClusterSnapshots', []):
+            yield snapshot
+
+
+def describe_snapshots_by_id(client, snapshot_ids, page_size=None):
+    """Yield the named snapshots, in batches of identifiers per request"""
+    snapshot_ids = list(snapshot_ids)
+    for i in range(0, len(snapshot_ids), 50):
+        filters = [{'Name': 'db-cluster-snapshot-id', 'Values': snapshot_ids[i:i + 50]}]
+        for snapshot in describe_snapshots(client, page_size=page_size, Filters=filters):
+            yield snapshot
+
+
+def snapshot_events(client, start_time):
+    """Yield identifiers of snapshots with events since start_time"""
+    paginator = client.get_paginator('describe_events')
+    for page in paginator.paginate(SourceType='db-cluster-snapshot', StartTime=start_time):
+        for event in page.get('Events', []):
+            yield event['SourceIdentifier']
+
+
+class SnapshotCatalog(object):
+    """Controller-side cache of the automated and manual snapshots in an account and region
+
+    The cache file is held under an exclusive lock while it is checked and
+    refreshed, so parallel forks wait for one another and then share the result.
+    """
+
+    def __init__(self, path, key, ttl):
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+        self.path = os.path.join(os.path.expanduser(path), 'snapshots-%s.json' % digest)
+        self.ttl = ttl
+        self.refreshed = 0
+        self.full_refreshed = 0
+        self.snapshots = dict()
+
+    def snapshot_list(self, client, page_size=None):
+        """Return the cached snapshots, refreshing them first if the TTL has expired"""
+        lock_dir = os.path.dirname(self.path)
+        try:
+            os.makedirs(lock_dir, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        with open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.load()
+                now = time.time()
+                if now - self.full_refreshed >= FULL_REFRESH_INTERVAL:
+                    self.full_refresh(client, page_size)
+                elif now - self.refreshed >= self.ttl:
+                    self.incremental_refresh(client, page_size)
+                else:
+                    return list(self.snapshots.values())
+                self.refreshed = now
+                self.save()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        return list(self.snapshots.values())
+
+    def full_refresh(self, client, page_size=None):
+        self.snapshots = dict((s['DBClusterSnapshotIdentifier'], s) for s in describe_snapshots(client, page_size=page_size))
+        self.full_refreshed = time.time()
+
+    def incremental_refresh(self, client, page_size=None):
+        if self.snapshots:
+            high_water_mark = max(s['SnapshotCreateTime'] for s in self.snapshots.values())
+        else:
+            high_water_mark = datetime.datetime.fromtimestamp(self.full_refreshed, dateutil.tz.tzutc())
+        start_time = high_water_mark - datetime.timedelta(seconds=REFRESH_SKEW)
+
+        check_ids = set(snapshot_events(client, start_time))
+        check_ids.update(i for i, s in self.snapshots.items() if s['Status'] not in FINAL_STATUSES)
+        if not check_ids:
+            return
+
+        # Snapshots which are no longer returned have been deleted
+        for snapshot_id in check_ids:
+            self.snapshots.pop(snapshot_id, None)
+        for snapshot in describe_snapshots_by_id(client, sorted(check_ids), page_size=page_size):
+            if snapshot['SnapshotType'] in ('automated', 'manual'):
+                self.snapshots[snapshot['DBClusterSnapshotIdentifier']] = snapshot
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            return
+
+        for snapshot in cache['snapshots']:
+            for key in TIMESTAMP_KEYS:
+                if snapshot.get(key):
+                    snapshot[key] = botocore.utils.parse_timestamp(snapshot[key])
+
+        self.refreshed = cache['refreshed']
+        self.full_refreshed = cache['full_refreshed']
+        self.snapshots = dict((s['DBClusterSnapshotIdentifier'], s) for s in cache['snapshots'])
+
+    def save(self):
+        cache = dict(
+            refreshed=self.refreshed,
+            full_refreshed=self.full_refreshed,
+            snapshots=list(self.snapshots.values()),
+        )
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f, default=lambda o: o.isoformat())
+        os.rename(tmp_path, self.path)
+
+
+def snapshot_data(snapshot, region=None, fields=None):
+    """Build the result for a snapshot, with only the requested fields"""
+    data = dict()
+    for field in fields or ['region'] + sorted(SNAPSHOT_FIELDS):
+        if field == 'region':
+            data['region'] = region
+            continue
+        value = snapshot.get(SNAPSHOT_FIELDS[field])
+        if value is None and field in OPTIONAL_FIELDS:
+            continue
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        data[field] = value
+    return data
+
+
+def literal_prefix(pattern):
+    """Return the literal text any ID matched by the pattern must start with
+
+    Patterns are always matched from the start of the ID. The second value
+    returned is True when the pattern matches nothing but that literal text.
+    """
+    if '|' in pattern:
+        return '', False
+
+    prefix = []
+    i = 1 if pattern.startswith('^') else 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\' and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            literal = pattern[i + 1]
+            i += 2
+        elif char in '.^$*+?{}[]()\\':
+            break
+        else:
+            literal = char
+            i += 1
+
+        if i < len(pattern) and pattern[i] in '*?{':
+            # The preceding character is optional or repeated
+            return ''.join(prefix), False
+        prefix.append(literal)
+
+    exact = pattern[i:] in ('$', '\\Z')
+    return ''.join(prefix), exact
+
+
+def snapshot_query(snapshot_id=None, cluster_id=None, engine=None, id_regex=None, snapshot_type=None):
+    """Translate as many of the search criteria as possible into API arguments
+
+    Returns the arguments for describe_db_cluster_snapshots along with the
+    names of the criteria they fully apply.
+    """
+    api_args = dict()
+    filters = []
+    pushed_down = []
+
+    if snapshot_id:
+        api_args['DBClusterSnapshotIdentifier'] = snapshot_id
+        pushed_down.append('snapshot_id')
+    if cluster_id:
+        api_args['DBClusterIdentifier'] = cluster_id
+        pushed_down.append('cluster_id')
+    if snapshot_type:
+        api_args['SnapshotType'] = snapshot_type
+        pushed_down.append('snapshot_type')
+    if engine:
+        filters.append({'Name': 'engine', 'Values': [engine]})
+        pushed_down.append('engine')
+
+    if id_regex:
+        prefix, exact = literal_prefix(id_regex)
+        if exact and prefix:
+            filters.append({'Name': 'db-cluster-snapshot-id', 'Values': [prefix]})
+            pushed_down.append('id_regex')
+        elif prefix.startswith('rds:') and not snapshot_type:
+            # Only automated snapshots have IDs beginning with "rds:"
+            filters.append({'Name': 'snapshot-type', 'Values': ['automated']})
+
+    if filters:
+        api_args['Filters'] = filters
+
+    return api_args, pushed_down
+
+
+def matching_snapshots(snapshots, snapshot_id=None, cluster_id=None, engine=None, id_regex=None, snapshot_type=None, status=None, region=None):
+    """Filter snapshots one at a time as they are received, yielding (region, snapshot) tuples"""
+    regex = re.compile(id_regex) if id_regex else None
+    prefix = literal_prefix(id_regex)[0] if id_regex else ''
+
+    for snapshot in snapshots:
+        if snapshot_id and snapshot_id not in (snapshot['DBClusterSnapshotIdentifier'], snapshot['DBClusterSnapshotArn']):
+            continue
+        if cluster_id and snapshot['DBClusterIdentifier'] != cluster_id:
+            continue
+        if engine and snapshot['Engine'] != engine:
+            continue
+        if regex and not (snapshot['DBClusterSnapshotIdentifier'].startswith(prefix) and regex.match(snapshot['DBClusterSnapshotIdentifier'])):
+            continue
+        if snapshot_type and snapshot['SnapshotType'] != snapshot_type:
+            continue
+        if status and snapshot['Status'] != status:
+            continue
+
+        yield region, snapshot
+
+
+def select_snapshots(snapshots, sort=None, sort_order=None, sort_start=None, sort_end=None):
+    """Sort and slice (region, snapshot) tuples, keeping only as many in memory as the slice needs"""
+    if not sort:
+        return list(snapshots)
+
+    attribute = SORT_KEYS[sort]
+
+    def key(match):
+        return match[1][attribute]
+
+    descending = sort_order == 'descending'
+
+    if sort_end is not None and sort_end >= 0 and (sort_start is None or sort_start >= 0):
+        # Bounded top-k selection, equivalent to sorted(...)[:sort_end]
+        if sort_end == 0:
+            return []
+        if descending:
+            results = heapq.nlargest(sort_end, snapshots, key=key)
+        else:
+            results = heapq.nsmallest(sort_end, snapshots, key=key)
+        return results[sort_start:]
+
+    results = sorted(snapshots, key=key, reverse=descending)
+    return results[sort_start:sort_end]
+
+
+def group_snapshots(snapshots, group_by, sort=None, sort_order=None, sort_end=None):
+    """Split (region, snapshot) tuples into a dict of lists by the group_by attribute
+
+    When sorting with a sort_end, each group is trimmed to its top sort_end
+    snapshots whenever it grows past twice that, so memory is bounded by
+    the number of groups rather than the number of snapshots.
+    """
+    attribute = GROUP_KEYS[group_by]
+    bounded = sort and sort_end is not None and sort_end >= 0
+    groups = defaultdict(list)
+
+    for match in snapshots:
+        group = groups[match[1][attribute]]
+        group.append(match)
+        if bounded and len(group) > 2 * sort_end:
+            group[:] = select_snapshots(group, sort=sort, sort_order=sort_order, sort_end=sort_end)
+
+    return dict(groups)
+
+
+def search_region(client, region, catalog=None, max_records=None, status=None, sort=None, sort_order=None, sort_end=None, count_only=False, group_by=None, **criteria):
+    """Search the snapshots of one region
+
+    Returns the matching snapshots (only the first sort_end of them when
+    sorting, or just their number with count_only and no sort), the API
+    arguments used and the criteria they applied. With group_by, the
+    matching snapshots or their number are returned for each group.
+    """
+    if catalog is not None and criteria['snapshot_type'] not in ('shared', 'public'):
+        api_args, pushed_down = dict(), []
+        snapshots = catalog.snapshot_list(client, page_size=max_records)
+    else:
+        api_args, pushed_down = snapshot_query(**criteria)
+        snapshots = describe_snapshots(client, page_size=max_records, **api_args)
+
+    # Only filter locally on what could not be applied by AWS
+    for name in pushed_down:
+        criteria[name] = None
+    matches = matching_snapshots(snapshots, status=status, region=region, **criteria)
+    if count_only and not sort:
+        if group_by:
+            counts = defaultdict(int)
+            for match in matches:
+                counts[match[1][GROUP_KEYS[group_by]]] += 1
+            return dict(counts), api_args, pushed_down
+        return sum(1 for match in matches), api_args, pushed_down
+
+    # Only the first sort_end snapshots of a region can be among the first sort_end overall
+    if sort_end is not None and sort_end < 0:
+        sort_end = None
+    if group_by:
+        return group_snapshots(matches, group_by, sort=sort, sort_order=sort_order, sort_end=sort_end), api_args, pushed_down
+    return select_snapshots(matches, sort=sort, sort_order=sort_order, sort_end=sort_end), api_args, pushed_down
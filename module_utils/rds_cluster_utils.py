@@ -0,0 +1,391 @@
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Helpers shared by the rds_cluster* modules"""
+
+import datetime
+import random
+import time
+
+try:
+    import botocore.exceptions
+    import dateutil.tz
+except ImportError:
+    pass  # caught by the HAS_BOTO3 check in each module
+
+# Error codes returned by AWS when requests are being rate limited
+THROTTLING_ERRORS = ('Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'TooManyRequestsException')
+
+# Event source types for the resources which can be waited for
+EVENT_SOURCE_TYPES = dict(cluster='db-cluster', instance='db-instance')
+
+# Number of event checks without relevant events after which a full status check is made anyway
+FULL_CHECK_INTERVAL = 10
+
+# Number of resources of a type up to which events are requested for each resource, rather than for all of the type
+EVENT_SOURCE_LIMIT = 5
+
+
+class RDSClusterError(Exception):
+    """Failure to be reported with module.fail_json()
+
+    Any keyword arguments are kept in `details`, to be included in the result.
+    """
+
+    def __init__(self, msg, **details):
+        super(RDSClusterError, self).__init__(msg)
+        self.details = details
+
+
+def reconcile_tags(client, resource_arn, current_tags, desired_tags, purge_tags=True):
+    """Update the tags on a resource to match desired_tags, making no calls when they already match
+
+    current_tags is the resource's TagList. Tags not in desired_tags are only
+    removed when purge_tags is set. Returns a dict of the added, changed and
+    removed tag keys.
+    """
+    current = dict((t['Key'], t['Value']) for t in current_tags)
+    desired = dict((k, '%s' % v) for k, v in desired_tags.items())
+
+    diff = dict(
+        added=sorted(k for k in desired if k not in current),
+        changed=sorted(k for k in desired if k in current and current[k] != desired[k]),
+        removed=sorted(k for k in current if k not in desired) if purge_tags else [],
+    )
+
+    if diff['removed']:
+        client.remove_tags_from_resource(ResourceName=resource_arn, TagKeys=diff['removed'])
+    if diff['added'] or diff['changed']:
+        tags = [dict(Key=k, Value=desired[k]) for k in diff['added'] + diff['changed']]
+        client.add_tags_to_resource(ResourceName=resource_arn, Tags=tags)
+
+    return diff
+
+
+def resource_tags(client, resource):
+    """Return the TagList of a described resource, only looking it up when not already included"""
+    if 'TagList' in resource:
+        return resource['TagList']
+    arn = resource.get('DBInstanceArn') or resource.get('DBClusterArn')
+    return client.list_tags_for_resource(ResourceName=arn).get('TagList', [])
+
+
+def waiter_argument_spec():
+    return dict(
+        wait_delay = dict(required=False, type='int', default=5),
+        wait_max_delay = dict(required=False, type='int', default=60),
+        wait_backoff = dict(required=False, type='float', default=1.5),
+        wait_jitter = dict(required=False, type='float', default=0.2),
+        wait_method = dict(required=False, default='poll', choices=['poll', 'events']),
+    )
+
+
+def waiter_options(params):
+    """Return the wait_for_resources keyword arguments configured by the waiter module options"""
+    return dict(
+        delay=params['wait_delay'],
+        max_delay=params['wait_max_delay'],
+        backoff=params['wait_backoff'],
+        jitter=params['wait_jitter'],
+        events=params['wait_method'] == 'events',
+    )
+
+
+def is_throttling_error(e):
+    return isinstance(e, botocore.exceptions.ClientError) and e.response['Error']['Code'] in THROTTLING_ERRORS
+
+
+def call_with_backoff(call, attempts=5, delay=1, max_delay=30, jitter=0.2):
+    """Return call(), retrying it when throttled
+
+    The wait before each retry starts at `delay` seconds and doubles up to
+    `max_delay`, randomised by +/- `jitter`. Other errors, and the throttling
+    error of the last attempt, are raised.
+    """
+    for attempt in range(attempts):
+        try:
+            return call()
+        except botocore.exceptions.ClientError as e:
+            if not is_throttling_error(e) or attempt == attempts - 1:
+                raise
+        time.sleep(min(delay * 2 ** attempt, max_delay) * random.uniform(1 - jitter, 1 + jitter))
+
+
+class WaitTimeout(Exception):
+    """Raised when a resource has not become ready before the deadline
+
+    The last state returned by the check function is available as `last`.
+    """
+
+    def __init__(self, msg, last=None):
+        super(WaitTimeout, self).__init__(msg)
+        self.last = last
+
+
+def wait_for(check, timeout, delay=5, max_delay=60, backoff=1.5, jitter=0.2, retry_errors=()):
+    """Call check() until it reports the resource is ready, or the timeout expires
+
+    check() must return a tuple of (ready, state), and the state is returned
+    once ready. The interval between calls starts at `delay` seconds and grows
+    by a factor of `backoff` up to `max_delay`, each randomised by +/- `jitter`
+    so that many waiters do not poll in lockstep. A throttling error doubles
+    the next interval, up to twice `max_delay`. ClientErrors with a code in
+    `retry_errors` are treated as not ready, any others are raised. A final
+    check is always made at the deadline.
+    """
+    deadline = time.time() + timeout
+    last = None
+
+    while True:
+        try:
+            ready, last = check()
+            if ready:
+                return last
+        except botocore.exceptions.ClientError as e:
+            if is_throttling_error(e):
+                delay = min(delay * 2, max_delay * 2)
+            elif e.response['Error']['Code'] not in retry_errors:
+                raise
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise WaitTimeout('Timed out after %d seconds' % timeout, last)
+
+        interval = delay * random.uniform(1 - jitter, 1 + jitter)
+        time.sleep(min(interval, remaining))
+        delay = min(delay * backoff, max_delay)
+
+
+def describe_instances(client, filters):
+    """Yield the instances matching the filters, across all result pages"""
+    paginator = client.get_paginator('describe_db_instances')
+    for page in paginator.paginate(Filters=filters):
+        for instance in page.get('DBInstances', []):
+            yield instance
+
+
+def poll_instances(client, instances):
+    """Describe a set of instances with one describe_db_instances call per cluster
+
+    instances is a dict of instance ID to cluster ID. Instances without a known
+    cluster ID are described together with a single db-instance-id filter.
+    Returns a dict of instance ID to description for the instances found.
+    """
+    by_cluster = dict()
+    for instance_id, cluster_id in instances.items():
+        by_cluster.setdefault(cluster_id, set()).add(instance_id)
+
+    found = dict()
+    for cluster_id, instance_ids in sorted(by_cluster.items(), key=lambda c: c[0] or ''):
+        if cluster_id:
+            filters = [{'Name': 'db-cluster-id', 'Values': [cluster_id]}]
+        else:
+            filters = [{'Name': 'db-instance-id', 'Values': sorted(instance_ids)}]
+
+        for instance in describe_instances(client, filters):
+            if instance['DBInstanceIdentifier'] in instance_ids:
+                found[instance['DBInstanceIdentifier']] = instance
+
+    return found
+
+
+def describe_clusters(client, filters):
+    """Yield the clusters matching the filters, across all result pages"""
+    paginator = client.get_paginator('describe_db_clusters')
+    for page in paginator.paginate(Filters=filters):
+        for cluster in page.get('DBClusters', []):
+            yield cluster
+
+
+def poll_clusters(client, cluster_ids):
+    """Describe a set of clusters with a single describe_db_clusters call
+
+    Returns a dict of cluster ID to description for the clusters found.
+    """
+    filters = [{'Name': 'db-cluster-id', 'Values': sorted(cluster_ids)}]
+    return dict((c['DBClusterIdentifier'], c) for c in describe_clusters(client, filters))
+
+
+def wait_token(resource, resource_id, region, cluster_id=None, status='available'):
+    """Describe a resource to wait for later with the rds_cluster_wait module"""
+    token = dict(type=resource, id=resource_id, region=region, status=status)
+    if cluster_id is not None:
+        token['cluster_id'] = cluster_id
+    return token
+
+
+class EventWatcher(object):
+    """Follow the RDS event stream for a set of source types
+
+    Each call to poll() returns only the events which have occurred since the
+    previous call, using describe_events with a StartTime cursor that moves
+    forward to the newest event seen. The events of up to EVENT_SOURCE_LIMIT
+    resources are requested for each resource, and those of more for all of
+    the resources of the type.
+    """
+
+    def __init__(self, client, start_time=None):
+        self.client = client
+        self.start_time = start_time or datetime.datetime.now(dateutil.tz.tzutc())
+        self.cursors = dict()
+        self.seen = set()
+
+    def poll(self, source_type, source_ids=None):
+        if source_ids is not None and len(source_ids) <= EVENT_SOURCE_LIMIT:
+            events = []
+            for source_id in sorted(source_ids):
+                events.extend(self.fetch(source_type, source_id))
+            return events
+        return self.fetch(source_type)
+
+    def fetch(self, source_type, source_id=None):
+        cursor = self.cursors.get((source_type, source_id), self.start_time)
+        api_args = dict(SourceType=source_type, StartTime=cursor)
+        if source_id is not None:
+            api_args['SourceIdentifier'] = source_id
+        paginator = self.client.get_paginator('describe_events')
+
+        events = []
+        for page in paginator.paginate(**api_args):
+            for event in page.get('Events', []):
+                # The cursor is inclusive, so events at its exact time are returned again
+                key = (event['SourceIdentifier'], event['Date'], event['Message'])
+                if key in self.seen:
+                    continue
+                self.seen.add(key)
+                events.append(event)
+                cursor = max(cursor, event['Date'])
+
+        self.cursors[(source_type, source_id)] = cursor
+        return events
+
+
+def wait_for_resources(client, timeout, clusters=None, instances=None, events=False, **options):
+    """Wait for clusters and instances to reach their target statuses together
+
+    clusters is a dict of cluster ID to target status, and instances a dict of
+    instance ID to a tuple of (cluster ID, target status). A target status of
+    'deleted' is reached once the resource no longer exists. Each poll makes
+    one describe_db_clusters call for all of the clusters, and one
+    describe_db_instances call per cluster for the instances.
+
+    With events set, after the first full status check the RDS event stream is
+    followed instead, and statuses are only checked again once an event occurs
+    for one of the resources (or after FULL_CHECK_INTERVAL quiet checks). An
+    event in the failure category raises RDSClusterError straight away.
+
+    Returns a dict of ('cluster' or 'instance', ID) to the time at which the
+    resource reached its target status. On timeout, the WaitTimeout holds the
+    last description of each resource still pending, keyed the same way.
+    """
+    pending = dict()
+    for cluster_id, status in (clusters or {}).items():
+        pending[('cluster', cluster_id)] = (None, status)
+    for instance_id, (cluster_id, status) in (instances or {}).items():
+        pending[('instance', instance_id)] = (cluster_id, status)
+
+    described = dict()
+    reached_at = dict()
+    watcher = EventWatcher(client) if events else None
+    quiet_checks = [None]
+
+    def new_events():
+        """Return whether any events have occurred for the pending resources since the last check"""
+        found = False
+        for resource, source_type in sorted(EVENT_SOURCE_TYPES.items()):
+            ids = set(i for (t, i) in pending if t == resource)
+            if not ids:
+                continue
+            for event in watcher.poll(source_type, ids):
+                if event['SourceIdentifier'] not in ids:
+                    continue
+                if 'failure' in event.get('EventCategories', []):
+                    raise RDSClusterError('DB %s %s failed: %s' % (resource, event['SourceIdentifier'], event['Message']), event=event)
+                found = True
+        return found
+
+    def check():
+        if watcher is not None:
+            if quiet_checks[0] is not None and not new_events() and quiet_checks[0] < FULL_CHECK_INTERVAL:
+                quiet_checks[0] += 1
+                return False, described
+            quiet_checks[0] = 0
+
+        cluster_ids = [i for (t, i) in pending if t == 'cluster']
+        instance_ids = dict((i, c) for (t, i), (c, s) in pending.items() if t == 'instance')
+
+        found = dict()
+        if cluster_ids:
+            found.update((('cluster', i), c) for i, c in poll_clusters(client, cluster_ids).items())
+        if instance_ids:
+            found.update((('instance', i), d) for i, d in poll_instances(client, instance_ids).items())
+
+        for key, (cluster_id, status) in list(pending.items()):
+            resource = found.get(key)
+            if resource is None:
+                reached = status == 'deleted'
+            else:
+                described[key] = resource
+                current = resource['Status'] if key[0] == 'cluster' else resource['DBInstanceStatus']
+                reached = current.lower() == status.lower()
+            if reached:
+                del pending[key]
+                reached_at[key] = time.time()
+
+        return not pending, described
+
+    try:
+        wait_for(check, timeout, **options)
+    except WaitTimeout as e:
+        e.last = dict((key, described.get(key)) for key in pending)
+        raise
+    return reached_at
+
+
+def wait_for_instances(client, instances, timeout, **options):
+    """Wait for all of the instances to become available
+
+    instances is a dict of instance ID to cluster ID, as for poll_instances().
+    Returns the time at which each instance was seen to be available. On
+    timeout, the WaitTimeout holds the last description of each instance
+    still pending.
+    """
+    targets = dict((i, (c, 'available')) for i, c in instances.items())
+    try:
+        reached_at = wait_for_resources(client, timeout, instances=targets, **options)
+    except WaitTimeout as e:
+        e.last = dict((i, d) for (t, i), d in e.last.items())
+        raise
+    return dict((i, t) for (r, i), t in reached_at.items())
+
+
+def wait_for_modified_instances(client, instances, timeout, **options):
+    """Wait for modified instances to be available with no modifications pending
+
+    A modified instance can still report itself as available before its
+    modification starts, so the instances are only ready once nothing is
+    pending either. instances is a dict of instance ID to cluster ID, as for
+    poll_instances(). On timeout, the WaitTimeout holds the last description
+    of every instance.
+    """
+    def check():
+        found = poll_instances(client, instances)
+        ready = all(
+            i in found and found[i]['DBInstanceStatus'] == 'available' and not found[i].get('PendingModifiedValues')
+            for i in instances
+        )
+        return ready, found
+
+    return wait_for(check, timeout, **options)
@@ -0,0 +1,195 @@
+"""Offline fixtures for running the rds_cluster* modules against a stubbed RDS client
+
+Each module is run through its main() with a botocore Stubber in place of the
+RDS client, so every test declares the exact RDS API calls it expects, in
+order, and any other call fails the test. The calls made are also recorded
+so that tests can assert read budgets and the absence of write calls.
+"""
+
+import importlib
+import json
+import os
+import sys
+
+import pytest
+
+try:
+    import boto3
+    from botocore import xform_name
+    from botocore.stub import Stubber
+    HAS_BOTO3 = True
+except ImportError:
+    HAS_BOTO3 = False
+
+try:
+    import ansible.module_utils
+    import ansible.module_utils.ec2
+    from ansible.module_utils import basic
+    from ansible.module_utils._text import to_bytes
+    HAS_ANSIBLE = True
+except ImportError:
+    HAS_ANSIBLE = False
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Make the modules and their shared code importable as they are under Ansible
+sys.path.insert(0, os.path.join(ROOT, 'library'))
+if HAS_ANSIBLE:
+    ansible.module_utils.__path__.append(os.path.join(ROOT, 'module_utils'))
+
+# Prefixes of the RDS operations which change something
+WRITE_PREFIXES = (
+    'add_', 'apply_', 'copy_', 'create_', 'delete_', 'failover_', 'modify_', 'promote_',
+    'reboot_', 'remove_', 'reset_', 'restore_', 'start_', 'stop_',
+)
+
+REGION = 'us-east-1'
+ACCOUNT = '123456789012'
+
+
+def pytest_collection_modifyitems(items):
+    if not (HAS_ANSIBLE and HAS_BOTO3):
+        skip = pytest.mark.skip(reason='ansible and boto3 required for these tests')
+        for item in items:
+            item.add_marker(skip)
+
+
+def is_write(operation):
+    return operation.startswith(WRITE_PREFIXES)
+
+
+class StubbedRDS(object):
+    """An RDS client with a Stubber, recording the name of each operation called
+
+    Clients for other regions are created with region(), and are given to
+    modules which ask for a client in that region.
+    """
+
+    def __init__(self, region=REGION):
+        self.client = boto3.client('rds', region_name=region, aws_access_key_id='testing', aws_secret_access_key='testing')
+        self.stubber = Stubber(self.client)
+        self.calls = []
+        self.client.meta.events.register('before-parameter-build.rds', self.record)
+        self.regions = {region: self}
+
+    def region(self, region):
+        if region not in self.regions:
+            self.regions[region] = StubbedRDS(region)
+            self.regions[region].stubber.activate()
+        return self.regions[region]
+
+    def record(self, model, **kwargs):
+        self.calls.append(xform_name(model.name))
+
+    def expect(self, operation, response=None, params=None):
+        self.stubber.add_response(operation, response or {}, params)
+
+    def expect_error(self, operation, code, status=400):
+        self.stubber.add_client_error(operation, service_error_code=code, http_status_code=status)
+
+    def writes(self):
+        return [c for c in self.calls if is_write(c)]
+
+    def reads(self):
+        return [c for c in self.calls if not is_write(c)]
+
+    def assert_budget(self, reads, writes=0):
+        """Assert no more than `reads` read calls and `writes` write calls were made"""
+        assert len(self.reads()) <= reads, 'read budget of %d exceeded: %s' % (reads, self.reads())
+        assert len(self.writes()) <= writes, 'write budget of %d exceeded: %s' % (writes, self.writes())
+
+
+class ModuleExit(Exception):
+    def __init__(self, result):
+        super(ModuleExit, self).__init__(result)
+        self.result = result
+
+
+def exit_json(self, **kwargs):
+    kwargs.setdefault('changed', False)
+    raise ModuleExit(kwargs)
+
+
+def fail_json(self, **kwargs):
+    kwargs['failed'] = True
+    raise ModuleExit(kwargs)
+
+
+@pytest.fixture
+def rds():
+    stubbed = StubbedRDS()
+    stubbed.stubber.activate()
+    yield stubbed
+    stubbed.stubber.deactivate()
+
+
+@pytest.fixture
+def run_module(monkeypatch, rds):
+    """Run a module with the given arguments, returning its result
+
+    All of the expected API calls must have been made by the time it exits.
+    """
+    monkeypatch.setattr(basic.AnsibleModule, 'exit_json', exit_json)
+    monkeypatch.setattr(basic.AnsibleModule, 'fail_json', fail_json)
+
+    def run(name, **args):
+        module = importlib.import_module(name)
+        monkeypatch.setattr(module, 'rds_client', lambda module, region, *a, **kw: rds.region(region).client)
+
+        args.setdefault('region', REGION)
+        args.setdefault('aws_access_key', 'testing')
+        args.setdefault('aws_secret_key', 'testing')
+        monkeypatch.setattr(basic, '_ANSIBLE_ARGS', to_bytes(json.dumps({'ANSIBLE_MODULE_ARGS': args})))
+
+        with pytest.raises(ModuleExit) as e:
+            module.main()
+        for stubbed in rds.regions.values():
+            stubbed.stubber.assert_no_pending_responses()
+        return e.value.result
+
+    return run
+
+
+def arn(resource, resource_id):
+    return 'arn:aws:rds:%s:%s:%s:%s' % (REGION, ACCOUNT, resource, resource_id)
+
+
+def tag_list(tags):
+    return [dict(Key=k, Value=v) for k, v in sorted(tags.items())]
+
+
+def cluster_description(cluster_id, tags=None, **overrides):
+    cluster = dict(
+        DBClusterIdentifier=cluster_id,
+        DBClusterArn=arn('cluster', cluster_id),
+        Engine='aurora',
+        EngineVersion='5.6.10a',
+        Port=3306,
+        Status='available',
+        DBSubnetGroup='my-subnet-group',
+        VpcSecurityGroups=[dict(VpcSecurityGroupId='sg-1', Status='active')],
+        TagList=tag_list(tags or {}),
+    )
+    cluster.update(overrides)
+    return cluster
+
+
+def instance_description(instance_id, cluster_id, tags=None, **overrides):
+    instance = dict(
+        DBInstanceIdentifier=instance_id,
+        DBInstanceArn=arn('db', instance_id),
+        DBClusterIdentifier=cluster_id,
+        DBInstanceClass='db.r4.large',
+        DBInstanceStatus='available',
+        Engine='aurora',
+        MultiAZ=False,
+        AutoMinorVersionUpgrade=True,
+        PubliclyAccessible=False,
+        CopyTagsToSnapshot=True,
+        MonitoringInterval=0,
+        PerformanceInsightsEnabled=False,
+        DBParameterGroups=[dict(DBParameterGroupName='default.aurora5.6', ParameterApplyStatus='in-sync')],
+        TagList=tag_list(tags or {}),
+    )
+    instance.update(overrides)
+    return instance
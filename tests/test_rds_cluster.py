@@ -0,0 +1,232 @@
+from conftest import cluster_description, instance_description
+
+CLUSTER_ARGS = dict(
+    cluster_id='my-cluster',
+    subnet_group='my-subnet-group',
+    port=3306,
+    vpc_security_group_ids=['sg-1'],
+    tags=dict(env='test'),
+)
+
+
+def test_create(rds, run_module):
+    rds.expect_error('describe_db_clusters', 'DBClusterNotFoundFault', 404)
+    rds.expect('create_db_cluster', dict(DBCluster=cluster_description('my-cluster', Status='creating')))
+
+    result = run_module('rds_cluster', **CLUSTER_ARGS)
+
+    assert result['changed']
+    assert rds.calls == ['describe_db_clusters', 'create_db_cluster']
+
+
+def test_create_and_wait(rds, run_module):
+    rds.expect_error('describe_db_clusters', 'DBClusterNotFoundFault', 404)
+    rds.expect('create_db_cluster', dict(DBCluster=cluster_description('my-cluster', Status='creating')))
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', tags=dict(env='test'))]))
+
+    result = run_module('rds_cluster', wait=True, **CLUSTER_ARGS)
+
+    assert result['changed']
+    assert rds.calls == ['describe_db_clusters', 'create_db_cluster', 'describe_db_clusters']
+
+
+def test_modify(rds, run_module):
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', tags=dict(env='test'), Port=3307)]))
+    rds.expect('modify_db_cluster', dict(DBCluster=cluster_description('my-cluster')), dict(DBClusterIdentifier='my-cluster', Port=3306))
+
+    result = run_module('rds_cluster', **CLUSTER_ARGS)
+
+    assert result['changed']
+    assert rds.calls == ['describe_db_clusters', 'modify_db_cluster']
+
+
+def test_modify_tags(rds, run_module):
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', tags=dict(env='prod', team='db'))]))
+    rds.expect('remove_tags_from_resource', params=dict(ResourceName=cluster_description('my-cluster')['DBClusterArn'], TagKeys=['team']))
+    rds.expect('add_tags_to_resource', params=dict(ResourceName=cluster_description('my-cluster')['DBClusterArn'], Tags=[dict(Key='env', Value='test')]))
+
+    result = run_module('rds_cluster', **CLUSTER_ARGS)
+
+    assert result['changed']
+    assert rds.calls == ['describe_db_clusters', 'remove_tags_from_resource', 'add_tags_to_resource']
+
+
+def test_no_op(rds, run_module):
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', tags=dict(env='test'))]))
+
+    result = run_module('rds_cluster', **CLUSTER_ARGS)
+
+    assert not result['changed']
+    assert rds.calls == ['describe_db_clusters']
+    rds.assert_budget(reads=1)
+
+
+def test_no_op_and_wait(rds, run_module):
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', tags=dict(env='test'))]))
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', tags=dict(env='test'))]))
+
+    result = run_module('rds_cluster', wait=True, **CLUSTER_ARGS)
+
+    assert not result['changed']
+    rds.assert_budget(reads=2)
+
+
+def test_no_op_keeps_unmanaged_tags(rds, run_module):
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', tags=dict(env='test', team='db'))]))
+
+    result = run_module('rds_cluster', purge_tags=False, **CLUSTER_ARGS)
+
+    assert not result['changed']
+    rds.assert_budget(reads=1)
+
+
+def test_restore_with_instances(rds, run_module, monkeypatch):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    rds.expect_error('describe_db_clusters', 'DBClusterNotFoundFault', 404)
+    rds.expect('restore_db_cluster_from_snapshot', dict(DBCluster=cluster_description('my-cluster', Status='creating')))
+    # The instances are created straight away, retrying while the cluster refuses them
+    rds.expect_error('describe_db_instances', 'DBInstanceNotFound', 404)
+    rds.expect('create_db_instance', dict(DBInstance=instance_description('my-cluster-001', 'my-cluster', DBInstanceStatus='creating')),
+               dict(DBInstanceIdentifier='my-cluster-001', DBClusterIdentifier='my-cluster', DBInstanceClass='db.r4.large',
+                    DBSubnetGroupName='my-subnet-group', Engine='aurora', PromotionTier=0, AutoMinorVersionUpgrade=True,
+                    CopyTagsToSnapshot=True, EnablePerformanceInsights=False, MonitoringInterval=0, MultiAZ=False,
+                    PubliclyAccessible=False))
+    rds.expect_error('describe_db_instances', 'DBInstanceNotFound', 404)
+    rds.expect_error('create_db_instance', 'InvalidDBClusterStateFault')
+    rds.expect_error('describe_db_instances', 'DBInstanceNotFound', 404)
+    rds.expect('create_db_instance', dict(DBInstance=instance_description('my-cluster-002', 'my-cluster', DBInstanceStatus='creating')))
+    # The cluster and its instances are waited for together
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster')]))
+    rds.expect('describe_db_instances', dict(DBInstances=[instance_description('my-cluster-%03d' % i, 'my-cluster') for i in (1, 2)]),
+               dict(Filters=[{'Name': 'db-cluster-id', 'Values': ['my-cluster']}]))
+
+    result = run_module('rds_cluster', cluster_id='my-cluster', subnet_group='my-subnet-group', snapshot_arn='my-snapshot',
+                        instances=[dict(instance_id='my-cluster-001', instance_type='db.r4.large', promotion_tier=0),
+                                   dict(instance_id='my-cluster-002', instance_type='db.r4.large')],
+                        concurrency=1, wait=True)
+
+    assert result['changed']
+    assert [(r['instance_id'], r['changed']) for r in result['instances']] == [('my-cluster-001', True), ('my-cluster-002', True)]
+    rds.assert_budget(reads=6, writes=4)
+
+
+def test_equivalent_description_is_not_modified(rds, run_module):
+    cluster = cluster_description('my-cluster', tags=dict(env='test'), AvailabilityZones=['us-east-1c', 'us-east-1a', 'us-east-1b'],
+                                  DBClusterOptionGroupMemberships=[dict(DBClusterOptionGroupName='my-options', Status='in-sync')],
+                                  VpcSecurityGroups=[dict(VpcSecurityGroupId='sg-2', Status='active'), dict(VpcSecurityGroupId='sg-1', Status='active')])
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster]))
+
+    result = run_module('rds_cluster', availability_zones=['us-east-1a', 'us-east-1b'], database_name='app', option_group='my-options',
+                        **dict(CLUSTER_ARGS, vpc_security_group_ids=['sg-1', 'sg-2']))
+
+    assert not result['changed']
+    assert result['diff'] == dict(before={}, after={})
+    assert rds.calls == ['describe_db_clusters']
+
+
+def test_modify_diff(rds, run_module):
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', tags=dict(env='prod'), Port=3307)]))
+    rds.expect('modify_db_cluster', dict(DBCluster=cluster_description('my-cluster')), dict(DBClusterIdentifier='my-cluster', Port=3306))
+    rds.expect('add_tags_to_resource')
+
+    result = run_module('rds_cluster', **CLUSTER_ARGS)
+
+    assert result['diff'] == dict(before=dict(port=3307, tags=dict(env='prod')), after=dict(port=3306, tags=dict(env='test')))
+
+
+def test_delete_with_instances(rds, run_module, monkeypatch):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    members = [dict(DBInstanceIdentifier='my-cluster-%03d' % i, IsClusterWriter=i == 1) for i in (1, 2)]
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', DBClusterMembers=members)]))
+    for i in (1, 2):
+        rds.expect('delete_db_instance', dict(DBInstance=instance_description('my-cluster-%03d' % i, 'my-cluster', DBInstanceStatus='deleting')),
+                   dict(DBInstanceIdentifier='my-cluster-%03d' % i, SkipFinalSnapshot=True))
+    # All of the instances are polled together until they are gone
+    rds.expect('describe_db_instances', dict(DBInstances=[instance_description('my-cluster-002', 'my-cluster', DBInstanceStatus='deleting')]),
+               dict(Filters=[{'Name': 'db-cluster-id', 'Values': ['my-cluster']}]))
+    rds.expect('describe_db_instances', dict(DBInstances=[]))
+    rds.expect('delete_db_cluster', dict(DBCluster=cluster_description('my-cluster', Status='deleting')),
+               dict(DBClusterIdentifier='my-cluster', SkipFinalSnapshot=False, FinalDBSnapshotIdentifier='my-cluster-final'))
+
+    result = run_module('rds_cluster', cluster_id='my-cluster', subnet_group='my-subnet-group', state='absent',
+                        delete_instances=True, final_snapshot_id='my-cluster-final', concurrency=1)
+
+    assert result['changed']
+    assert [(r['instance_id'], r['changed']) for r in result['instances']] == [('my-cluster-001', True), ('my-cluster-002', True)]
+    assert result['wait_token'] == dict(type='cluster', id='my-cluster', region='us-east-1', status='deleted')
+    rds.assert_budget(reads=3, writes=3)
+
+
+def test_delete_with_instances_requires_delete_instances(rds, run_module):
+    members = [dict(DBInstanceIdentifier='my-cluster-001', IsClusterWriter=True)]
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', DBClusterMembers=members)]))
+
+    result = run_module('rds_cluster', cluster_id='my-cluster', subnet_group='my-subnet-group', state='absent', skip_final_snapshot=True)
+
+    assert result['failed']
+    assert result['instances'] == ['my-cluster-001']
+    assert rds.writes() == []
+
+
+def test_clone(rds, run_module):
+    rds.expect_error('describe_db_clusters', 'DBClusterNotFoundFault', 404)
+    rds.expect('restore_db_cluster_to_point_in_time', dict(DBCluster=cluster_description('my-clone', Status='creating')),
+               dict(DBClusterIdentifier='my-clone', SourceDBClusterIdentifier='my-cluster', RestoreType='copy-on-write',
+                    UseLatestRestorableTime=True, DBSubnetGroupName='my-subnet-group', Port=3306))
+
+    result = run_module('rds_cluster', cluster_id='my-clone', source_cluster_id='my-cluster', subnet_group='my-subnet-group', port=3306,
+                        use_latest_restorable_time=True)
+
+    assert result['changed']
+    assert result['wait_token']['id'] == 'my-clone'
+
+
+def test_clone_to_point_in_time_rejects_source_options(rds, run_module):
+    result = run_module('rds_cluster', cluster_id='my-clone', source_cluster_id='my-cluster', subnet_group='my-subnet-group',
+                        restore_type='full-copy', restore_time='2017-03-01T09:30:00Z', database_name='mydb')
+
+    assert result['failed']
+    assert 'database_name' in result['msg']
+    assert rds.calls == []
+
+
+def test_no_instances(rds, run_module):
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', tags=dict(env='test'))]))
+
+    result = run_module('rds_cluster', instances=[], concurrency=0, **CLUSTER_ARGS)
+
+    assert not result['changed']
+    assert result['instances'] == []
+
+
+def test_existing_instance_is_modified_in_maintenance_window(rds, run_module):
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', tags=dict(env='test'))]))
+    rds.expect('describe_db_instances', dict(DBInstances=[instance_description('my-cluster-001', 'my-cluster')]))
+    rds.expect('modify_db_instance', dict(DBInstance=instance_description('my-cluster-001', 'my-cluster')),
+               dict(DBInstanceIdentifier='my-cluster-001', ApplyImmediately=False, DBInstanceClass='db.r4.xlarge'))
+
+    result = run_module('rds_cluster', instances=[dict(instance_id='my-cluster-001', instance_type='db.r4.xlarge')], **CLUSTER_ARGS)
+
+    assert result['changed']
+    assert result['instances'][0]['diff'] == dict(before=dict(instance_type='db.r4.large'), after=dict(instance_type='db.r4.xlarge'))
+
+
+def test_clone_to_point_in_time(rds, run_module):
+    rds.expect_error('describe_db_clusters', 'DBClusterNotFoundFault', 404)
+    rds.expect('restore_db_cluster_to_point_in_time', dict(DBCluster=cluster_description('my-clone', Status='creating')),
+               dict(DBClusterIdentifier='my-clone', SourceDBClusterIdentifier='my-cluster', RestoreType='full-copy',
+                    RestoreToTime='2017-03-01T09:30:00Z', DBSubnetGroupName='my-subnet-group'))
+
+    result = run_module('rds_cluster', cluster_id='my-clone', source_cluster_id='my-cluster', subnet_group='my-subnet-group',
+                        restore_type='full-copy', restore_time='2017-03-01T09:30:00Z')
+
+    assert result['changed']
+
+
+def test_clone_requires_restore_time(rds, run_module):
+    result = run_module('rds_cluster', cluster_id='my-clone', source_cluster_id='my-cluster', subnet_group='my-subnet-group',
+                        use_latest_restorable_time=False)
+
+    assert result['failed']
+    assert 'restore_time' in result['msg']
+    assert rds.calls == []
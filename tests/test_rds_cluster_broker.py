@@ -0,0 +1,77 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+import pytest
+
+from conftest import cluster_description
+
+broker = pytest.importorskip('ansible.module_utils.rds_cluster_broker')
+
+
+@pytest.fixture
+def dying_broker():
+    """A broker which answers each request with the given responses, then drops the connection"""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'broker.sock')
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    responses = []
+    requests = []
+
+    def serve():
+        conn, address = server.accept()
+        requests.append(broker.receive_message(conn))
+        for response in responses:
+            broker.send_message(conn, response)
+        conn.close()
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+    yield path, responses, requests
+    thread.join(5)
+    server.close()
+    shutil.rmtree(directory)
+
+
+def test_call_falls_back_when_broker_is_lost(rds, dying_broker):
+    path, responses, requests = dying_broker
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster')]), dict(DBClusterIdentifier='my-cluster'))
+
+    client = broker.BrokerClient(path, dict(region='us-east-1'), lambda: rds.client)
+    result = client.describe_db_clusters(DBClusterIdentifier='my-cluster')
+
+    assert result['DBClusters'][0]['DBClusterIdentifier'] == 'my-cluster'
+    assert requests[0]['call'] == 'describe_db_clusters'
+    # Later calls are made directly
+    rds.expect('describe_db_clusters', dict(DBClusters=[]))
+    client.describe_db_clusters()
+    rds.stubber.assert_no_pending_responses()
+
+
+def test_listing_continues_from_last_page_when_broker_is_lost(rds, dying_broker):
+    path, responses, requests = dying_broker
+    responses.append(dict(result=dict(DBClusters=[cluster_description('cluster-1')], Marker='page-2')))
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('cluster-2')]), dict(Marker='page-2', MaxRecords=20))
+
+    client = broker.BrokerClient(path, dict(region='us-east-1'), lambda: rds.client)
+    pages = list(client.get_paginator('describe_db_clusters').paginate(PaginationConfig=dict(PageSize=20)))
+
+    assert [p['DBClusters'][0]['DBClusterIdentifier'] for p in pages] == ['cluster-1', 'cluster-2']
+    rds.stubber.assert_no_pending_responses()
+
+
+def test_write_fails_when_broker_is_lost(rds, dying_broker):
+    path, responses, requests = dying_broker
+
+    client = broker.BrokerClient(path, dict(region='us-east-1'), lambda: rds.client)
+    with pytest.raises(broker.BrokerError):
+        client.delete_db_cluster(DBClusterIdentifier='my-cluster', SkipFinalSnapshot=True)
+
+    # The broker may have deleted the cluster, so it is not deleted again directly
+    assert requests[0]['call'] == 'delete_db_cluster'
+    assert rds.calls == []
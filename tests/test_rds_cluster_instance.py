@@ -0,0 +1,198 @@
+from conftest import cluster_description, instance_description
+
+INSTANCE_ARGS = dict(
+    cluster_id='my-cluster',
+    instance_id='my-cluster-001',
+    instance_type='db.r4.large',
+    tags=dict(env='test'),
+)
+
+
+def test_create(rds, run_module):
+    rds.expect_error('describe_db_instances', 'DBInstanceNotFound', 404)
+    rds.expect('create_db_instance', dict(DBInstance=instance_description('my-cluster-001', 'my-cluster', DBInstanceStatus='creating')))
+
+    result = run_module('rds_cluster_instance', **INSTANCE_ARGS)
+
+    assert result['changed']
+    assert result['wait_token']['cluster_id'] == 'my-cluster'
+    assert rds.calls == ['describe_db_instances', 'create_db_instance']
+
+
+def test_create_and_wait(rds, run_module):
+    rds.expect_error('describe_db_instances', 'DBInstanceNotFound', 404)
+    rds.expect('create_db_instance', dict(DBInstance=instance_description('my-cluster-001', 'my-cluster', DBInstanceStatus='creating')))
+    rds.expect('describe_db_instances', dict(DBInstances=[instance_description('my-cluster-001', 'my-cluster')]),
+               dict(Filters=[{'Name': 'db-cluster-id', 'Values': ['my-cluster']}]))
+
+    result = run_module('rds_cluster_instance', wait=True, **INSTANCE_ARGS)
+
+    assert result['changed']
+    assert rds.calls == ['describe_db_instances', 'create_db_instance', 'describe_db_instances']
+
+
+def test_modify(rds, run_module):
+    rds.expect('describe_db_instances', dict(DBInstances=[instance_description('my-cluster-001', 'my-cluster', tags=dict(env='test'), DBInstanceClass='db.r4.xlarge')]))
+    rds.expect('modify_db_instance', dict(DBInstance=instance_description('my-cluster-001', 'my-cluster')),
+               dict(DBInstanceIdentifier='my-cluster-001', ApplyImmediately=False, DBInstanceClass='db.r4.large'))
+
+    result = run_module('rds_cluster_instance', **INSTANCE_ARGS)
+
+    assert result['changed']
+    assert rds.calls == ['describe_db_instances', 'modify_db_instance']
+
+
+def test_pending_modification_is_not_repeated(rds, run_module):
+    instance = instance_description('my-cluster-001', 'my-cluster', tags=dict(env='test'), DBInstanceClass='db.r4.xlarge',
+                                    PreferredMaintenanceWindow='mon:22:00-mon:23:00',
+                                    PendingModifiedValues=dict(DBInstanceClass='db.r4.large'))
+    rds.expect('describe_db_instances', dict(DBInstances=[instance]))
+
+    result = run_module('rds_cluster_instance', preferred_maintenance_window='Mon:22:00-Mon:23:00', **INSTANCE_ARGS)
+
+    assert not result['changed']
+    assert rds.calls == ['describe_db_instances']
+
+
+def test_modify_logs_exports(rds, run_module):
+    instance = instance_description('my-cluster-001', 'my-cluster', tags=dict(env='test'), EnabledCloudwatchLogsExports=['audit', 'error'])
+    rds.expect('describe_db_instances', dict(DBInstances=[instance]))
+    rds.expect('modify_db_instance', dict(DBInstance=instance),
+               dict(DBInstanceIdentifier='my-cluster-001', ApplyImmediately=False,
+                    CloudwatchLogsExportConfiguration=dict(EnableLogTypes=['slowquery'], DisableLogTypes=['audit'])))
+
+    result = run_module('rds_cluster_instance', cloudwatch_logs_exports=['slowquery', 'error'], **INSTANCE_ARGS)
+
+    assert result['diff'] == dict(before=dict(cloudwatch_logs_exports=['audit', 'error']),
+                                  after=dict(cloudwatch_logs_exports=['error', 'slowquery']))
+
+
+def test_no_op(rds, run_module):
+    rds.expect('describe_db_instances', dict(DBInstances=[instance_description('my-cluster-001', 'my-cluster', tags=dict(env='test'))]))
+
+    result = run_module('rds_cluster_instance', **INSTANCE_ARGS)
+
+    assert not result['changed']
+    assert rds.calls == ['describe_db_instances']
+    rds.assert_budget(reads=1)
+
+
+def test_no_op_without_tags(rds, run_module):
+    rds.expect('describe_db_instances', dict(DBInstances=[instance_description('my-cluster-001', 'my-cluster', tags=dict(env='test'))]))
+
+    args = dict(INSTANCE_ARGS)
+    del args['tags']
+    result = run_module('rds_cluster_instance', **args)
+
+    assert not result['changed']
+    rds.assert_budget(reads=1)
+
+
+def test_fleet_no_op(rds, run_module):
+    for i in (1, 2, 3):
+        rds.expect('describe_db_instances', dict(DBInstances=[instance_description('my-cluster-00%d' % i, 'my-cluster', tags=dict(env='test'))]))
+
+    result = run_module(
+        'rds_cluster_instance',
+        cluster_id='my-cluster',
+        instance_type='db.r4.large',
+        tags=dict(env='test'),
+        instances=[dict(instance_id='my-cluster-00%d' % i) for i in (1, 2, 3)],
+        concurrency=1,
+    )
+
+    assert not result['changed']
+    assert rds.calls == ['describe_db_instances'] * 3
+    rds.assert_budget(reads=3)
+
+
+def test_fleet_no_op_and_wait(rds, run_module):
+    instances = [instance_description('my-cluster-00%d' % i, 'my-cluster', tags=dict(env='test')) for i in (1, 2, 3)]
+    for instance in instances:
+        rds.expect('describe_db_instances', dict(DBInstances=[instance]))
+    rds.expect('describe_db_instances', dict(DBInstances=instances))
+
+    result = run_module(
+        'rds_cluster_instance',
+        cluster_id='my-cluster',
+        instance_type='db.r4.large',
+        tags=dict(env='test'),
+        instances=[dict(instance_id='my-cluster-00%d' % i) for i in (1, 2, 3)],
+        concurrency=1,
+        wait=True,
+    )
+
+    assert not result['changed']
+    # One describe per instance, then a single describe for the whole cluster while waiting
+    rds.assert_budget(reads=4)
+
+
+def test_rolling_update(rds, run_module, monkeypatch):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    members = [
+        dict(DBInstanceIdentifier='writer', IsClusterWriter=True, PromotionTier=0),
+        dict(DBInstanceIdentifier='reader-a', IsClusterWriter=False, PromotionTier=2),
+        dict(DBInstanceIdentifier='reader-b', IsClusterWriter=False, PromotionTier=0),
+        dict(DBInstanceIdentifier='reader-c', IsClusterWriter=False, PromotionTier=1),
+    ]
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('my-cluster', DBClusterMembers=members)]))
+
+    def modify(instance_ids, pending_first=False):
+        for instance_id in instance_ids:
+            rds.expect('describe_db_instances', dict(DBInstances=[instance_description(instance_id, 'my-cluster', DBInstanceClass='db.r4.large')]))
+            rds.expect('modify_db_instance', dict(DBInstance=instance_description(instance_id, 'my-cluster')),
+                       dict(DBInstanceIdentifier=instance_id, ApplyImmediately=True, DBInstanceClass='db.r4.xlarge'))
+        if pending_first:
+            # Not yet started, so still available with the change pending
+            rds.expect('describe_db_instances', dict(DBInstances=[
+                instance_description(i, 'my-cluster', PendingModifiedValues=dict(DBInstanceClass='db.r4.xlarge')) for i in instance_ids]))
+        rds.expect('describe_db_instances', dict(DBInstances=[instance_description(i, 'my-cluster', DBInstanceClass='db.r4.xlarge')
+                                                              for i in instance_ids]))
+
+    modify(['reader-b', 'reader-c'], pending_first=True)
+    modify(['reader-a'])
+    modify(['writer'])
+
+    result = run_module('rds_cluster_instance', cluster_id='my-cluster', instance_type='db.r4.xlarge', rolling=True, max_unavailable=2,
+                        concurrency=1, instances=[dict(instance_id=i) for i in ('writer', 'reader-a', 'reader-b', 'reader-c')])
+
+    assert result['changed']
+    assert [(r['instance_id'], r['batch']) for r in result['results']] == [
+        ('reader-b', 1), ('reader-c', 1), ('reader-a', 2), ('writer', 3),
+    ]
+
+
+def test_delete_instances_and_wait(rds, run_module):
+    rds.expect('delete_db_instance', dict(DBInstance=instance_description('my-cluster-002', 'my-cluster', DBInstanceStatus='deleting')))
+    # Already being deleted, so not changed
+    rds.expect_error('delete_db_instance', 'InvalidDBInstanceState')
+    rds.expect('describe_db_instances', dict(DBInstances=[instance_description('my-cluster-003', 'my-cluster', DBInstanceStatus='deleting')]),
+               dict(DBInstanceIdentifier='my-cluster-003'))
+    rds.expect('describe_db_instances', dict(DBInstances=[]), dict(Filters=[{'Name': 'db-cluster-id', 'Values': ['my-cluster']}]))
+
+    result = run_module('rds_cluster_instance', cluster_id='my-cluster', state='absent', wait=True, concurrency=1,
+                        instances=[dict(instance_id='my-cluster-002'), dict(instance_id='my-cluster-003')])
+
+    assert result['changed']
+    assert [(r['instance_id'], r['changed']) for r in result['results']] == [('my-cluster-002', True), ('my-cluster-003', False)]
+    rds.assert_budget(reads=2, writes=2)
+
+
+def test_delete_instance_being_created_fails(rds, run_module):
+    rds.expect_error('delete_db_instance', 'InvalidDBInstanceState')
+    rds.expect('describe_db_instances', dict(DBInstances=[instance_description('my-cluster-002', 'my-cluster', DBInstanceStatus='creating')]))
+
+    result = run_module('rds_cluster_instance', cluster_id='my-cluster', instance_id='my-cluster-002', state='absent', wait=True)
+
+    # Failed straight away, rather than waiting for a deletion which has not started
+    assert result['failed']
+    assert result['results'][0]['status'] == 'creating'
+    assert rds.calls == ['delete_db_instance', 'describe_db_instances']
+
+
+def test_no_instances(rds, run_module):
+    result = run_module('rds_cluster_instance', cluster_id='my-cluster', instance_type='db.r4.large', instances=[], concurrency=0)
+
+    assert not result['changed']
+    assert result['results'] == []
+    assert rds.calls == []
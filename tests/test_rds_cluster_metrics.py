@@ -0,0 +1,41 @@
+import pytest
+
+metrics = pytest.importorskip('ansible.module_utils.rds_cluster_metrics')
+boto3 = pytest.importorskip('boto3')
+botocore = pytest.importorskip('botocore')
+
+
+class Module(object):
+    def exit_json(self, **kwargs):
+        self.result = kwargs
+
+    def fail_json(self, **kwargs):
+        self.result = dict(kwargs, failed=True)
+
+
+def test_call_is_recorded(rds):
+    rds.expect('describe_db_clusters', dict(DBClusters=[]))
+    module = Module()
+    metrics.instrument(module, rds.client)
+
+    rds.client.describe_db_clusters()
+    module.exit_json(changed=False)
+
+    operation = module.result['metrics']['operations']['describe_db_clusters']
+    assert operation['calls'] == 1 and operation['errors'] == 0
+
+
+def test_transport_error_is_recorded():
+    # Nothing listens on port 1, and the error is raised without retries
+    client = boto3.client('rds', region_name='us-east-1', endpoint_url='http://127.0.0.1:1', aws_access_key_id='testing',
+                          aws_secret_access_key='testing', config=botocore.config.Config(retries=dict(max_attempts=0)))
+    module = Module()
+    metrics.instrument(module, client)
+
+    with pytest.raises(botocore.exceptions.EndpointConnectionError):
+        client.describe_db_clusters()
+    module.fail_json(msg='connection failed')
+
+    operation = module.result['metrics']['operations']['describe_db_clusters']
+    assert operation['calls'] == 1
+    assert operation['errors'] == 1
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+ratelimit = pytest.importorskip('ansible.module_utils.rds_cluster_ratelimit')
+metrics = pytest.importorskip('ansible.module_utils.rds_cluster_metrics')
+
+
+class Clock(object):
+    """Stands in for time.time and time.sleep, recording each sleep"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, 'time', clock.time)
+    monkeypatch.setattr(ratelimit.time, 'sleep', clock.sleep)
+    return clock
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return ratelimit.RateLimiter(str(tmp_path), dict(region='us-east-1'), rate=10, burst=2)
+
+
+def state(limiter):
+    with open(limiter.path) as f:
+        return json.load(f)
+
+
+def test_acquire_waits_when_tokens_run_out(clock, limiter, monkeypatch):
+    collector = metrics.ApiMetrics()
+    monkeypatch.setattr(metrics, '_collector', collector)
+
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.sleeps == []
+
+    # The bucket is empty, so each call waits its turn at 10 per second
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(0.1), pytest.approx(0.2)]
+    # The time spent waiting is reported with the metrics
+    assert collector.report()['rate_limit_wait'] == pytest.approx(0.3)
+
+
+def test_tokens_refill_over_time(clock, limiter):
+    for n in range(3):
+        limiter.acquire()
+    clock.now += 0.3
+
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(0.1)]
+    assert state(limiter)['tokens'] == pytest.approx(1.0)
+
+
+def test_throttled_halves_rate_and_drains_tokens(clock, limiter):
+    limiter.acquire()
+    limiter.throttled()
+
+    assert state(limiter)['throttled_rate'] == 5
+    assert state(limiter)['tokens'] <= 0
+
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(0.2)]
+
+    # Throttles within DECREASE_INTERVAL of each other only count once
+    limiter.throttled()
+    assert state(limiter)['throttled_rate'] == 5
+    # A later throttle halves the rate it has recovered to since
+    clock.now += ratelimit.DECREASE_INTERVAL
+    recovered = 5 + 5 * ratelimit.DECREASE_INTERVAL / ratelimit.RECOVERY_SECONDS
+    limiter.throttled()
+    assert state(limiter)['throttled_rate'] == pytest.approx(recovered / 2)
+
+
+def test_rate_recovers_linearly(clock, limiter):
+    limiter.acquire()
+    limiter.throttled()
+
+    current = state(limiter)
+    assert limiter.rate(current, clock.now) == 5
+    assert limiter.rate(current, clock.now + ratelimit.RECOVERY_SECONDS / 2) == pytest.approx(7.5)
+    assert limiter.rate(current, clock.now + ratelimit.RECOVERY_SECONDS) == 10
+    assert limiter.rate(current, clock.now + 10 * ratelimit.RECOVERY_SECONDS) == 10
+
+
+def test_throttling_response_reduces_rate(clock, limiter):
+    limiter.needs_retry(response=(None, dict(Error=dict(Code='ThrottlingException'))))
+    assert state(limiter)['throttled_rate'] == 5
+
+    clock.now += 2 * ratelimit.DECREASE_INTERVAL
+    limiter.needs_retry(response=(None, dict(Error=dict(Code='InvalidParameterValue'))))
+    assert state(limiter)['throttled_rate'] == 5
@@ -0,0 +1,81 @@
+from conftest import arn
+
+
+def snapshot(snapshot_id, status='available', percent_progress=100, allocated_storage=10):
+    return dict(
+        DBClusterSnapshotIdentifier=snapshot_id,
+        DBClusterSnapshotArn=arn('cluster-snapshot', snapshot_id),
+        DBClusterIdentifier='my-cluster',
+        Status=status,
+        PercentProgress=percent_progress,
+        AllocatedStorage=allocated_storage,
+        SnapshotType='manual',
+    )
+
+
+def test_copies_to_each_region(rds, run_module, monkeypatch):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    west = rds.region('us-west-2')
+    europe = rds.region('eu-west-1')
+
+    # Existing copies are looked up with one call per destination region
+    west.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot('dr-snap-1')]))
+    europe.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[]))
+    # The ARNs of the sources are looked up together
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot('snap-1'), snapshot('snap-2')]))
+    west.expect('copy_db_cluster_snapshot', dict(DBClusterSnapshot=snapshot('dr-snap-2', 'copying', 0)))
+    europe.expect('copy_db_cluster_snapshot', dict(DBClusterSnapshot=snapshot('dr-snap-1', 'copying', 0)))
+    europe.expect('copy_db_cluster_snapshot', dict(DBClusterSnapshot=snapshot('dr-snap-2', 'copying', 0)))
+    # Progress is checked with one call per region for all of its copies
+    west.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot('dr-snap-2', 'copying', 50)]))
+    europe.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot('dr-snap-1', 'copying', 50), snapshot('dr-snap-2')]))
+    west.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot('dr-snap-2')]))
+    europe.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot('dr-snap-1')]))
+
+    result = run_module('rds_cluster_snapshot_copy', snapshots=['snap-1', dict(snapshot_id='snap-2', region='us-east-1')],
+                        destinations=[dict(region='us-west-2'), dict(region='eu-west-1', kms_key_id='alias/dr')],
+                        target_id_format='dr-%(snapshot_id)s', concurrency=1, wait=True, wait_delay=1)
+
+    assert result['changed']
+    assert [(c['region'], c['target_snapshot_id'], c['changed']) for c in result['copies']] == [
+        ('us-west-2', 'dr-snap-1', False),
+        ('eu-west-1', 'dr-snap-1', True),
+        ('us-west-2', 'dr-snap-2', True),
+        ('eu-west-1', 'dr-snap-2', True),
+    ]
+    assert result['progress']['available'] == 4
+    assert result['progress']['percent'] == 100.0
+    assert [h['percent'] for h in result['progress_history']] == [75.0, 100.0]
+    assert rds.writes() == [] and len(west.writes()) == 1 and len(europe.writes()) == 2
+
+
+def test_existing_copies_are_unchanged(rds, run_module):
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot('snap-1-shared')]))
+
+    result = run_module('rds_cluster_snapshot_copy', snapshots=['snap-1'], destinations=[dict(kms_key_id='alias/shared')],
+                        target_id_format='%(snapshot_id)s-shared')
+
+    assert not result['changed']
+    assert result['copies'][0]['status'] == 'available'
+    rds.assert_budget(reads=1)
+
+
+def test_copy_to_itself_fails(rds, run_module):
+    result = run_module('rds_cluster_snapshot_copy', snapshots=['snap-1'], destinations=[dict(kms_key_id='alias/shared')])
+
+    assert result['failed']
+    assert rds.calls == []
+
+
+def test_automated_snapshot_arn(rds, run_module):
+    source_arn = arn('cluster-snapshot', 'rds:prod-2017-06-01-00-00')
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[]))
+    rds.expect('copy_db_cluster_snapshot', dict(DBClusterSnapshot=snapshot('prod-2017-06-01-00-00', 'copying', 0)),
+               dict(SourceDBClusterSnapshotIdentifier=source_arn, TargetDBClusterSnapshotIdentifier='prod-2017-06-01-00-00', CopyTags=True))
+
+    result = run_module('rds_cluster_snapshot_copy', snapshots=[dict(snapshot_id='rds:prod-2017-06-01-00-00', db_cluster_snapshot_arn=source_arn)],
+                        destinations=[dict()])
+
+    assert result['changed']
+    assert result['copies'][0]['snapshot_id'] == 'rds:prod-2017-06-01-00-00'
+    assert result['copies'][0]['target_snapshot_id'] == 'prod-2017-06-01-00-00'
@@ -0,0 +1,162 @@
+import datetime
+
+import pytest
+
+from conftest import arn
+
+tz = pytest.importorskip('dateutil.tz')
+
+
+def snapshot(index, cluster_id='my-cluster', snapshot_type='manual'):
+    snapshot_id = '%s-snapshot-%03d' % (cluster_id, index)
+    return dict(
+        DBClusterSnapshotIdentifier=snapshot_id,
+        DBClusterSnapshotArn=arn('cluster-snapshot', snapshot_id),
+        DBClusterIdentifier=cluster_id,
+        SnapshotCreateTime=datetime.datetime(2017, 1, 1, tzinfo=tz.tzutc()) + datetime.timedelta(days=index),
+        ClusterCreateTime=datetime.datetime(2016, 1, 1, tzinfo=tz.tzutc()),
+        AvailabilityZones=['us-east-1a'],
+        Engine='aurora',
+        EngineVersion='5.6.10a',
+        AllocatedStorage=1,
+        Status='available',
+        Port=3306,
+        VpcId='vpc-1',
+        MasterUsername='admin',
+        LicenseModel='aurora',
+        SnapshotType=snapshot_type,
+        PercentProgress=100,
+        StorageEncrypted=False,
+        IAMDatabaseAuthenticationEnabled=False,
+    )
+
+
+def test_query_is_pushed_down(rds, run_module):
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(1), snapshot(2)]),
+               dict(DBClusterIdentifier='my-cluster', SnapshotType='manual'))
+
+    result = run_module('rds_cluster_snapshot_facts', cluster_id='my-cluster', snapshot_type='manual', sort='snapshot_create_time')
+
+    assert [s['snapshot_id'] for s in result['results']] == ['my-cluster-snapshot-001', 'my-cluster-snapshot-002']
+    assert rds.calls == ['describe_db_cluster_snapshots']
+    rds.assert_budget(reads=1)
+
+
+def test_empty_selection_makes_no_calls(rds, run_module):
+    result = run_module('rds_cluster_snapshot_facts', cluster_id='my-cluster', sort='id', sort_end=0)
+
+    assert result['results'] == []
+    assert rds.calls == []
+
+
+def test_cached_catalog(rds, run_module, tmp_path):
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(1), snapshot(2), snapshot(1, 'other-cluster')]))
+
+    args = dict(cluster_id='my-cluster', cache_ttl=300, cache_path=str(tmp_path))
+    first = run_module('rds_cluster_snapshot_facts', **args)
+    second = run_module('rds_cluster_snapshot_facts', **args)
+
+    assert len(first['results']) == len(second['results']) == 2
+    # Only the first run lists the snapshots, the second is served from the catalog
+    assert rds.calls == ['describe_db_cluster_snapshots']
+
+
+def test_regions_are_merged(rds, run_module):
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(1), snapshot(4)]))
+    rds.region('us-west-2').expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(2), snapshot(3)]))
+    rds.region('eu-west-1').expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[]))
+
+    result = run_module('rds_cluster_snapshot_facts', regions=['us-east-1', 'us-west-2', 'eu-west-1'], cluster_id='my-cluster',
+                        sort='snapshot_create_time', sort_order='descending', sort_start=1, sort_end=3)
+
+    assert [(s['snapshot_id'], s['region']) for s in result['results']] == [
+        ('my-cluster-snapshot-003', 'us-west-2'),
+        ('my-cluster-snapshot-002', 'us-west-2'),
+    ]
+    for region in ('us-east-1', 'us-west-2', 'eu-west-1'):
+        assert rds.region(region).calls == ['describe_db_cluster_snapshots']
+
+
+def test_fields_and_count_only(rds, run_module):
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(1), snapshot(2), snapshot(3)]))
+
+    result = run_module('rds_cluster_snapshot_facts', cluster_id='my-cluster', fields=['snapshot_id', 'snapshot_create_time'],
+                        sort='snapshot_create_time', sort_order='descending', sort_end=2)
+    assert result['results'] == [
+        dict(snapshot_id='my-cluster-snapshot-003', snapshot_create_time='2017-01-04T00:00:00+00:00'),
+        dict(snapshot_id='my-cluster-snapshot-002', snapshot_create_time='2017-01-03T00:00:00+00:00'),
+    ]
+    assert result['count'] == 2
+
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(1), snapshot(2), snapshot(3)]))
+    result = run_module('rds_cluster_snapshot_facts', cluster_id='my-cluster', count_only=True)
+    assert result['count'] == 3
+    assert 'results' not in result
+
+
+def test_unsupported_fields(rds, run_module):
+    result = run_module('rds_cluster_snapshot_facts', cluster_id='my-cluster', fields=['snapshot_id', 'size'])
+
+    assert result['failed']
+    assert 'size' in result['msg']
+    assert rds.calls == []
+
+
+def test_group_by_cluster(rds, run_module):
+    snapshots = [snapshot(n, cluster_id) for n in range(1, 6) for cluster_id in ('cluster-a', 'cluster-b', 'cluster-c')]
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=snapshots), dict(SnapshotType='manual'))
+
+    result = run_module('rds_cluster_snapshot_facts', group_by='cluster_id', snapshot_type='manual', fields=['snapshot_id'],
+                        sort='snapshot_create_time', sort_order='descending', sort_end=2)
+
+    assert result['groups'] == dict(
+        (cluster_id, [dict(snapshot_id='%s-snapshot-005' % cluster_id), dict(snapshot_id='%s-snapshot-004' % cluster_id)])
+        for cluster_id in ('cluster-a', 'cluster-b', 'cluster-c')
+    )
+    assert result['count'] == 6
+    assert 'results' not in result
+    # One listing for all of the clusters
+    rds.assert_budget(reads=1)
+
+
+def test_group_by_count_across_regions(rds, run_module):
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(1, 'cluster-a'), snapshot(2, 'cluster-b')]))
+    rds.region('us-west-2').expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(3, 'cluster-a')]))
+
+    result = run_module('rds_cluster_snapshot_facts', regions=['us-east-1', 'us-west-2'], group_by='cluster_id', count_only=True)
+
+    assert result['groups'] == {'cluster-a': 2, 'cluster-b': 1}
+    assert result['count'] == 3
+
+
+def test_catalog_refresh(rds, run_module, tmp_path, monkeypatch):
+    snapshots = pytest.importorskip('ansible.module_utils.rds_cluster_snapshots')
+    clock = [1500000000.0]
+    monkeypatch.setattr(snapshots.time, 'time', lambda: clock[0])
+    args = dict(cluster_id='my-cluster', sort='snapshot_create_time', cache_ttl=300, cache_path=str(tmp_path))
+
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(1), snapshot(2)]))
+    first = run_module('rds_cluster_snapshot_facts', **args)
+
+    # Once the TTL expires, only the snapshots with events since the newest cached snapshot are described again
+    clock[0] += 600
+    since = snapshot(2)['SnapshotCreateTime'] - datetime.timedelta(seconds=snapshots.REFRESH_SKEW)
+    rds.expect('describe_events', dict(Events=[
+        dict(SourceIdentifier='my-cluster-snapshot-001', SourceType='db-cluster-snapshot', Message='Deleted cluster snapshot'),
+        dict(SourceIdentifier='my-cluster-snapshot-003', SourceType='db-cluster-snapshot', Message='Creating manual cluster snapshot'),
+    ]), dict(SourceType='db-cluster-snapshot', StartTime=since))
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(3)]),
+               dict(Filters=[{'Name': 'db-cluster-snapshot-id', 'Values': ['my-cluster-snapshot-001', 'my-cluster-snapshot-003']}]))
+    second = run_module('rds_cluster_snapshot_facts', **args)
+
+    # A day after the last full listing, everything is listed again
+    clock[0] += snapshots.FULL_REFRESH_INTERVAL
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(2), snapshot(3), snapshot(4)]))
+    third = run_module('rds_cluster_snapshot_facts', **args)
+
+    def ids(result):
+        return [s['snapshot_id'] for s in result['results']]
+    assert ids(first) == ['my-cluster-snapshot-001', 'my-cluster-snapshot-002']
+    assert ids(second) == ['my-cluster-snapshot-002', 'my-cluster-snapshot-003']
+    assert ids(third) == ['my-cluster-snapshot-002', 'my-cluster-snapshot-003', 'my-cluster-snapshot-004']
+    assert rds.calls == ['describe_db_cluster_snapshots', 'describe_events', 'describe_db_cluster_snapshots', 'describe_db_cluster_snapshots']
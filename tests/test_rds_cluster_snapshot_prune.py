@@ -0,0 +1,70 @@
+import datetime
+
+import pytest
+
+from conftest import arn
+
+tz = pytest.importorskip('dateutil.tz')
+
+
+def snapshot(days_ago, cluster_id='my-cluster', status='available'):
+    snapshot_id = '%s-%03d' % (cluster_id, days_ago)
+    return dict(
+        DBClusterSnapshotIdentifier=snapshot_id,
+        DBClusterSnapshotArn=arn('cluster-snapshot', snapshot_id),
+        DBClusterIdentifier=cluster_id,
+        SnapshotCreateTime=datetime.datetime.now(tz.tzutc()) - datetime.timedelta(days=days_ago, hours=1),
+        Engine='aurora',
+        Status=status,
+        SnapshotType='manual',
+    )
+
+
+def test_keep_newest_per_cluster(rds, run_module):
+    snapshots = [snapshot(d, c) for c in ('cluster-a', 'cluster-b') for d in (1, 2, 3, 4)] + [snapshot(0, 'cluster-a', 'creating')]
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=snapshots), dict(SnapshotType='manual'))
+    for n in range(4):
+        rds.expect('delete_db_cluster_snapshot', dict(DBClusterSnapshot=dict()))
+
+    result = run_module('rds_cluster_snapshot_prune', keep_newest=2, concurrency=1)
+
+    assert result['changed']
+    assert [s['snapshot_id'] for s in result['deleted']] == ['cluster-a-004', 'cluster-a-003', 'cluster-b-004', 'cluster-b-003']
+    assert result['kept'] == 4
+    # One listing for all of the clusters, and one call per deletion
+    rds.assert_budget(reads=1, writes=4)
+
+
+def test_older_than_days_keeps_newest(rds, run_module):
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(d) for d in (5, 40, 50, 60)]),
+               dict(DBClusterIdentifier='my-cluster', SnapshotType='manual'))
+    rds.expect('delete_db_cluster_snapshot', dict(DBClusterSnapshot=dict()), dict(DBClusterSnapshotIdentifier='my-cluster-060'))
+
+    result = run_module('rds_cluster_snapshot_prune', cluster_id='my-cluster', keep_newest=3, older_than_days=30)
+
+    assert [s['snapshot_id'] for s in result['deleted']] == ['my-cluster-060']
+    assert result['kept'] == 3
+
+
+def test_check_mode_makes_no_changes(rds, run_module):
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(d) for d in (10, 20)]))
+
+    result = run_module('rds_cluster_snapshot_prune', older_than_days=15, _ansible_check_mode=True)
+
+    assert result['changed']
+    assert [s['snapshot_id'] for s in result['deleted']] == ['my-cluster-020']
+    assert rds.writes() == []
+
+
+def test_throttled_deletion_is_retried(rds, run_module, monkeypatch):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    rds.expect('describe_db_cluster_snapshots', dict(DBClusterSnapshots=[snapshot(10), snapshot(20)]))
+    rds.expect_error('delete_db_cluster_snapshot', 'Throttling')
+    rds.expect('delete_db_cluster_snapshot', dict(DBClusterSnapshot=dict()))
+    rds.expect_error('delete_db_cluster_snapshot', 'InvalidDBClusterSnapshotStateFault')
+
+    result = run_module('rds_cluster_snapshot_prune', keep_newest=0, concurrency=1)
+
+    assert result['failed']
+    assert [s['snapshot_id'] for s in result['deleted']] == ['my-cluster-020']
+    assert [s['snapshot_id'] for s in result['failed_snapshots']] == ['my-cluster-010']
@@ -0,0 +1,84 @@
+import datetime
+
+import pytest
+
+from conftest import cluster_description, instance_description
+
+stub = pytest.importorskip('botocore.stub')
+tz = pytest.importorskip('dateutil.tz')
+
+
+def test_clusters_and_instances(rds, run_module):
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('cluster-a'), cluster_description('cluster-b')]),
+               dict(Filters=[{'Name': 'db-cluster-id', 'Values': ['cluster-a', 'cluster-b']}]))
+    rds.expect('describe_db_instances', dict(DBInstances=[instance_description('cluster-a-%d' % i, 'cluster-a') for i in (1, 2, 3)]),
+               dict(Filters=[{'Name': 'db-cluster-id', 'Values': ['cluster-a']}]))
+    rds.expect('describe_db_instances', dict(DBInstances=[instance_description('cluster-b-%d' % i, 'cluster-b') for i in (1, 2, 3)]),
+               dict(Filters=[{'Name': 'db-cluster-id', 'Values': ['cluster-b']}]))
+
+    result = run_module(
+        'rds_cluster_wait',
+        clusters=['cluster-a', 'cluster-b'],
+        instances=[dict(id='cluster-%s-%d' % (c, i), cluster_id='cluster-%s' % c) for c in 'ab' for i in (1, 2, 3)],
+    )
+
+    assert not result.get('failed')
+    assert len(result['resources']) == 8
+    # One call for all of the clusters, and one per cluster for the instances
+    rds.assert_budget(reads=3)
+
+
+def test_tokens_without_cluster(rds, run_module):
+    rds.expect('describe_db_instances', dict(DBInstances=[instance_description('db-%d' % i, 'my-cluster') for i in (1, 2)]),
+               dict(Filters=[{'Name': 'db-instance-id', 'Values': ['db-1', 'db-2']}]))
+
+    result = run_module(
+        'rds_cluster_wait',
+        tokens=[dict(type='instance', id='db-%d' % i, region='us-east-1', status='available') for i in (1, 2)],
+    )
+
+    assert [r['id'] for r in result['resources']] == ['db-1', 'db-2']
+    rds.assert_budget(reads=1)
+
+
+def test_deleted(rds, run_module):
+    rds.expect('describe_db_clusters', dict(DBClusters=[]))
+
+    result = run_module('rds_cluster_wait', clusters=[dict(id='old-cluster', status='deleted')])
+
+    assert result['resources'][0]['status'] == 'deleted'
+    rds.assert_budget(reads=1)
+
+
+def event(source_id, message, category, source_type='db-cluster'):
+    return dict(SourceIdentifier=source_id, SourceType=source_type, Message=message, EventCategories=[category],
+                Date=datetime.datetime(2017, 1, 1, tzinfo=tz.tzutc()))
+
+
+def test_failure_event_ends_wait(rds, run_module, monkeypatch):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description('cluster-a', Status='creating')]))
+    # Only the events of the cluster being waited for are requested
+    rds.expect('describe_events', dict(Events=[event('cluster-a', 'DB cluster failed to be created', 'failure')]),
+               dict(SourceType='db-cluster', SourceIdentifier='cluster-a', StartTime=stub.ANY))
+
+    result = run_module('rds_cluster_wait', clusters=['cluster-a'], wait_method='events', wait_timeout=600)
+
+    assert result['failed']
+    assert 'failed to be created' in result['msg']
+    rds.assert_budget(reads=2)
+
+
+def test_events_of_many_sources_are_listed_together(rds, run_module, monkeypatch):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    cluster_ids = ['cluster-%d' % n for n in range(6)]
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description(c, Status='creating') for c in cluster_ids]))
+    rds.expect('describe_events', dict(Events=[event('other-cluster', 'DB cluster created', 'creation'),
+                                               event('cluster-0', 'Finished DB cluster backup', 'backup')]),
+               dict(SourceType='db-cluster', StartTime=stub.ANY))
+    rds.expect('describe_db_clusters', dict(DBClusters=[cluster_description(c) for c in cluster_ids]))
+
+    result = run_module('rds_cluster_wait', clusters=cluster_ids, wait_method='events', wait_timeout=600)
+
+    assert not result.get('failed')
+    assert rds.calls == ['describe_db_clusters', 'describe_events', 'describe_db_clusters']